@@ -1,7 +1,8 @@
+import threading
 from common.log import energy_fl_logger
 
 class Aggregator:
-    
+
     def __init__(self, ip: str, username: str, flwrPort: int, zmqPort: int) -> None:
         self.ip = ip
         self.username = username
@@ -17,14 +18,40 @@ class Aggregator:
         self.context = zmq.Context()
         self.broadcast = self.context.socket(zmq.PUB)
         self.broadcast.bind(f"tcp://{self.ip}:{self.zmqPort}")
+        # ZMQ sockets aren't thread safe and the heartbeat is sent from its own thread
+        self.broadcast_lock = threading.Lock()
+        self.heartbeat_stop = threading.Event()
+        self.heartbeat_thread = threading.Thread(target=self.ZMQ_heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
         energy_fl_logger.debug("ZMQ was Setup")
 
+    def ZMQ_send(self, command: int, payload=None):
+        with self.broadcast_lock:
+            self.broadcast.send_pyobj((command, payload))
+
+    def ZMQ_heartbeat_loop(self):
+        from common import configuration
+        while not self.heartbeat_stop.wait(configuration.ZMQ_HEARTBEAT_INTERVAL):
+            self.ZMQ_send(configuration.ZMQ_HEARTBEAT)
+
+    def ZMQ_start_power_collection(self):
+        from common import configuration
+        self.ZMQ_send(configuration.ZMQ_START_POWER_COLLECTION)
+        energy_fl_logger.debug("ZMQ Power Collection Start Signal Sent")
+
+    def ZMQ_mark(self, label):
+        """Has the power collectors record `label` at the current point in their sample streams"""
+        from common import configuration
+        self.ZMQ_send(configuration.ZMQ_MARK, label)
+
     def ZMQ_stop_power_collection(self):
         from common import configuration
-        self.broadcast.send_pyobj(configuration.ZMQ_STOP_POWER_COLLECTION)
+        self.ZMQ_send(configuration.ZMQ_STOP_POWER_COLLECTION)
         energy_fl_logger.debug("ZMQ Power Collection Stop Signal Sent")
 
     def ZMQ_shutdown(self):
+        self.heartbeat_stop.set()
+        self.heartbeat_thread.join()
         self.broadcast.close()
         self.context.term()
         del self.context
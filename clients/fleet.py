@@ -0,0 +1,102 @@
+# ! Concurrent liveness checks for every device taking part in an experiment
+
+# * All hosts are probed at the same time over their shared SSH connections, so one dead RPI costs
+# * one timeout for the whole fleet instead of one timeout per check. Results are cached for a few
+# * seconds so that back to back checks don't touch the network at all
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple, Optional
+
+from clients.ssh_pool import SSH_POOL
+from common import configuration
+from common.log import energy_fl_logger
+
+
+class HostStatus(NamedTuple):
+    online: bool
+    latency: float  # Seconds the probe took
+    checked_at: float  # time.monotonic() of the probe
+
+
+class FleetHealth:
+    def __init__(
+        self,
+        ttl: float = configuration.FLEET_HEALTH_TTL,
+        timeout: float = 20,
+        max_workers: int = 16,
+    ) -> None:
+        self.ttl = ttl
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet-health")
+        self.lock = threading.Lock()
+        self.cache: dict[str, HostStatus] = {}
+
+    def probe(self, host: str) -> HostStatus:
+        start = time.monotonic()
+        online = SSH_POOL.check(host, timeout=self.timeout)
+        end = time.monotonic()
+        status = HostStatus(online=online, latency=end - start, checked_at=end)
+        with self.lock:
+            self.cache[host] = status
+        return status
+
+    def check(self, hosts: Iterable[str], max_age: Optional[float] = None) -> dict[str, HostStatus]:
+        """
+        Returns the status of every host in `hosts`, given as 'user@ip'.
+        Hosts checked less than `max_age` seconds ago (default is the TTL) are answered from the cache,
+        all the others are probed concurrently
+        """
+        max_age = self.ttl if max_age is None else max_age
+        now = time.monotonic()
+        statuses: dict[str, HostStatus] = {}
+        stale: list[str] = []
+        with self.lock:
+            for host in hosts:
+                cached = self.cache.get(host)
+                if cached is not None and now - cached.checked_at <= max_age:
+                    statuses[host] = cached
+                else:
+                    stale.append(host)
+        for host, status in zip(stale, self.executor.map(self.probe, stale)):
+            statuses[host] = status
+        return statuses
+
+    def check_devices(self, devices: Iterable, max_age: Optional[float] = None) -> dict[str, HostStatus]:
+        """Same as `check` but for a list of Party or PowerCollector objects"""
+        return self.check([device.ssh.client for device in devices], max_age=max_age)
+
+    def wait_until_online(self, devices: Iterable, timeout: float, poll_interval: float = 5) -> list:
+        """Re-probes the offline devices until all of them are online or `timeout` passes. Returns the ones still offline"""
+        from common.pipeline import wait_for
+
+        offline = list(devices)
+        max_age = None  # The first pass may be answered from the cache, offline devices are always probed again after that
+
+        def all_online() -> bool:
+            nonlocal offline, max_age
+            statuses = self.check_devices(offline, max_age=max_age)
+            offline = [device for device in offline if not statuses[device.ssh.client].online]
+            if offline and max_age is None:
+                energy_fl_logger.warning(f"Waiting for {offline} to come online")
+            max_age = 0
+            return not offline
+
+        wait_for(all_online, timeout=timeout, poll_interval=poll_interval)
+        return offline
+
+    def invalidate(self, host: Optional[str] = None):
+        with self.lock:
+            if host is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(host, None)
+
+    def log_statuses(self, statuses: dict[str, HostStatus]):
+        for host, status in statuses.items():
+            state = "online" if status.online else "OFFLINE"
+            energy_fl_logger.info(f"{host} is {state} ({status.latency * 1000:.0f} ms)")
+
+
+FLEET_HEALTH = FleetHealth()
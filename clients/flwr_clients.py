@@ -1,119 +1,220 @@
+import hashlib
 import flwr as fl
+import numpy as np
 import tensorflow as tf
 from tensorflow import keras
+from common.configuration import RECORD_BATCH_TIMINGS, USE_TF_DATA_PIPELINE
+from common.epoch_format import EPOCH_LOG_FILENAME, EpochLogWriter
+from common.epoch_logger import EpochTimer
+from common.metrics import AVERAGES, classification_metrics, update_confusion
 fl.common.logger.logger.propagate = False
 
+# Keras' own default, the server doesn't send a batch size for evaluate()
+EVALUATION_BATCH_SIZE = 32
+
+
+def build_model(use_mnist: bool):
+    if use_mnist:
+        # small model for MNIST
+        model = keras.Sequential(
+            [
+                keras.Input(shape=(28, 28, 1)),
+                keras.layers.Conv2D(32, kernel_size=(5, 5), activation="relu"),
+                keras.layers.MaxPooling2D(pool_size=(2, 2)),
+                keras.layers.Conv2D(64, kernel_size=(3, 3), activation="relu"),
+                keras.layers.MaxPooling2D(pool_size=(2, 2)),
+                keras.layers.Flatten(),
+                keras.layers.Dropout(0.5),
+                keras.layers.Dense(10, activation="softmax"),
+            ]
+        )
+    else:
+        # let's use a larger model for cifar
+        model = tf.keras.applications.MobileNetV3Small(
+            (32, 32, 3), classes=10, weights=None
+        )
+    model.compile(
+        "adam",
+        "sparse_categorical_crossentropy",
+        metrics=[
+            "accuracy",
+        ],
+    )
+    return model
+
+
+def reset_model(model, weights):
+    """
+    Puts a model that was already trained back into the state `build_model` left it in, with `weights` as its weights.
+    The optimizer's slots and step count are zeroed instead of compiling again, so the traced train step is kept
+    """
+    model.set_weights(weights)
+    optimizer_variables = model.optimizer.variables
+    for variable in optimizer_variables() if callable(optimizer_variables) else optimizer_variables:
+        variable.assign(tf.zeros_like(variable))
+    model.reset_metrics()
+
+
+def gathered_batches(x, y, batch_size: int, shuffle: bool):
+    """
+    tf.data pipeline over (possibly memory mapped) NumPy arrays that never copies them whole. Only the indices are
+    shuffled, every batch is gathered from the arrays when it is prefetched, so the shard is never duplicated in RAM
+    """
+
+    def gather(indices):
+        return x[indices], y[indices]
+
+    def load(indices):
+        x_batch, y_batch = tf.numpy_function(gather, [indices], (tf.as_dtype(x.dtype), tf.as_dtype(y.dtype)))
+        x_batch.set_shape((None,) + x.shape[1:])
+        y_batch.set_shape((None,) + y.shape[1:])
+        return x_batch, y_batch
+
+    indices = tf.data.Dataset.range(len(x))
+    if shuffle:
+        indices = indices.shuffle(len(x), reshuffle_each_iteration=True)
+    return indices.batch(batch_size).map(load).prefetch(tf.data.AUTOTUNE)
+
+
+def parameters_fingerprint(params) -> str:
+    """Digest of the shapes, dtypes and values of a list of NumPy arrays"""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in params:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
 class DaSHFlowerClient(fl.client.NumPyClient):
     """A FlowerClient that uses MobileNetV3 for CIFAR-10 or a much smaller CNN for
     MNIST. Ideally this client should never be used"""
 
-    def __init__(self, trainset, valset, use_mnist: bool, name: str, expt_folder_name : str):
+    def __init__(
+        self,
+        trainset,
+        valset,
+        use_mnist: bool,
+        name: str,
+        expt_folder_name: str,
+        model=None,
+        use_tf_data: bool = USE_TF_DATA_PIPELINE,
+    ):
         import pathlib
         
         self.x_train, self.y_train = trainset
         self.x_val, self.y_val = valset
         self.name = name
+        # With tf.data batches are gathered from the shards by shuffled indices and every round reuses the same datasets
+        self.use_tf_data = use_tf_data
+        self.train_batches = None
+        self.val_batches = None
+        self.loaded_fingerprint: str = None  # Of the parameters the model holds, None once it has been trained
         self.experiment_folder_name = expt_folder_name
         pathlib.Path(f"Outputs/Experiments/{self.experiment_folder_name}").mkdir(parents=True, exist_ok=True)
-        # Instantiate model
-        if use_mnist:
-            # small model for MNIST
-            self.model = keras.Sequential(
-                [
-                    keras.Input(shape=(28, 28, 1)),
-                    keras.layers.Conv2D(32, kernel_size=(5, 5), activation="relu"),
-                    keras.layers.MaxPooling2D(pool_size=(2, 2)),
-                    keras.layers.Conv2D(64, kernel_size=(3, 3), activation="relu"),
-                    keras.layers.MaxPooling2D(pool_size=(2, 2)),
-                    keras.layers.Flatten(),
-                    keras.layers.Dropout(0.5),
-                    keras.layers.Dense(10, activation="softmax"),
-                ]
-            )
-        else:
-            # let's use a larger model for cifar
-            self.model = tf.keras.applications.MobileNetV3Small(
-                (32, 32, 3), classes=10, weights=None
-            )
-        self.model.compile(
-            "adam",
-            "sparse_categorical_crossentropy",
-            metrics=[
-                "accuracy",
-            ],
+        self.epoch_timer = EpochTimer(
+            EpochLogWriter(f"Outputs/Experiments/{self.experiment_folder_name}/{EPOCH_LOG_FILENAME}"),
+            record_batches=RECORD_BATCH_TIMINGS,
         )
+        # Instantiate model, unless a warm one is handed over by the client agent
+        self.model = build_model(use_mnist) if model is None else model
+
+    def train_dataset(self, batch_size: int):
+        """Reshuffled every epoch and prefetched. Only rebuilt when the server asks for another batch size"""
+        if self.train_batches is None or self.train_batches[0] != batch_size:
+            self.train_batches = (batch_size, gathered_batches(self.x_train, self.y_train, batch_size, shuffle=True))
+        return self.train_batches[1]
+
+    def val_dataset(self):
+        if self.val_batches is None:
+            self.val_batches = gathered_batches(self.x_val, self.y_val, EVALUATION_BATCH_SIZE, shuffle=False)
+        return self.val_batches
 
     def get_parameters(self, config):
+        # A fresh list every call, Keras already copies each weight once to hand it out
         return self.model.get_weights()
 
     def set_parameters(self, params):
+        # The global model evaluated at the end of a round is the one the next round's fit starts from
+        fingerprint = parameters_fingerprint(params)
+        if fingerprint == self.loaded_fingerprint:
+            return
         self.model.set_weights(params)
+        self.loaded_fingerprint = fingerprint
 
     def fit(self, parameters, config):
-        from common.epoch_logger import TimeHistory
         fl.common.logger.logger.info("Client Sampled for fit()")
         self.set_parameters(parameters)
         # Set hyperparameters from config sent by server/strategy
         batch, epochs = config["batch_size"], config["epochs"]
         # train
-        epoch_time_logger = TimeHistory()
-        self.model.fit(
-            self.x_train,
-            self.y_train,
-            epochs=epochs,
-            batch_size=batch,
-            callbacks=[epoch_time_logger],
-        )
-
-        start_times = epoch_time_logger.start_times
-        end_times = epoch_time_logger.end_times
+        epoch_time_logger = self.epoch_timer
+        epoch_time_logger.set_round(config.get("server_round", 0))
+        if self.use_tf_data:
+            self.model.fit(self.train_dataset(batch), epochs=epochs, callbacks=[epoch_time_logger])
+        else:
+            self.model.fit(
+                self.x_train,
+                self.y_train,
+                epochs=epochs,
+                batch_size=batch,
+                callbacks=[epoch_time_logger],
+            )
+        self.loaded_fingerprint = None
+        return self.get_parameters({}), len(self.x_train), {}
 
-        import csv
+    def validation_batches(self):
+        if self.use_tf_data:
+            yield from self.val_dataset()
+            return
+        for start in range(0, len(self.x_val), EVALUATION_BATCH_SIZE):
+            yield self.x_val[start : start + EVALUATION_BATCH_SIZE], self.y_val[start : start + EVALUATION_BATCH_SIZE]
 
-        with open(f"Outputs/Experiments/{self.experiment_folder_name}/epoch_logs.csv", "a", newline="") as f:
-            writer = csv.writer(f)
-            for index, (start_time, end_time) in enumerate(zip(start_times, end_times)):
-                format = (
-                    index + 1,
-                    start_time,
-                    end_time,
-                )
-                writer.writerow(format)
-        return self.get_parameters({}), len(self.x_train), {}
+    def evaluate_confusion(self):
+        """Loss and confusion matrix of the validation shard from a single inference pass"""
+        num_classes = self.model.output_shape[-1]
+        confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        loss_sum = 0.0
+        for x, y in self.validation_batches():
+            probabilities = self.model.predict_on_batch(x)
+            y = np.asarray(y).ravel()
+            loss_sum += float(np.sum(keras.losses.sparse_categorical_crossentropy(y, probabilities)))
+            update_confusion(confusion, y, np.argmax(probabilities, axis=1))
+        loss = loss_sum / max(len(self.x_val), 1)
+        if self.model.losses:
+            # Regularization terms, model.evaluate includes them as well
+            loss += float(tf.add_n(self.model.losses))
+        return loss, confusion
 
     def evaluate(self, parameters, config):
         self.set_parameters(parameters)
-        (
-            loss,
-            accuracy,
-        ) = self.model.evaluate(self.x_val, self.y_val)
+        if not config.get("log_final", False):
+            if self.use_tf_data:
+                loss, accuracy = self.model.evaluate(self.val_dataset())
+            else:
+                (
+                    loss,
+                    accuracy,
+                ) = self.model.evaluate(self.x_val, self.y_val)
+            metrics_dictionary = {
+                "acc": round(accuracy, 2),
+                "accuracy": accuracy,
+                "loss": loss,
+            }
+            return loss, len(self.x_val), metrics_dictionary
 
-        multilabel_average_options = ["micro", "macro", "weighted"]
+        # The final evaluation also needs the predictions, so everything comes out of one pass over the shard
+        loss, confusion = self.evaluate_confusion()
+        metrics = classification_metrics(confusion)
+        accuracy = metrics["accuracy"]
         metrics_dictionary = {
             "acc": round(accuracy, 2),
             "accuracy": accuracy,
             "loss": loss,
         }
-        if config.get("log_final", False):
-            ...
-        else:
-            return loss, len(self.x_val), metrics_dictionary
-
-        import numpy as np
-        from sklearn.metrics import f1_score, precision_score, recall_score
-
-        y_pred1 = self.model.predict(self.x_val)
-        y_pred = np.argmax(y_pred1, axis=1)
-        for avg in multilabel_average_options:
-            metrics_dictionary["f1 " + avg] = round(
-                f1_score(self.y_val, y_pred, average=avg, zero_division=0), 3
-            )
-            metrics_dictionary["precision " + avg] = round(
-                precision_score(self.y_val, y_pred, average=avg, zero_division=0), 3
-            )
-            metrics_dictionary["recall " + avg] = round(
-                recall_score(self.y_val, y_pred, average=avg, zero_division=0), 3
-            )
+        for avg in AVERAGES:
+            for name in ("f1", "precision", "recall"):
+                metrics_dictionary[f"{name} {avg}"] = round(metrics[f"{name} {avg}"], 3)
 
         with open(
             f'Outputs/Experiments/{self.experiment_folder_name}/{self.name}{config.get("synced", "")}.txt', "w"
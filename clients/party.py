@@ -2,9 +2,15 @@ import subprocess
 from common.experiments import Experiment
 import pathlib
 from common.log import energy_fl_logger
+from clients.ssh_pool import SSH_POOL
+from common import configuration
+
+# Agents outlive the Party objects of a single run, their ssh sessions are kept here by 'user@ip'
+AGENT_PROCESSES: dict[str, subprocess.Popen] = {}
 
 class sshRunner:
-    """Use this class primarily to run scripts in the clients/scripts/ folder"""
+    """Use this class primarily to run scripts in the clients/scripts/ folder.
+    All commands go over the shared connection to the client in `SSH_POOL`"""
 
     def __init__(self, ssh_details: str) -> None:
         self.client = ssh_details
@@ -21,7 +27,7 @@ class sshRunner:
         user_cmds += cmds[-1]
 
         cmd_string = f"""
-ssh -tt {self.client} << EOF
+{SSH_POOL.session_command(self.client, flags="-tt")} << EOF
     cd ~/Energy-FL;
     source venv/bin/activate;
     {user_cmds}
@@ -43,8 +49,9 @@ EOF
         for cmd in cmds[:-1]:
             user_cmds += f"""{cmd} ; \n    """
         user_cmds += cmds[-1]
+
         cmd_string = f"""
-ssh -tt {self.client} << EOF
+{SSH_POOL.session_command(self.client, flags="-tt")} << EOF
     cd ~/Energy-FL;
     source venv/bin/activate;
     {user_cmds}
@@ -55,6 +62,37 @@ EOF
         return subprocess.Popen(cmd_string, shell=True)
 
 
+class AgentRun:
+    """An experiment handed to a party's client agent. Waited on like the Popen of an old_client process"""
+
+    def __init__(self, party: "Party", expt_name: str) -> None:
+        self.party = party
+        self.expt_name = expt_name
+        self.returncode: int = None
+
+    def poll(self):
+        if self.returncode is None:
+            ok, state = self.party.agent_request(configuration.AGENT_STATUS, self.expt_name)
+            # An agent that stopped answering or forgot the experiment was restarted, the run is lost either way
+            if not ok or state in ("failed", "unknown"):
+                self.returncode = 1
+            elif state == "finished":
+                self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout: float = None):
+        from common.pipeline import wait_for
+
+        finished = wait_for(
+            lambda: self.poll() is not None,
+            timeout=float("inf") if timeout is None else timeout,
+            poll_interval=configuration.CLIENT_AGENT_POLL_INTERVAL,
+        )
+        if not finished:
+            raise subprocess.TimeoutExpired(f"{self.party} running {self.expt_name}", timeout)
+        return self.returncode
+
+
 class Party:
     def __init__(self, ip: str, username: str) -> None:
         self.ip = ip
@@ -88,7 +126,7 @@ if [ -d Outputs/Experiments/{exp.folder_name} ]; then echo '{num}' ; fi ;
         # SCP the file over
         res = subprocess.run(
             [
-                f"scp -r {self.username}@{self.ip}:~/Energy-FL/Outputs/Experiments/{exp.folder_name}/* ./Outputs/Experiments/{exp.folder_name}/{self.username}/ "
+                f"{SSH_POOL.scp_command(self.ssh.client, flags='-r')} {self.username}@{self.ip}:~/Energy-FL/Outputs/Experiments/{exp.folder_name}/* ./Outputs/Experiments/{exp.folder_name}/{self.username}/ "
             ],
             shell=True,
         )
@@ -98,20 +136,76 @@ if [ -d Outputs/Experiments/{exp.folder_name} ]; then echo '{num}' ; fi ;
 
     def start_client_server(
         self, agg_ip: str, agg_port: int, cid: int, dataset: str, num_parties: int, expt_name : str
-    ):
-        self.ssh.Popen(
+    ) -> subprocess.Popen:
+        return self.ssh.Popen(
             [
                 f"python -m clients.scripts.old_client --agg_ip {agg_ip} --agg_port {agg_port} --cid {cid} --dataset {dataset} --client_ip {self.ip} --num_parties {num_parties} --pi_name {self.username} --expt_name {expt_name} "
             ]
         )
     
-    def check_client_online(self):
+    def agent_request(self, command: int, payload=None, timeout: float = configuration.CLIENT_AGENT_REPLY_TIMEOUT) -> tuple:
+        """Sends one request to the party's client agent. Returns its (ok, payload) or (False, None) if it didn't answer"""
+        import zmq
+
+        # A fresh socket every time, a REQ socket that missed its reply can't be used again
+        socket = zmq.Context.instance().socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
+        socket.connect(f"tcp://{self.ip}:{configuration.CLIENT_AGENT_PORT}")
         try:
-            proc = subprocess.run(f"ssh {self.username}@{self.ip} << EOF \n exit ; \n EOF ", shell=True, timeout = 20)
-            if proc.returncode != 0:
-                return False
-            else:
-                return True
-        except:
-            return False
+            socket.send_pyobj((command, payload))
+            return socket.recv_pyobj()
+        except zmq.Again:
+            return False, None
+        finally:
+            socket.close()
+
+    def start_agent(self, timeout: float) -> bool:
+        """Makes sure the party's client agent is up, starting it if it doesn't answer. Returns False if it never came up"""
+        from common.pipeline import wait_for
+
+        if self.agent_request(configuration.AGENT_PING)[0]:
+            return True
+        energy_fl_logger.info(f"Starting the client agent on {str(self)}")
+        AGENT_PROCESSES[self.ssh.client] = self.ssh.Popen(
+            [f"python -m clients.scripts.client_agent --port {configuration.CLIENT_AGENT_PORT} --pi_name {self.username} ;"]
+        )
+        return wait_for(lambda: self.agent_request(configuration.AGENT_PING)[0], timeout=timeout)
+
+    def stop_agent(self):
+        self.agent_request(configuration.AGENT_SHUTDOWN)
+        process = AGENT_PROCESSES.pop(self.ssh.client, None)
+        if process is not None:
+            try:
+                process.wait(timeout=configuration.CLIENT_AGENT_REPLY_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def submit(self, agg_ip: str, agg_port: int, cid: int, dataset: str, num_parties: int, expt_name: str) -> AgentRun:
+        """Has the party's client agent run the experiment, the same as start_client_server without the startup"""
+        descriptor = {
+            "agg_ip": agg_ip,
+            "agg_port": agg_port,
+            "cid": cid,
+            "dataset": dataset,
+            "num_parties": num_parties,
+            "expt_name": expt_name,
+        }
+        run = AgentRun(self, expt_name)
+        ok, message = self.agent_request(configuration.AGENT_RUN, descriptor)
+        if not ok:
+            energy_fl_logger.error(f"Client agent on {str(self)} refused {expt_name}: {message}")
+            run.returncode = 1
+        return run
+
+    def start_resource_sampler(self, agg_ip: str, broadcast_port: int, resource_port: int, interval: float) -> subprocess.Popen:
+        """Streams this party's resource usage to the aggregator until the aggregator broadcasts a stop"""
+        return self.ssh.Popen(
+            [
+                f"python -m clients.scripts.resource_sampler --zmq_ip {agg_ip}:{broadcast_port} --push_ip {agg_ip}:{resource_port} --host {self.username} --interval {interval} ;"
+            ]
+        )
+
+    def check_client_online(self):
+        return SSH_POOL.check(self.ssh.client, timeout=20)
             
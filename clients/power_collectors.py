@@ -1,4 +1,5 @@
 from clients.party import sshRunner, Party
+from clients.ssh_pool import SSH_POOL
 from common.experiments import Experiment
 import subprocess
 
@@ -31,19 +32,25 @@ class PowerCollector:
             [f"./clients/scripts/connect_to_bt_multimeter.sh {self.tester_address} ;"]
         )
 
-    def collect_power_data(self, agg_ip: str):
-        self.ssh.Popen(
+    def collect_power_data(self, agg_ip: str) -> subprocess.Popen:
+        return self.ssh.Popen(
             [
                 f"""python -m clients.scripts.power_collector --filename "{self.experiment_name}" --zmq_ip {agg_ip}:{self.broadcast_port} --address {self.tester_address} ;"""
             ]
         )
     
     def copy_files_to_aggregator(self) -> bool:
-        subprocess.run([f"scp {self.ssh.client}:~/Energy-FL/Outputs/Power/{self.experiment_name}.pkl ~/Energy-FL/Outputs/Experiments/{self.experiment_folder_name}/"], shell=True)
-        from pickle import load
-        with open(f"Outputs/Experiments/{self.experiment_folder_name}/{self.experiment_name}.pkl","rb") as f:
-            val : dict = load(f)
-            return val.get("success", False)
+        from common.power_format import POWER_FILE_SUFFIX, POWER_SIDECAR_SUFFIX, read_metadata
+        remote = f"{self.ssh.client}:~/Energy-FL/Outputs/Power/{self.experiment_name}"
+        subprocess.run([f"{SSH_POOL.scp_command(self.ssh.client)} {remote}{POWER_FILE_SUFFIX} {remote}{POWER_SIDECAR_SUFFIX} ~/Energy-FL/Outputs/Experiments/{self.experiment_folder_name}/"], shell=True)
+        # The sidecar only exists if the collector shut down cleanly
+        metadata = read_metadata(f"Outputs/Experiments/{self.experiment_folder_name}/{self.experiment_name}{POWER_FILE_SUFFIX}")
+        return metadata.get("success", False)
     
+    def check_collector_online(self) -> bool:
+        return SSH_POOL.check(self.ssh.client, timeout=20)
+
     def reboot_collector(self):
+        from clients.fleet import FLEET_HEALTH
         self.ssh.run(['echo "user123" | sudo -S reboot ;'])
+        FLEET_HEALTH.invalidate(self.ssh.client)
@@ -0,0 +1,115 @@
+# ! Aggregator end of the resource sampling
+
+# * Binds the PULL socket the parties' clients/scripts/resource_sampler.py push their samples to and writes
+# * them to one resource file per host as they arrive. The aggregator samples itself from a thread in this
+# * process, so nothing has to be started, stopped or copied over SSH for resource usage any more
+
+import json
+import pathlib
+import threading
+import time
+
+from common.log import energy_fl_logger
+from common.resources import RESOURCE_FILE_SUFFIX, ResourceSampler, ResourceWriter, pack_header
+
+
+class ResourceReceiver:
+    def __init__(self, ip: str, port: int, output_paths: dict[str, pathlib.Path], local_host: str, interval: float) -> None:
+        """
+        `output_paths` maps the host name every party sends with its samples to the file they are written to.
+        `local_host` is the name of the aggregator in `output_paths`, it is sampled in process every `interval` seconds
+        """
+        self.ip = ip
+        self.port = port
+        self.output_paths = output_paths
+        self.local_host = local_host
+        self.interval = interval
+        self.writers: dict[str, ResourceWriter] = {}
+        self.ended: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.stop_local = False
+
+    def __repr__(self) -> str:
+        return f"Resource receiver on {self.ip}:{self.port} for {list(self.output_paths)}"
+
+    def start(self):
+        import zmq
+
+        self.context = zmq.Context()
+        self.pull = self.context.socket(zmq.PULL)
+        self.pull.bind(f"tcp://{self.ip}:{self.port}")
+        self.receive_thread = threading.Thread(target=self.receive_loop, daemon=True)
+        self.receive_thread.start()
+        self.local_thread = threading.Thread(target=self.sample_locally, daemon=True)
+        self.local_thread.start()
+        energy_fl_logger.debug(f"{self} started")
+
+    def sample_locally(self):
+        sampler = ResourceSampler(self.interval)
+        writer = ResourceWriter(self.output_paths[self.local_host], pack_header(time.time_ns(), time.monotonic_ns()))
+        sampler.run(should_stop=lambda: self.stop_local, emit=writer.append)
+        writer.close()
+        stats = sampler.statistics()
+        writer.write_sidecar(success=True, **stats)
+        self.ended[self.local_host] = stats
+
+    def handle(self, host: str, kind: bytes, payload: bytes):
+        if host not in self.output_paths:
+            energy_fl_logger.warning(f"Resource samples from unknown host {host}")
+        elif kind == b"header":
+            self.writers[host] = ResourceWriter(self.output_paths[host], payload)
+        elif host not in self.writers:
+            energy_fl_logger.warning(f"Resource samples from {host} arrived before its header")
+        elif kind == b"sample":
+            self.writers[host].append(payload)
+        elif kind == b"end":
+            stats = json.loads(payload)
+            writer = self.writers.pop(host)
+            writer.close()
+            writer.write_sidecar(success=not stats.get("orphaned", False), **stats)
+            self.ended[host] = stats
+
+    def receive_loop(self):
+        import zmq
+
+        poller = zmq.Poller()
+        poller.register(self.pull, zmq.POLLIN)
+        # Keeps going after the stop until every host that started has sent its end message
+        while not (self.stopping.is_set() and not self.writers):
+            if self.pull in dict(poller.poll(timeout=200)):
+                host, kind, payload = self.pull.recv_multipart()
+                with self.lock:
+                    self.handle(host.decode(), kind, payload)
+
+    def stop(self, timeout: float) -> bool:
+        """
+        Stops the local sampling and waits up to `timeout` seconds for every party to send its last samples.
+        The parties themselves stop on the aggregator's ZMQ stop broadcast.
+        Returns True if every host's samples were received completely
+        """
+        self.stop_local = True
+        self.local_thread.join()
+        self.stopping.set()
+        self.receive_thread.join(timeout=timeout)
+        with self.lock:
+            for host, writer in self.writers.items():
+                energy_fl_logger.warning(f"Resource sampling on {host} never ended, keeping what was received")
+                writer.close()
+                writer.write_sidecar(success=False)
+            for host in set(self.output_paths) - set(self.ended) - set(self.writers):
+                energy_fl_logger.warning(f"No resource samples were received from {host}")
+            self.writers.clear()
+        # With no writers left the loop exits on its next poll
+        self.receive_thread.join()
+        self.pull.close(linger=0)
+        self.context.term()
+        return set(self.ended) == set(self.output_paths)
+
+
+def resource_file_path(experiment_folder: str, host: str, is_aggregator: bool = False) -> pathlib.Path:
+    """Parties' files go in their own folder, the aggregator's in the top level of the experiment folder"""
+    folder = pathlib.Path(f"Outputs/Experiments/{experiment_folder}")
+    if not is_aggregator:
+        folder = folder / host
+    return folder / f"{host}-resources{RESOURCE_FILE_SUFFIX}"
@@ -0,0 +1,129 @@
+# This script keeps a party's flower client warm between experiments
+
+# * Started once per party and then handed experiments by the aggregator over a ZMQ REP socket.
+# * TensorFlow stays imported, every shard the party has trained on stays mapped and one compiled model per
+# * dataset is kept and reset between runs, so starting a client costs next to nothing
+
+import argparse
+import threading
+import zmq
+from common.log import energy_fl_logger
+from common.configuration import (
+    AGENT_PING,
+    AGENT_RUN,
+    AGENT_SHUTDOWN,
+    AGENT_STATUS,
+    CLIENT_AGENT_PORT,
+)
+
+parser = argparse.ArgumentParser(description="Warm Flower client of a party")
+parser.add_argument("--port", help="Port the agent listens for experiments on", type=int, default=CLIENT_AGENT_PORT)
+parser.add_argument("--pi_name", help="Name of the RPI", type=str, required=True)
+args = parser.parse_args()
+
+# Imported once for the lifetime of the agent, this is most of what a fresh client spends its startup on
+import flwr as fl
+from clients.flwr_clients import DaSHFlowerClient, build_model, reset_model
+from common.datasets import load_shard
+
+
+class ClientAgent:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.shards = {}  # (dataset, num_parties, cid) -> (trainset, valset)
+        self.models = {}  # dataset -> (model, initial weights)
+        self.lock = threading.Lock()
+        self.current: str = None
+        self.results: dict[str, bool] = {}  # Experiment folder -> whether the client ran without errors
+        self.worker: threading.Thread = None
+
+    def shard(self, dataset: str, num_parties: int, cid: int):
+        key = (dataset, num_parties, cid)
+        if key not in self.shards:
+            self.shards[key] = load_shard(dataset, num_parties, cid)
+        return self.shards[key]
+
+    def model(self, dataset: str):
+        """The cached model of `dataset` reset to its initial weights and a fresh optimizer"""
+        if dataset not in self.models:
+            model = build_model(use_mnist=dataset == "mnist")
+            self.models[dataset] = (model, model.get_weights())
+        model, weights = self.models[dataset]
+        reset_model(model, weights)
+        return model
+
+    def run(self, descriptor: dict):
+        import pathlib
+
+        expt_name = descriptor["expt_name"]
+        success = False
+        try:
+            folder = pathlib.Path(f"Outputs/Experiments/{expt_name}")
+            folder.mkdir(parents=True, exist_ok=True)
+            trainset, valset = self.shard(descriptor["dataset"], descriptor["num_parties"], descriptor["cid"])
+            fl.client.start_numpy_client(
+                server_address=f"{descriptor['agg_ip']}:{descriptor['agg_port']}",
+                client=DaSHFlowerClient(
+                    trainset=trainset,
+                    valset=valset,
+                    use_mnist=descriptor["dataset"] == "mnist",
+                    name=self.name,
+                    expt_folder_name=expt_name,
+                    model=self.model(descriptor["dataset"]),
+                ),
+            )
+            success = True
+        except Exception:
+            energy_fl_logger.exception(f"Client crashed while running {expt_name}")
+        finally:
+            with self.lock:
+                self.results[expt_name] = success
+                self.current = None
+
+    def submit(self, descriptor: dict) -> tuple[bool, str]:
+        with self.lock:
+            if self.current is not None:
+                return False, f"Busy with {self.current}"
+            self.current = descriptor["expt_name"]
+            self.results.pop(self.current, None)
+        self.worker = threading.Thread(target=self.run, args=[descriptor], daemon=True)
+        self.worker.start()
+        energy_fl_logger.info(f"Started {descriptor['expt_name']}")
+        return True, descriptor["expt_name"]
+
+    def status(self, expt_name: str) -> str:
+        """'running', 'finished', 'failed' or 'unknown' for an experiment this agent was never handed"""
+        with self.lock:
+            if self.current == expt_name:
+                return "running"
+            if expt_name not in self.results:
+                return "unknown"
+            return "finished" if self.results[expt_name] else "failed"
+
+    def serve(self, port: int):
+        context = zmq.Context()
+        socket = context.socket(zmq.REP)
+        socket.bind(f"tcp://*:{port}")
+        energy_fl_logger.info(f"Client agent of {self.name} listening on {port}")
+        try:
+            while True:
+                command, payload = socket.recv_pyobj()
+                if command == AGENT_PING:
+                    socket.send_pyobj((True, self.current))
+                elif command == AGENT_RUN:
+                    socket.send_pyobj(self.submit(payload))
+                elif command == AGENT_STATUS:
+                    socket.send_pyobj((True, self.status(payload)))
+                elif command == AGENT_SHUTDOWN:
+                    socket.send_pyobj((True, None))
+                    break
+                else:
+                    socket.send_pyobj((False, f"Unknown command {command}"))
+        finally:
+            socket.close()
+            context.term()
+        if self.worker is not None and self.worker.is_alive():
+            energy_fl_logger.warning(f"Shutting down while {self.current} is still running")
+
+
+ClientAgent(args.pi_name).serve(args.port)
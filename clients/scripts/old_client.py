@@ -1,9 +1,5 @@
-import os
 import flwr as fl
 import argparse
-import csv
-import math
-import tensorflow as tf
 
 parser = argparse.ArgumentParser(description="Flower Embedded devices")
 NUM_CLIENTS = -1
@@ -69,49 +65,15 @@ EXPT_NAME = args.expt_name
 import pathlib
 pathlib.Path(f"Outputs/Experiments/{EXPT_NAME}").mkdir(parents=True, exist_ok=True)
 
-with open(f"Outputs/Experiments/{EXPT_NAME}/epoch_logs.csv", "w") as f:
-    ...
-
 from clients.flwr_clients import DaSHFlowerClient
-
-
-def prepare_dataset(use_mnist: bool):
-    """Download and partitions the CIFAR-10/MNIST dataset."""
-    global NUM_CLIENTS
-
-    if use_mnist:
-        (x_train, y_train), testset = tf.keras.datasets.mnist.load_data()
-    else:
-        (x_train, y_train), testset = tf.keras.datasets.cifar10.load_data()
-    partitions = []
-    # We keep all partitions equal-sized in this example
-    partition_size = math.floor(len(x_train) / NUM_CLIENTS)
-    for cid in range(NUM_CLIENTS):
-        # Split dataset into non-overlapping NUM_CLIENT partitions
-        idx_from, idx_to = int(cid) * partition_size, (int(cid) + 1) * partition_size
-
-        x_train_cid, y_train_cid = (
-            x_train[idx_from:idx_to] / 255.0,
-            y_train[idx_from:idx_to],
-        )
-
-        # now partition into train/validation
-        # Use 10% of the client's training data for validation
-        split_idx = math.floor(len(x_train_cid) * 0.9)
-
-        client_train = (x_train_cid[:split_idx], y_train_cid[:split_idx])
-        client_val = (x_train_cid[split_idx:], y_train_cid[split_idx:])
-        partitions.append((client_train, client_val))
-
-    return partitions, testset
+from common.datasets import load_shard
 
 
 def main():
     use_mnist = True if args.dataset == "mnist" else False
 
-    # Download CIFAR-10 dataset and partition it
-    partitions, _ = prepare_dataset(use_mnist)
-    trainset, valset = partitions[args.cid]
+    # Memory map this client's shard, it is cut from the dataset on the first run
+    trainset, valset = load_shard(args.dataset, NUM_CLIENTS, args.cid)
 
     server_address = args.agg_ip + ":" + args.agg_port
 
@@ -123,26 +85,5 @@ def main():
         ),
     )
 
-    # Epoch Logs made prettier
-    with open(f"Outputs/Experiments/{EXPT_NAME}/epoch_logs.csv", "r") as f, open(
-        f"Outputs/Experiments/{EXPT_NAME}/temp.csv", "w", newline=""
-    ) as g:
-        rdr = csv.reader(f)
-        wtr = csv.writer(g)
-        round_count = 1
-        previous_epoch = 0
-
-        for row in rdr:
-            epoch, start, end = row
-            epoch = int(epoch)
-            if epoch > previous_epoch:
-                previous_epoch = epoch
-            else:
-                round_count += 1
-                previous_epoch = epoch
-            wtr.writerow((round_count, epoch, start, end))
-    os.remove(f"Outputs/Experiments/{EXPT_NAME}/epoch_logs.csv")
-    os.rename(f"Outputs/Experiments/{EXPT_NAME}/temp.csv", f"Outputs/Experiments/{EXPT_NAME}/epoch_logs.csv")
-
 
 main()
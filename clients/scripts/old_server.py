@@ -29,6 +29,7 @@ def fit_config(server_round: int):
         "batch_size": batch_size
         if batch_size
         else 16,  # Batch size to use by clients during fit()
+        "server_round": server_round,  # Clients tag their epoch timings with it
     }
     return config
 
@@ -47,8 +48,11 @@ def evaluate_config(server_round: int):
     return {"log_final": log_final, "synced": synced}
 
 
-def main(args: dict = None):
+def main(args: dict = None, aggregator=None):
     """
+    If an `aggregator` with ZMQ already set up is passed, the start and end of every round
+    is broadcast to the power collectors so they can mark it in their power files
+
     Pass args as a dictionary with the keys :
 
     ```
@@ -91,6 +95,7 @@ def main(args: dict = None):
             evaluate_metrics_aggregation_fn=weighted_average,
             on_evaluate_config_fn=evaluate_config,
             proximal_mu=proximal_mu,
+            tensor_type=config.PARAMETERS_TENSOR_TYPE,
         )
     else:
         strategy = fusion(
@@ -101,14 +106,23 @@ def main(args: dict = None):
             min_available_clients=min_num_clients,
             evaluate_metrics_aggregation_fn=weighted_average,
             on_evaluate_config_fn=evaluate_config,
+            tensor_type=config.PARAMETERS_TENSOR_TYPE,
         )
 
     server_address = (
         str(config.IP_AGGREGATOR) + ":" + str(config.AGGREGATOR_FLOWER_SERVER_PORT)
     )
 
+    server = fl.server.Server(
+        client_manager=fl.server.SimpleClientManager(), strategy=strategy
+    )
+    if aggregator is not None:
+        server.set_event_listener(
+            lambda event, server_round: aggregator.ZMQ_mark((event, server_round))
+        )
+
     fl.server.start_server(
         server_address=server_address,
+        server=server,
         config=fl.server.ServerConfig(num_rounds=rounds),
-        strategy=strategy,
     )
@@ -6,26 +6,44 @@ SET_DATA_GROUP_FIVE = 0xA5
 DIM_SCREEN = 0xD0
 SET_SCREENSAVER = 0xE1
 
-STOP_POWER_COLLECTION = 300
+FRAME_SIZE = 130
+FRAME_START_MARKER = 0x0963
+FRAME_STOP_MARKER = 0xFFF1
+
 STOP_COLLECTING = False
 SUCCESS = False
+ORPHANED = False
+MARKS: list = []
 
 import bluetooth
-import pickle
+import collections
 import struct
-import os
 import time
 import threading
 import zmq
 import argparse
 from common.log import energy_fl_logger
+from common.configuration import POWER_SAMPLE_INTERVAL
+from common.configuration import (
+    ZMQ_START_POWER_COLLECTION,
+    ZMQ_STOP_POWER_COLLECTION,
+    ZMQ_MARK,
+    ZMQ_HEARTBEAT,
+    POWER_COLLECTOR_ORPHAN_TIMEOUT,
+)
+from common.power_format import PowerWriter, POWER_FILE_SUFFIX, marker_event
+
+PENDING_MARKS = collections.deque()  # Marks not yet written into the power file
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
     "--zmq_ip", help="ZMQ Port that aggregator is broadcasting on", type=str
 )
 parser.add_argument("--address", help="Address of the bluetooth multimeter", type=str)
-parser.add_argument("--filename", help="Filename of the pkl file", type=str)
+parser.add_argument("--filename", help="Filename of the power file, without the extension", type=str)
+parser.add_argument(
+    "--interval", help="Seconds between two samples", type=float, default=POWER_SAMPLE_INTERVAL
+)
 args = parser.parse_args()
 
 ZMQ_BROADCAST_ADDRESS, UM25C_ADDRESS, name = args.zmq_ip, args.address, args.filename
@@ -38,24 +56,51 @@ def connect_to_usb_tester(bt_addr):
     for _ in range(10):
         try:
             read_data(sock)
-        except bluetooth.BluetoothError as e:
+        except (bluetooth.BluetoothError, FrameError) as e:
+            error = e
+            drain(sock)
             time.sleep(0.2)
         else:
             break
     else:
-        raise e
+        raise error
     return sock
 
 
-def read_data(sock):
-    sock.send(bytes([REQUEST_DATA_DUMP]))
+class FrameError(Exception):
+    """The tester sent something that isn't a single well formed 130 byte frame"""
+
+
+def receive_frame(sock) -> bytes:
     d = bytes()
-    while len(d) < 130:
+    while len(d) < FRAME_SIZE:
         d += sock.recv(1024)
-    assert len(d) == 130, len(d)
+    if len(d) != FRAME_SIZE:
+        raise FrameError(f"Received {len(d)} bytes instead of {FRAME_SIZE}")
+    start, = struct.unpack_from("!H", d, 0)
+    stop, = struct.unpack_from("!H", d, FRAME_SIZE - 2)
+    if start != FRAME_START_MARKER or stop != FRAME_STOP_MARKER:
+        raise FrameError(f"Bad frame markers {start:#06x} {stop:#06x}")
     return d
 
 
+def read_data(sock):
+    sock.send(bytes([REQUEST_DATA_DUMP]))
+    return receive_frame(sock)
+
+
+def drain(sock):
+    """Throws away whatever is left in the socket so the next frame starts on a frame boundary"""
+    sock.settimeout(0.05)
+    try:
+        while sock.recv(1024):
+            ...
+    except bluetooth.BluetoothError:
+        ...
+    finally:
+        sock.settimeout(1.0)
+
+
 def set_initial_parameters(sock):
     sock.send(bytes([SET_DATA_GROUP_FIVE]))
     time.sleep(0.1)
@@ -66,8 +111,7 @@ def set_initial_parameters(sock):
     sock.send(bytes([CLEAR_DATA_GROUP]))
 
 
-def read_measurements(sock):
-    d = read_data(sock)
+def parse_frame(d: bytes) -> dict:
     voltage, current, power = [x / 1000 for x in struct.unpack("!HHI", d[2:10])]
     current = current / 10
     mAh, mWh = [x for x in struct.unpack("!II", d[102:110])]
@@ -80,55 +124,168 @@ def read_measurements(sock):
     }
 
 
+def read_measurements(sock):
+    return parse_frame(read_data(sock))
+
+
+class UM25CSampler:
+    """
+    Samples the tester on a fixed monotonic cadence. Sample k is requested at start + k * interval
+    no matter how long the previous one took, so the rate doesn't drift over long runs.
+    Slots that are missed because the tester was slow are counted as dropped instead of shifting every later sample.
+
+    The next data dump is requested before the previous frame is parsed and written,
+    so the parsing overlaps with the tester preparing its response
+    """
+
+    def __init__(self, sock, writer: PowerWriter, interval: float) -> None:
+        self.sock = sock
+        self.writer = writer
+        self.interval_ns = int(interval * 1e9)
+        self.samples = 0
+        self.failures = 0
+        self.invalid_frames = 0
+        self.dropped_slots = 0
+        self.started_ns = None
+        self.stopped_ns = None
+
+    def write_marks(self, before_ns: int):
+        """Writes the marks received before `before_ns` so the file stays ordered by time"""
+        while PENDING_MARKS and PENDING_MARKS[0][0] < before_ns:
+            t_ns, label = PENDING_MARKS.popleft()
+            self.writer.append_marker(t_ns, *marker_event(label))
+
+    def store(self, t_ns: int, frame: bytes):
+        self.write_marks(before_ns=t_ns)
+        d = parse_frame(frame)
+        self.writer.append(t_ns, d["voltage"], d["current"], d["power"], d["mAh"], d["mWh"])
+        self.samples += 1
+
+    def wait_for_slot(self, next_slot_ns: int) -> int:
+        """Sleeps until the next slot and returns it. If the slot already passed, skips to the latest one that started"""
+        now = time.monotonic_ns()
+        if now < next_slot_ns:
+            time.sleep((next_slot_ns - now) / 1e9)
+            return next_slot_ns
+        missed = (now - next_slot_ns) // self.interval_ns
+        self.dropped_slots += missed
+        return next_slot_ns + missed * self.interval_ns
+
+    def run(self, should_stop) -> None:
+        global SUCCESS
+
+        self.started_ns = next_slot = time.monotonic_ns()
+        pending = None
+        while not should_stop():
+            next_slot = self.wait_for_slot(next_slot)
+            requested_ns = time.monotonic_ns()
+            try:
+                self.sock.send(bytes([REQUEST_DATA_DUMP]))
+                if pending is not None:
+                    self.store(*pending)
+                    pending = None
+                frame = receive_frame(self.sock)
+            except FrameError as e:
+                self.invalid_frames += 1
+                energy_fl_logger.debug(f"Dropped a frame : {e}")
+                drain(self.sock)
+            except bluetooth.BluetoothError as e:
+                self.failures += 1
+                if not (self.failures % 10):
+                    SUCCESS = False
+                    energy_fl_logger.warning(f"Failcount is currently : {self.failures} Exception : {e}")
+                drain(self.sock)
+            except Exception as e:
+                energy_fl_logger.error(f"Reading Measurements failed due to unknown error {e}")
+                SUCCESS = False
+            else:
+                # The measurement is taken somewhere between the request and the response
+                pending = ((requested_ns + time.monotonic_ns()) // 2, frame)
+            next_slot += self.interval_ns
+        if pending is not None:
+            self.store(*pending)
+        self.stopped_ns = time.monotonic_ns()
+        self.write_marks(before_ns=self.stopped_ns + 1)
+
+    def statistics(self) -> dict:
+        elapsed = (self.stopped_ns - self.started_ns) / 1e9 if self.stopped_ns else 0
+        return {
+            "samples": self.samples,
+            "failures": self.failures,
+            "invalid_frames": self.invalid_frames,
+            "dropped_slots": self.dropped_slots,
+            "interval": self.interval_ns / 1e9,
+            "achieved_rate": self.samples / elapsed if elapsed else 0.0,
+        }
+
+
 def collect(
     interval: float,
 ):
-    from datetime import datetime as dt
-
     global UM25C_ADDRESS
     global STOP_COLLECTING
     global SUCCESS
 
-    filepath = f"Outputs/Power/{name}.pkl"
+    filepath = f"Outputs/Power/{name}{POWER_FILE_SUFFIX}"
     sock = connect_to_usb_tester(UM25C_ADDRESS)
     SUCCESS = True
-    fail_count = 0
-    with open(filepath, "wb") as f:
+    writer = PowerWriter(filepath, wall_ns=time.time_ns(), monotonic_ns=time.monotonic_ns())
+    sampler = UM25CSampler(sock, writer, interval)
+    try:
         set_initial_parameters(sock)
-        while not STOP_COLLECTING:
-            try:
-                d = read_measurements(sock)
-            except bluetooth.BluetoothError as e:
-                time.sleep(0.1)
-                fail_count+=1
-                if not (fail_count % 10): 
-                    SUCCESS = False
-                    energy_fl_logger.warning(f"Failcount is currently : {fail_count} Exception : {e}")
-                continue
-            except Exception as e:
-                energy_fl_logger.error(f"Reading Measurements failed due to unknown error {e}")
-                SUCCESS = False
-            # Time with seconds to 3 decimal points
-            now = dt.now().strftime(r"%H:%M:%S.%f")[:-3]
-            pickle.dump((now, d), f)
-            time.sleep(interval)
-    energy_fl_logger.info("Stopped Power Collection")
+        # The settings commands have no response, but make sure nothing stray is left before sampling
+        drain(sock)
+        sampler.run(should_stop=lambda: STOP_COLLECTING)
+    finally:
+        writer.close()
+        stats = sampler.statistics()
+        writer.write_sidecar(success=SUCCESS and not ORPHANED, orphaned=ORPHANED, marks=MARKS, **stats)
+    energy_fl_logger.info(
+        f"Stopped Power Collection. {stats['samples']} samples at {stats['achieved_rate']:.2f} Hz, "
+        f"{stats['dropped_slots']} dropped slots, {stats['invalid_frames']} invalid frames, {stats['failures']} failures"
+    )
     sock.close()
 
 
-def wait_until_ready(value, SOCKET) -> None:
-    finished = False
-    while finished is False:
-        try:
-            response = SOCKET.recv_pyobj(flags=zmq.NOBLOCK)
-        except zmq.ZMQError:
+def mark(label) -> None:
+    marked = (time.monotonic_ns(), label)
+    MARKS.append(marked)
+    PENDING_MARKS.append(marked)
+    energy_fl_logger.debug(f"Marked {label}")
+
+
+def control_loop(SOCKET) -> None:
+    """
+    Blocks on the aggregator's broadcasts until it asks to stop. Nothing is polled in between,
+    so this thread sits at ~0% CPU while the measurement is running.
+    Stops on its own if the aggregator goes silent for POWER_COLLECTOR_ORPHAN_TIMEOUT seconds
+    """
+    global ORPHANED
+
+    poller = zmq.Poller()
+    poller.register(SOCKET, zmq.POLLIN)
+    last_heard = time.monotonic()
+    while True:
+        events = dict(poller.poll(timeout=POWER_COLLECTOR_ORPHAN_TIMEOUT * 1000 / 4))
+        if SOCKET not in events:
+            if time.monotonic() - last_heard > POWER_COLLECTOR_ORPHAN_TIMEOUT:
+                energy_fl_logger.error(f"Nothing heard from the aggregator in {POWER_COLLECTOR_ORPHAN_TIMEOUT} seconds. Stopping")
+                ORPHANED = True
+                return
+            continue
+
+        last_heard = time.monotonic()
+        command, payload = SOCKET.recv_pyobj()
+        if command == ZMQ_STOP_POWER_COLLECTION:
+            return
+        elif command == ZMQ_START_POWER_COLLECTION:
+            mark("start")
+        elif command == ZMQ_MARK:
+            mark(payload)
+        elif command == ZMQ_HEARTBEAT:
             ...
         else:
-            if response == value:
-                finished = True
-                return
-            else:
-                time.sleep(3)
+            energy_fl_logger.warning(f"Unknown command {command} from the aggregator")
 
 
 CONTEXT = zmq.Context()
@@ -136,27 +293,18 @@ SOCKET = CONTEXT.socket(zmq.SUB)
 SOCKET.connect(f"tcp://{ZMQ_BROADCAST_ADDRESS}")
 SOCKET.setsockopt(zmq.SUBSCRIBE, b"")
 
-interval = 0.25
+interval = args.interval
 thread = threading.Thread(
     target=collect,
     args=[interval],
 )
 thread.start()
-wait_until_ready(STOP_POWER_COLLECTION, SOCKET)
+control_loop(SOCKET)
 STOP_COLLECTING = True
 thread.join()
+SOCKET.close()
+CONTEXT.term()
 
-with open(f"Outputs/Power/{name}.pkl",'rb') as f, open('Outputs/Power/temp.pkl',"wb") as g:
-    pickle.dump({"success": SUCCESS}, g)
-    while True:
-        try:
-            val = pickle.load(f)
-            pickle.dump(val, g)
-        except EOFError:
-            break
-
-os.remove(f"Outputs/Power/{name}.pkl")
-os.rename("Outputs/Power/temp.pkl", f"Outputs/Power/{name}.pkl")
 
 """
 https://sigrok.org/wiki/RDTech_UM24C
@@ -0,0 +1,90 @@
+# This script samples the resource usage of a party and streams it to the aggregator
+
+STOP_SAMPLING = False
+ORPHANED = False
+
+import json
+import time
+import threading
+import zmq
+import argparse
+from common.log import energy_fl_logger
+from common.configuration import (
+    RESOURCE_SAMPLE_INTERVAL,
+    ZMQ_STOP_POWER_COLLECTION,
+    POWER_COLLECTOR_ORPHAN_TIMEOUT,
+)
+from common.resources import ResourceSampler, pack_header
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--zmq_ip", help="ZMQ Port that aggregator is broadcasting on", type=str
+)
+parser.add_argument(
+    "--push_ip", help="ZMQ Port that aggregator receives the resource samples on", type=str
+)
+parser.add_argument("--host", help="Name the samples are stored under on the aggregator", type=str)
+parser.add_argument(
+    "--interval", help="Seconds between two samples", type=float, default=RESOURCE_SAMPLE_INTERVAL
+)
+args = parser.parse_args()
+
+HOST = args.host.encode()
+
+
+def sample(PUSH, interval: float):
+    """Every message is (host, kind, payload). The header goes first so the aggregator can place the samples in time"""
+    sampler = ResourceSampler(interval)
+    PUSH.send_multipart([HOST, b"header", pack_header(time.time_ns(), time.monotonic_ns())])
+    sampler.run(
+        should_stop=lambda: STOP_SAMPLING,
+        emit=lambda record: PUSH.send_multipart([HOST, b"sample", record]),
+    )
+    stats = sampler.statistics()
+    stats["orphaned"] = ORPHANED
+    PUSH.send_multipart([HOST, b"end", json.dumps(stats).encode()])
+    energy_fl_logger.info(f"Stopped Resource Sampling. {stats['samples']} samples at {stats['achieved_rate']:.2f} Hz")
+
+
+def control_loop(SOCKET) -> None:
+    """Waits for the aggregator's stop broadcast, giving up if it goes silent for POWER_COLLECTOR_ORPHAN_TIMEOUT seconds"""
+    global ORPHANED
+
+    poller = zmq.Poller()
+    poller.register(SOCKET, zmq.POLLIN)
+    last_heard = time.monotonic()
+    while True:
+        events = dict(poller.poll(timeout=POWER_COLLECTOR_ORPHAN_TIMEOUT * 1000 / 4))
+        if SOCKET not in events:
+            if time.monotonic() - last_heard > POWER_COLLECTOR_ORPHAN_TIMEOUT:
+                energy_fl_logger.error(f"Nothing heard from the aggregator in {POWER_COLLECTOR_ORPHAN_TIMEOUT} seconds. Stopping")
+                ORPHANED = True
+                return
+            continue
+
+        last_heard = time.monotonic()
+        command, payload = SOCKET.recv_pyobj()
+        if command == ZMQ_STOP_POWER_COLLECTION:
+            return
+
+
+CONTEXT = zmq.Context()
+SOCKET = CONTEXT.socket(zmq.SUB)
+SOCKET.connect(f"tcp://{args.zmq_ip}")
+SOCKET.setsockopt(zmq.SUBSCRIBE, b"")
+PUSH = CONTEXT.socket(zmq.PUSH)
+# Queued samples still get delivered after the stop, but a dead aggregator can't keep the script alive forever
+PUSH.setsockopt(zmq.LINGER, 10000)
+PUSH.connect(f"tcp://{args.push_ip}")
+
+thread = threading.Thread(
+    target=sample,
+    args=[PUSH, args.interval],
+)
+thread.start()
+control_loop(SOCKET)
+STOP_SAMPLING = True
+thread.join()
+SOCKET.close()
+PUSH.close()
+CONTEXT.term()
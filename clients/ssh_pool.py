@@ -0,0 +1,158 @@
+# ! Shared pool of multiplexed SSH connections
+
+# * Every host gets one OpenSSH ControlMaster connection that all ssh and scp calls to that host ride on.
+# * Only the first command pays for the TCP handshake, key exchange and login, every command after that
+# * opens a new channel on the existing connection which takes milliseconds
+
+import pathlib
+import subprocess
+import threading
+
+from common.log import energy_fl_logger
+
+CONTROL_DIR = pathlib.Path("~/.ssh/energy-fl").expanduser()
+
+
+class SSHSessionPool:
+    def __init__(
+        self,
+        control_dir: pathlib.Path = CONTROL_DIR,
+        persist: int = 600,
+        connect_timeout: int = 10,
+        keepalive_interval: int = 5,
+    ) -> None:
+        """
+        `persist` is how many seconds an idle master connection stays up,
+        `keepalive_interval` is used so that a master to a host that went down is dropped after two missed keepalives
+        """
+        self.control_dir = control_dir
+        self.persist = persist
+        self.connect_timeout = connect_timeout
+        self.keepalive_interval = keepalive_interval
+        self.control_dir_ready = False
+        self.lock = threading.Lock()
+        self.host_locks: dict[str, threading.Lock] = {}
+
+    def __repr__(self) -> str:
+        return f"SSH session pool in {self.control_dir} with {len(self.host_locks)} hosts"
+
+    def prepare_control_dir(self):
+        """Creates the directory of the control sockets the first time a command needs it, not on import"""
+        with self.lock:
+            if not self.control_dir_ready:
+                self.control_dir.mkdir(parents=True, exist_ok=True)
+                self.control_dir.chmod(0o700)
+                self.control_dir_ready = True
+
+    def control_path(self, host: str) -> pathlib.Path:
+        return self.control_dir / host
+
+    def options(self, host: str, shared: bool = True) -> str:
+        """
+        Every command line that can start a master goes through here.
+        With `shared` off the command gets a connection of its own and can never be left running as a master
+        """
+        keepalive = f"-o ServerAliveInterval={self.keepalive_interval} -o ServerAliveCountMax=2"
+        if not shared:
+            return f"-o ControlMaster=no -o ControlPath=none {keepalive}"
+        self.prepare_control_dir()
+        return (
+            f"-o ControlMaster=auto -o ControlPath={self.control_path(host)} -o ControlPersist={self.persist} "
+            f"{keepalive}"
+        )
+
+    def ssh_command(self, host: str, flags: str = "", shared: bool = True) -> str:
+        """Returns the ssh command line (without the remote command) to reach `host` through its shared connection"""
+        return f"ssh {flags} {self.options(host, shared)} {host}"
+
+    def session_command(self, host: str, flags: str = "") -> str:
+        """
+        Like `ssh_command`, but opens the shared connection first. If it cannot be opened the command connects on its
+        own instead, rather than becoming a master that keeps its caller's pipes open for `persist` seconds
+        """
+        shared = self.ensure(host)
+        if not shared:
+            energy_fl_logger.warning(f"Running a command on {host} without the shared SSH connection")
+        return self.ssh_command(host, flags, shared)
+
+    def scp_command(self, host: str, flags: str = "") -> str:
+        """Returns the scp command line (without the paths) that copies to or from `host` through its shared connection"""
+        return f"scp {flags} {self.options(host)}"
+
+    def _host_lock(self, host: str) -> threading.Lock:
+        with self.lock:
+            if host not in self.host_locks:
+                self.host_locks[host] = threading.Lock()
+            return self.host_locks[host]
+
+    def is_connected(self, host: str) -> bool:
+        """Checks whether the master connection for `host` is up, without touching the network"""
+        proc = subprocess.run(
+            f"ssh -o ControlPath={self.control_path(host)} -O check {host}",
+            shell=True,
+            capture_output=True,
+        )
+        return proc.returncode == 0
+
+    def connect(self, host: str) -> bool:
+        # -N runs no remote command and -f backgrounds the master once it is authenticated.
+        # The master keeps the pipes it inherits open, so they must not be captured here
+        try:
+            proc = subprocess.run(
+                f"ssh -N -f -o BatchMode=yes -o ConnectTimeout={self.connect_timeout} -o ControlMaster=yes {self.options(host)} {host}",
+                shell=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.connect_timeout + 5,
+            )
+        except subprocess.TimeoutExpired:
+            energy_fl_logger.warning(f"Timed out opening an SSH connection to {host}")
+            return False
+        if proc.returncode != 0:
+            energy_fl_logger.warning(f"Could not open an SSH connection to {host}")
+            return False
+        energy_fl_logger.debug(f"Opened shared SSH connection to {host}")
+        return True
+
+    def ensure(self, host: str) -> bool:
+        """Makes sure there is a working master connection to `host`, reconnecting if it went stale"""
+        with self._host_lock(host):
+            if self.is_connected(host):
+                return True
+            # A master that died leaves its socket behind which stops a new master from binding
+            self.control_path(host).unlink(missing_ok=True)
+            return self.connect(host)
+
+    def check(self, host: str, timeout: float = 20) -> bool:
+        """Health check. Runs a no-op on `host` through the shared connection"""
+        if not self.ensure(host):
+            return False
+        try:
+            proc = subprocess.run(
+                f"{self.ssh_command(host)} true",
+                shell=True,
+                capture_output=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            self.close(host)
+            return False
+        return proc.returncode == 0
+
+    def close(self, host: str):
+        subprocess.run(
+            f"ssh -o ControlPath={self.control_path(host)} -O exit {host}",
+            shell=True,
+            capture_output=True,
+        )
+        self.control_path(host).unlink(missing_ok=True)
+
+    def close_all(self):
+        with self.lock:
+            hosts = list(self.host_locks)
+        for host in hosts:
+            self.close(host)
+
+
+SSH_POOL = SSHSessionPool()
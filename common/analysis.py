@@ -0,0 +1,429 @@
+# ! Energy attribution for finished experiments
+
+# * Loads the epoch logs, power files and resource (or SAR) files of every experiment folder into NumPy arrays,
+# * lines them up on one time axis with searchsorted and computes per epoch and per round energy,
+# * resource usage and energy per training sample
+# * Run `python -m common.analysis` on the aggregator to analyze everything in Outputs/Experiments,
+# * experiments that didn't change since the last run are read back from common.results_cache
+
+# * Every time is in seconds since local midnight of the day the experiment started
+
+import csv
+import pathlib
+import struct
+import time
+
+import numpy as np
+
+from .datasets import TRAIN_SET_SIZES, partition_bounds
+from .epoch_format import EPOCH, EPOCH_LOG_FILENAME, load_epoch_log
+from .log import energy_fl_logger
+from .power_format import (
+    MARK_EVENTS,
+    POWER_FILE_SUFFIX,
+    load_power,
+    markers,
+    samples,
+    wall_clock_ns,
+)
+from .resources import RESOURCE_FILE_SUFFIX, load_resource_file
+from .sar import load_sar
+
+EXPERIMENTS_DIR = pathlib.Path("Outputs/Experiments")
+RESULTS_DIR = pathlib.Path("Outputs/Results")
+
+# What a truncated, unreadable or malformed file raises while an experiment folder is parsed
+PARSE_ERRORS = (OSError, ValueError, KeyError, IndexError, struct.error)
+
+EXPERIMENT_DTYPE = [
+    ("experiment", "U128"),
+    ("version", "U16"),
+    ("model", "U16"),
+    ("fusion", "U16"),
+    ("dataset", "U16"),
+    ("batch_size", "i4"),
+    ("rounds", "i4"),
+    ("epochs", "i4"),
+    ("sample_fraction", "f8"),
+    ("proximal_mu", "f8"),
+    ("num_parties", "i4"),
+    ("run", "i4"),
+]
+
+RESOURCE_DTYPE = [
+    ("cpu_percent", "f8"),
+    ("mem_percent", "f8"),
+    ("disk_read_kBps", "f8"),
+    ("disk_write_kBps", "f8"),
+    ("net_rx_kBps", "f8"),
+    ("net_tx_kBps", "f8"),
+]
+
+EPOCH_DTYPE = (
+    EXPERIMENT_DTYPE
+    + [
+        ("party", "U32"),
+        ("round", "i4"),
+        ("epoch", "i4"),
+        ("start", "f8"),
+        ("end", "f8"),
+        ("duration", "f8"),
+        ("energy_J", "f8"),
+        ("mean_power_W", "f8"),
+        ("J_per_sample", "f8"),
+    ]
+    + RESOURCE_DTYPE
+)
+
+ROUND_DTYPE = (
+    EXPERIMENT_DTYPE
+    + [
+        ("party", "U32"),
+        ("phase", "U16"),
+        ("round", "i4"),
+        ("start", "f8"),
+        ("end", "f8"),
+        ("duration", "f8"),
+        ("energy_J", "f8"),
+        ("mean_power_W", "f8"),
+    ]
+    + RESOURCE_DTYPE
+)
+
+
+def parse_folder_name(folder_name: str):
+    """Inverse of Experiment.folder_name. Returns None for folders that aren't experiments"""
+    parts = folder_name.split("_")
+    if len(parts) != 11:
+        return None
+    version, model, fusion, dataset, batch_size, rounds, epochs, sample_fraction, proximal_mu, num_parties, run = parts
+    try:
+        return {
+            "experiment": folder_name,
+            "version": version,
+            "model": model,
+            "fusion": fusion,
+            "dataset": dataset,
+            "batch_size": int(batch_size),
+            "rounds": int(rounds),
+            "epochs": int(epochs),
+            "sample_fraction": float(sample_fraction),
+            "proximal_mu": float(proximal_mu),
+            "num_parties": -1 if num_parties == "None" else int(num_parties),
+            "run": -1 if run == "None" else int(run),
+        }
+    except ValueError:
+        return None
+
+
+def train_samples(experiment: dict) -> int:
+    if experiment["dataset"] not in TRAIN_SET_SIZES or experiment["num_parties"] <= 0:
+        return 0
+    start, split, _ = partition_bounds(TRAIN_SET_SIZES[experiment["dataset"]], experiment["num_parties"], 0)
+    return split - start
+
+
+def local_midnight(wall_ns: int) -> float:
+    t = time.localtime(wall_ns / 1e9)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1))
+
+
+def unwrap_day(seconds: np.ndarray, reference: float) -> np.ndarray:
+    """Moves times of day that are more than 12 hours before `reference` to the next day"""
+    return np.where(seconds < reference - 12 * 3600, seconds + 86400, seconds)
+
+
+def clock_to_seconds(values) -> np.ndarray:
+    """'HH:MM:SS.ff' strings to seconds since midnight"""
+    if len(values) == 0:
+        return np.zeros(0)
+    parts = np.array([value.split(":") for value in values], dtype=np.float64)
+    return parts @ np.array([3600.0, 60.0, 1.0])
+
+
+# * Loaders
+
+
+def load_epoch_logs(path) -> dict:
+    """Reads an epoch_logs.csv with rows of (round, epoch, start, end)"""
+    with open(path, "r", newline="") as f:
+        rows = [row for row in csv.reader(f) if len(row) == 4]
+    rounds, epochs, starts, ends = zip(*rows) if rows else ((), (), (), ())
+    start = clock_to_seconds(starts)
+    end = clock_to_seconds(ends)
+    if len(start):
+        start = unwrap_day(start, start[0])
+        end = unwrap_day(end, start[0])
+        end = np.where(end < start, end + 86400, end)
+    return {
+        "round": np.asarray(rounds, dtype=np.int32),
+        "epoch": np.asarray(epochs, dtype=np.int32),
+        "start": start,
+        "end": end,
+    }
+
+
+def load_epoch_timings(path, midnight: float = None) -> dict:
+    """Reads the epochs out of a binary epoch log, same keys as load_epoch_logs. Batch records are skipped"""
+    header, records = load_epoch_log(path)
+    records = records[records["kind"] == EPOCH]
+    midnight = local_midnight(header["wall_ns"]) if midnight is None else midnight
+    return {
+        "round": np.asarray(records["round"], dtype=np.int32),
+        "epoch": np.asarray(records["epoch"], dtype=np.int32),
+        "start": wall_clock_ns(header, records["start_ns"]) / 1e9 - midnight,
+        "end": wall_clock_ns(header, records["end_ns"]) / 1e9 - midnight,
+    }
+
+
+def load_power_series(path) -> dict:
+    """Reads a power file into seconds since local midnight, power and the interleaved markers"""
+    header, records = load_power(path)
+    midnight = local_midnight(header["wall_ns"])
+    power_samples = samples(records)
+    power_markers = markers(records)
+    return {
+        "midnight": midnight,
+        "time": wall_clock_ns(header, power_samples["t_ns"]) / 1e9 - midnight,
+        "power": power_samples["power"].astype(np.float64),
+        "marker_time": wall_clock_ns(header, power_markers["t_ns"]) / 1e9 - midnight,
+        "marker_event": np.asarray(power_markers["event"]) if len(power_markers) else np.zeros(0, np.int32),
+        "marker_round": np.asarray(power_markers["round"]) if len(power_markers) else np.zeros(0, np.int32),
+    }
+
+
+def load_resources(path, midnight: float = None) -> dict:
+    """Reduces a resource or SAR file to the handful of series that are attributed to epochs, as {name: (time, values)}"""
+    if pathlib.Path(path).suffix == RESOURCE_FILE_SUFFIX:
+        header, records = load_resource_file(path)
+        t = wall_clock_ns(header, records["t_ns"]) / 1e9
+        t = t - (local_midnight(header["wall_ns"]) if midnight is None else midnight)
+        return {name: (t, records[name].astype(np.float64)) for name, _ in RESOURCE_DTYPE}
+
+    sar = load_sar(path, midnight=midnight)
+    resources = {}
+
+    cpu = sar.get("cpu", {}).get("all")
+    if cpu is not None:
+        resources["cpu_percent"] = (cpu["time"], cpu["%user"] + cpu["%system"])
+
+    memory = sar.get("memory", {}).get("all")
+    if memory is not None:
+        resources["mem_percent"] = (memory["time"], memory["%memused"])
+
+    for section, names, columns in (
+        ("disk", None, (("rkB/s", "disk_read_kBps"), ("wkB/s", "disk_write_kBps"))),
+        ("network", ("lo",), (("rxkB/s", "net_rx_kBps"), ("txkB/s", "net_tx_kBps"))),
+    ):
+        devices = [series for name, series in sar.get(section, {}).items() if not names or name not in names]
+        if not devices:
+            continue
+        # Devices are all sampled at the same instants, sum them up
+        length = min(len(series["time"]) for series in devices)
+        for column, resource in columns:
+            if all(column in series for series in devices):
+                total = np.sum([series[column][:length] for series in devices], axis=0)
+                resources[resource] = (devices[0]["time"][:length], total)
+    return resources
+
+
+# * Vectorized attribution over windows
+
+
+def interval_energy(t: np.ndarray, p: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Trapezoidal integral of power `p` (W) sampled at `t` (s) over every [start, end]. NaN where not covered"""
+    if len(t) < 2:
+        return np.full(len(starts), np.nan)
+    cumulative = np.concatenate(([0.0], np.cumsum(0.5 * (p[1:] + p[:-1]) * np.diff(t))))
+    energy = np.interp(ends, t, cumulative) - np.interp(starts, t, cumulative)
+    return np.where((starts < t[0]) | (ends > t[-1]), np.nan, energy)
+
+
+def window_mean(t: np.ndarray, values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Mean of the `values` sampled at `t` that fall inside every [start, end]. NaN for empty windows"""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    first = np.searchsorted(t, starts, side="left")
+    last = np.searchsorted(t, ends, side="right")
+    count = last - first
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, (cumulative[last] - cumulative[first]) / count, np.nan)
+
+
+def marker_windows(power: dict, start_event: str, end_event: str):
+    """Pairs up start and end markers of the same round. Returns (rounds, starts, ends)"""
+    events = power["marker_event"]
+    start_mask = events == MARK_EVENTS[start_event]
+    end_mask = events == MARK_EVENTS[end_event]
+    start_rounds = power["marker_round"][start_mask]
+    end_rounds = power["marker_round"][end_mask]
+    rounds, start_index, end_index = np.intersect1d(start_rounds, end_rounds, return_indices=True)
+    return (
+        rounds,
+        power["marker_time"][start_mask][start_index],
+        power["marker_time"][end_mask][end_index],
+    )
+
+
+def fill_windows(table: np.ndarray, starts, ends, power, resources):
+    table["start"] = starts
+    table["end"] = ends
+    table["duration"] = ends - starts
+    table["energy_J"] = np.nan
+    if power is not None:
+        table["energy_J"] = interval_energy(power["time"], power["power"], starts, ends)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table["mean_power_W"] = table["energy_J"] / table["duration"]
+    for name, _ in RESOURCE_DTYPE:
+        table[name] = np.nan
+        if name in resources:
+            t, values = resources[name]
+            table[name] = window_mean(t, values, starts, ends)
+
+
+# * Per experiment
+
+
+def find_resource_file(folder: pathlib.Path, party: str):
+    # Resource sampler files are preferred, SAR output is still read for experiments recorded before it
+    for path in (
+        folder / party / f"{party}-resources{RESOURCE_FILE_SUFFIX}",
+        folder / f"{party}-resources{RESOURCE_FILE_SUFFIX}",
+        folder / party / f"{party}-sar.csv",
+        folder / f"{party}-sar.csv",
+        folder / party / f"{party}-sar.txt",
+        folder / f"{party}-sar.txt",
+    ):
+        if path.exists():
+            return path
+    return None
+
+
+def analyze_experiment(folder) -> dict:
+    """Returns {"epochs": array of EPOCH_DTYPE, "rounds": array of ROUND_DTYPE} for one experiment folder"""
+    folder = pathlib.Path(folder)
+    experiment = parse_folder_name(folder.name)
+    epoch_tables = [np.zeros(0, dtype=EPOCH_DTYPE)]
+    round_tables = [np.zeros(0, dtype=ROUND_DTYPE)]
+    if experiment is None:
+        return {"epochs": epoch_tables[0], "rounds": round_tables[0]}
+
+    parties = sorted(path.name for path in folder.iterdir() if path.is_dir())
+    for party in parties:
+        power_path = folder / f"{folder.name}_{party}{POWER_FILE_SUFFIX}"
+        power = load_power_series(power_path) if power_path.exists() else None
+        resource_path = find_resource_file(folder, party)
+        midnight = power["midnight"] if power is not None else None
+        resources = load_resources(resource_path, midnight=midnight) if resource_path is not None else {}
+
+        # Binary epoch logs are already on the power file's time axis, the CSV ones of older experiments are times of day
+        logs = None
+        if (folder / party / EPOCH_LOG_FILENAME).exists():
+            logs = load_epoch_timings(folder / party / EPOCH_LOG_FILENAME, midnight=midnight)
+        elif (folder / party / "epoch_logs.csv").exists():
+            logs = load_epoch_logs(folder / party / "epoch_logs.csv")
+            if power is not None and len(logs["start"]) and len(power["time"]):
+                # Both are times of day, move the logs to the power file's day
+                logs["start"] = unwrap_day(logs["start"], power["time"][0])
+                logs["end"] = unwrap_day(logs["end"], power["time"][0])
+        if logs is not None:
+            table = np.zeros(len(logs["start"]), dtype=EPOCH_DTYPE)
+            for name, value in experiment.items():
+                table[name] = value
+            table["party"] = party
+            table["round"] = logs["round"]
+            table["epoch"] = logs["epoch"]
+            fill_windows(table, logs["start"], logs["end"], power, resources)
+            samples_per_epoch = train_samples(experiment)
+            table["J_per_sample"] = table["energy_J"] / samples_per_epoch if samples_per_epoch else np.nan
+            epoch_tables.append(table)
+
+        if power is not None:
+            for phase, start_event, end_event in (
+                ("fit", "round_start", "round_end"),
+                ("evaluate", "evaluate_start", "evaluate_end"),
+            ):
+                rounds, starts, ends = marker_windows(power, start_event, end_event)
+                table = np.zeros(len(rounds), dtype=ROUND_DTYPE)
+                for name, value in experiment.items():
+                    table[name] = value
+                table["party"] = party
+                table["phase"] = phase
+                table["round"] = rounds
+                fill_windows(table, starts, ends, power, resources)
+                round_tables.append(table)
+
+    return {"epochs": np.concatenate(epoch_tables), "rounds": np.concatenate(round_tables)}
+
+
+def experiment_folders(experiments_dir=EXPERIMENTS_DIR) -> list[pathlib.Path]:
+    return sorted(
+        path for path in pathlib.Path(experiments_dir).iterdir()
+        if path.is_dir() and parse_folder_name(path.name) is not None
+    )
+
+
+def write_table(path, table: np.ndarray):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(table.dtype.names)
+        writer.writerows(table.tolist())
+
+
+def analyze_all(experiments_dir=EXPERIMENTS_DIR, results_dir=RESULTS_DIR, use_cache: bool = True) -> dict:
+    """
+    Analyzes every experiment folder and writes epochs.csv and rounds.csv to `results_dir`, and skipped.csv with
+    the folders that could not be parsed. With `use_cache` only folders that changed since the last call are parsed again
+    """
+    from .results_cache import ResultsCache, fingerprint
+
+    results_dir = pathlib.Path(results_dir)
+    cache = ResultsCache(results_dir / "cache") if use_cache else None
+    expected_dtypes = {"epochs": np.dtype(EPOCH_DTYPE), "rounds": np.dtype(ROUND_DTYPE)}
+    epochs = [np.zeros(0, dtype=EPOCH_DTYPE)]
+    rounds = [np.zeros(0, dtype=ROUND_DTYPE)]
+    folders = experiment_folders(experiments_dir)
+    skipped: list[tuple[str, str]] = []  # (folder, reason)
+    analyzed = 0
+    for folder in folders:
+        results = None
+        if cache is not None:
+            folder_fingerprint = fingerprint(folder)
+            results = cache.get(folder.name, folder_fingerprint)
+            # Tables cached by an older version of this module are recomputed
+            if results is not None and any(
+                name not in results or results[name].dtype != dtype for name, dtype in expected_dtypes.items()
+            ):
+                results = None
+        if results is None:
+            try:
+                results = analyze_experiment(folder)
+            except PARSE_ERRORS as e:
+                energy_fl_logger.error(f"Could not analyze {folder.name} : {e!r}")
+                skipped.append((folder.name, repr(e)))
+                continue
+            analyzed += 1
+            if cache is not None:
+                cache.put(folder.name, folder_fingerprint, results)
+        epochs.append(results["epochs"])
+        rounds.append(results["rounds"])
+
+    if cache is not None:
+        for folder_name in cache.folders() - {folder.name for folder in folders}:
+            cache.remove(folder_name)
+        cache.close()
+
+    results = {"epochs": np.concatenate(epochs), "rounds": np.concatenate(rounds)}
+    results_dir.mkdir(parents=True, exist_ok=True)
+    write_table(results_dir / "epochs.csv", results["epochs"])
+    write_table(results_dir / "rounds.csv", results["rounds"])
+    write_table(results_dir / "skipped.csv", np.array(skipped, dtype=[("experiment", "O"), ("reason", "O")]))
+    energy_fl_logger.info(
+        f"Analyzed {analyzed} of {len(folders)} experiments into {len(results['epochs'])} epochs and {len(results['rounds'])} rounds"
+    )
+    if skipped:
+        energy_fl_logger.warning(f"Skipped {len(skipped)} experiments, see {results_dir / 'skipped.csv'}")
+    return results
+
+
+if __name__ == "__main__":
+    analyze_all()
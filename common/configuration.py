@@ -36,8 +36,63 @@ DEVICE_USERNAME = getpass.getuser()
 
 AGGREGATOR_ZMQ_BROADCAST_PORT = 6010
 
+# * Commands the aggregator broadcasts to the power collectors as (command, payload) tuples
+
 ZMQ_STOP_POWER_COLLECTION = 300
 
+ZMQ_START_POWER_COLLECTION = 301
+
+ZMQ_MARK = 302  # payload is the label that gets recorded alongside the samples
+
+ZMQ_HEARTBEAT = 303
+
+# Seconds between two heartbeats from the aggregator
+ZMQ_HEARTBEAT_INTERVAL = 5
+
+# Power collectors stop on their own if they hear nothing from the aggregator for this many seconds
+POWER_COLLECTOR_ORPHAN_TIMEOUT = 120
+
+# The parties push their resource usage samples to this port on the aggregator
+AGGREGATOR_ZMQ_RESOURCE_PORT = 6012
+
+# Seconds between two resource usage samples on every device
+RESOURCE_SAMPLE_INTERVAL = 1.0
+
+# Feed the parties' models from prefetching tf.data pipelines instead of handing NumPy arrays to keras every round
+USE_TF_DATA_PIPELINE = True
+
+# Also record the start and end of every training batch in the parties' epoch logs, not just of every epoch
+RECORD_BATCH_TIMINGS = False
+
+# Tensor type models are sent in between the aggregator and the parties, one of flwr.common.codec.CODECS such as
+# "numpy.raw" (no .npy parsing), "numpy.raw+zlib" (lossless) or "numpy.raw+float16" / "numpy.raw+uint8" (lossy, only
+# used for the parties' replies). None keeps flwr's own "numpy.ndarray" format
+PARAMETERS_TENSOR_TYPE = None
+
+# * Warm client agents (clients/scripts/client_agent.py) that keep TensorFlow, the datasets and the models loaded between experiments
+
+# Start the parties' clients through their agents instead of a fresh python process per experiment
+USE_CLIENT_AGENTS = True
+
+# Every party's agent listens for experiments on this port
+CLIENT_AGENT_PORT = 6014
+
+# Seconds to wait for an agent to answer a request
+CLIENT_AGENT_REPLY_TIMEOUT = 10
+
+# Seconds between two status checks on a party whose agent is running an experiment
+CLIENT_AGENT_POLL_INTERVAL = 2
+
+# Commands sent to the agents as (command, payload) tuples, they answer with (ok, payload)
+
+AGENT_PING = 400
+
+AGENT_RUN = 401  # payload is the experiment descriptor
+
+AGENT_STATUS = 402  # payload is the experiment folder name
+
+AGENT_SHUTDOWN = 403
+
 IP_POWER_COLLECTORS = {
     "pi2": "10.8.1.35",
 }
@@ -50,4 +105,32 @@ POWER_COLLECTOR_CONNECTED_DEVICE = {
     "pi2": "rpi1",
 }
 
-LOGGING_LEVEL = logging.DEBUG
\ No newline at end of file
+# Seconds between two samples from the UM25C testers
+POWER_SAMPLE_INTERVAL = 0.1
+
+LOGGING_LEVEL = logging.DEBUG
+
+# * Timings for the experiment pipeline in fullauto.py (all in seconds)
+
+# Devices are left idle for this long after training ends so that the next run starts from a settled power draw
+INTER_RUN_COOLDOWN = 60
+
+# Upper bound on how long to wait for a party or power collector to come (back) online
+DEVICE_ONLINE_TIMEOUT = 180
+
+# Liveness checks of the devices younger than this are reused instead of probing again
+FLEET_HEALTH_TTL = 10
+
+# Head start given to the power collectors and resource samplers before the parties are started
+COLLECTION_WARMUP = 5
+
+# Upper bound on how long to wait for the remote client and power collector processes to finish writing their outputs
+REMOTE_EXIT_TIMEOUT = 120
+
+# * Retries of failed experiments by common/experiment_queue.py
+
+# Runs of one experiment before it is given up on for the rest of the sweep
+QUEUE_MAX_ATTEMPTS = 3
+
+# Seconds before the first retry of a failed experiment, doubling with every further failure
+QUEUE_RETRY_BACKOFF = 300
@@ -1,241 +1,353 @@
-import sqlite3
-import datetime
+# ! Experiment log
+
+# * Every experiment is one row with a typed column per parameter, so lookups by version or status are
+# * index lookups instead of LIKE scans over a packed string. One connection is shared by the whole process
+# * (the pipeline updates statuses from its collection thread), guarded by a lock and in WAL mode so that
+# * window.py can read while fullauto.py writes
+
+# * `experiments` only holds the latest status of every experiment. Every attempt at running one is also
+# * appended to `runs` with its phase timings and outcome, and the files it produced to `artifacts`
+
+import contextlib
 import pathlib
+import sqlite3
+import threading
+import time
+from typing import Iterable
 
 from .experiments import Experiment
 
-
-def adapt_and_convert():
+#! This assumes that the current working directory is always the ~/Energy-FL/ so that is important to keep in mind
+DATABASE_PATH = pathlib.Path(r"Outputs/Experiments/log.db")
+
+EXPERIMENT_COLUMNS = (
+    "version",
+    "model",
+    "fusion",
+    "dataset",
+    "batch_size",
+    "rounds",
+    "epochs",
+    "sample_fraction",
+    "proximal_mu",
+    "num_parties",
+    "run",
+)
+
+STATUS_COLUMNS = ("is_finished", "is_running", "has_failed")
+
+# `IS` instead of `=` so that experiments without num_parties or run (NULL) still match themselves
+MATCH_EXPERIMENT = " AND ".join(f"{column} IS ?" for column in EXPERIMENT_COLUMNS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments(
+    expt_id INTEGER PRIMARY KEY,
+    version TEXT NOT NULL,
+    model TEXT NOT NULL,
+    fusion TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    batch_size INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    epochs INTEGER NOT NULL,
+    sample_fraction REAL NOT NULL,
+    proximal_mu REAL NOT NULL,
+    num_parties INTEGER,
+    run INTEGER,
+    is_finished INTEGER NOT NULL DEFAULT 0,
+    is_running INTEGER NOT NULL DEFAULT 0,
+    has_failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS experiments_config ON experiments(
+    version, model, fusion, dataset, batch_size, rounds, epochs, sample_fraction, proximal_mu,
+    IFNULL(num_parties, -1), IFNULL(run, -1)
+);
+CREATE INDEX IF NOT EXISTS experiments_finished ON experiments(is_finished, version);
+CREATE INDEX IF NOT EXISTS experiments_failed ON experiments(has_failed, version);
+CREATE INDEX IF NOT EXISTS experiments_running ON experiments(is_running, version);
+CREATE TABLE IF NOT EXISTS runs(
+    run_id INTEGER PRIMARY KEY,
+    version TEXT NOT NULL,
+    folder_name TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    setup_seconds REAL,
+    pairing_seconds REAL,
+    training_seconds REAL,
+    collection_seconds REAL,
+    status TEXT NOT NULL DEFAULT 'running',
+    failure_reason TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_version ON runs(version, started_at);
+CREATE INDEX IF NOT EXISTS runs_folder ON runs(folder_name, started_at);
+CREATE INDEX IF NOT EXISTS runs_status ON runs(status, version);
+CREATE TABLE IF NOT EXISTS artifacts(
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_run ON artifacts(run_id);
+"""
+
+# Phases of a run that get their duration recorded in `runs`
+RUN_PHASES = ("setup", "pairing", "training", "collection")
+
+_connection: sqlite3.Connection = None
+_lock = threading.RLock()
+
+
+def connection() -> sqlite3.Connection:
+    global _connection
+    with _lock:
+        if _connection is None:
+            DATABASE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            # Transactions are started explicitly in `transaction`
+            _connection = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None)
+            _connection.execute("PRAGMA journal_mode=WAL")
+            _connection.execute("PRAGMA synchronous=NORMAL")
+        return _connection
+
+
+@contextlib.contextmanager
+def transaction():
     """
-    Makes adapters and converters for the following types
-    ```
-    Experiment ('experiment')
-    bool ('bool')
-    datetime.datetime ('datetime')
-
-    https://docs.python.org/3/library/sqlite3.html#how-to-write-adaptable-objects
-    ```
+    Everything inside runs in one transaction that is committed at the end, or rolled back on an exception.
+    Nesting is allowed, only the outermost one commits
     """
+    with _lock:
+        con = connection()
+        if con.in_transaction:
+            yield con
+            return
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+
+def experiment_values(expt: Experiment) -> tuple:
+    return (
+        expt.version,
+        expt.model,
+        expt.fusion,
+        expt.dataset,
+        expt.batch_size,
+        expt.rounds,
+        expt.epochs,
+        expt.sample_fraction,
+        expt.proximal_mu,
+        expt.num_participating_parties,
+        expt.run,
+    )
 
-    def adapt_datetime_iso(val):
-        """Adapt datetime.datetime to timezone-naive ISO 8601 date."""
-        return val.isoformat()
-
-    sqlite3.register_adapter(datetime.datetime, adapt_datetime_iso)
-
-    def convert_datetime(val):
-        """Convert ISO 8601 datetime to datetime.datetime object."""
-        return datetime.datetime.fromisoformat(val.decode())
-
-    sqlite3.register_converter("datetime", convert_datetime)
-
-    def adapt_experiment(exp: Experiment):
-        #! Edit the cmd_suffixes later
-        return f"{exp.version};{exp.model};{exp.fusion};{exp.dataset};{exp.batch_size};{exp.rounds};{exp.epochs};{exp.sample_fraction};{exp.proximal_mu};{exp.num_participating_parties};{exp.run}"
-
-    sqlite3.register_adapter(Experiment, adapt_experiment)
-
-    def convert_experiment(val : bytes):
-        val = val.decode()
-        (
-            version,
-            model,
-            fusion,
-            dataset,
-            batch_size,
-            rounds,
-            epochs,
-            sample_fraction,
-            proximal_mu,
-            num_parties,
-            run,
-        ) = val.split(";")
-        return Experiment(
-            model,
-            fusion,
-            dataset,
-            int(batch_size),
-            int(rounds),
-            int(epochs),
-            float(proximal_mu),
-            float(sample_fraction),
-            version,
-            None if num_parties == "None" else int(num_parties),
-            None if run == "None" else int(run),
-        )
-
-    sqlite3.register_converter("experiment", convert_experiment)
-
-    def adapt_bool(val: bool) -> int:
-        return 1 if val else 0
 
-    sqlite3.register_adapter(bool, adapt_bool)
+def row_to_experiment(row: tuple) -> Experiment:
+    version, model, fusion, dataset, batch_size, rounds, epochs, sample_fraction, proximal_mu, num_parties, run = row
+    return Experiment(
+        model,
+        fusion,
+        dataset,
+        batch_size,
+        rounds,
+        epochs,
+        proximal_mu,
+        sample_fraction,
+        version,
+        num_parties,
+        run,
+    )
 
-    def convert_bool(val: int):
-        return bool(val)
 
-    sqlite3.register_converter("bool", convert_bool)
+def migrate_log_table(con: sqlite3.Connection) -> None:
+    """Moves the rows of the old single column `log` table into `experiments`"""
+    exists = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='log'").fetchone()
+    if not exists:
+        return
+    rows = []
+    for expt, is_finished, is_running, has_failed in con.execute(
+        "SELECT expt, is_finished, is_running, has_failed FROM log ORDER BY expt_id"
+    ):
+        (version, model, fusion, dataset, batch_size, rounds, epochs, sample_fraction, proximal_mu, num_parties, run) = (
+            expt.decode() if isinstance(expt, bytes) else expt
+        ).split(";")
+        rows.append(
+            (
+                version,
+                model,
+                fusion,
+                dataset,
+                int(batch_size),
+                int(rounds),
+                int(epochs),
+                float(sample_fraction),
+                float(proximal_mu),
+                None if num_parties == "None" else int(num_parties),
+                None if run == "None" else int(run),
+                int(is_finished),
+                int(is_running),
+                int(has_failed),
+            )
+        )
+    # Later rows replace earlier duplicates, the same as add_to_log clearing similar experiments
+    con.executemany(
+        f"INSERT OR REPLACE INTO experiments({', '.join(EXPERIMENT_COLUMNS + STATUS_COLUMNS)}) "
+        f"VALUES({', '.join('?' * (len(EXPERIMENT_COLUMNS) + len(STATUS_COLUMNS)))})",
+        rows,
+    )
+    con.execute("DROP TABLE log")
 
 
 def create_experiment_log() -> None:
-    #! This assumes that the current working directory is always the ~/Energy-FL/ so that is important to keep in mind
+    with transaction() as con:
+        for statement in SCHEMA.split(";"):
+            if statement.strip():
+                con.execute(statement)
+        migrate_log_table(con)
 
-    if pathlib.Path(r"Outputs/Experiments/log.db").exists():
-        return
 
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
+# * Writes
 
-    adapt_and_convert()
 
-    cur.execute(
-        f"""CREATE TABLE log(expt_id INTEGER PRIMARY KEY, expt experiment NOT NULL, is_finished bool NOT NULL, is_running bool NOT NULL, has_failed bool NOT NULL)"""
-    )
+def add_experiment(expt: Experiment) -> None:
+    """Adds `expt` with every status cleared, replacing any earlier entry for the same experiment"""
+    with transaction() as con:
+        con.execute(f"DELETE FROM experiments WHERE {MATCH_EXPERIMENT}", experiment_values(expt))
+        con.execute(
+            f"INSERT INTO experiments({', '.join(EXPERIMENT_COLUMNS)}) VALUES({', '.join('?' * len(EXPERIMENT_COLUMNS))})",
+            experiment_values(expt),
+        )
 
-    con.commit()
-    cur.close()
-    con.close()
 
+def remove_experiment(expt: Experiment) -> None:
+    with transaction() as con:
+        con.execute(f"DELETE FROM experiments WHERE {MATCH_EXPERIMENT}", experiment_values(expt))
+
+
+def set_status(
+    experiments: Iterable[Experiment],
+    is_finished: bool = None,
+    is_running: bool = None,
+    has_failed: bool = None,
+) -> None:
+    """Sets the given statuses (None leaves one untouched) on all of `experiments` in a single transaction"""
+    statuses = {
+        column: int(value)
+        for column, value in zip(STATUS_COLUMNS, (is_finished, is_running, has_failed))
+        if value is not None
+    }
+    if not statuses:
+        return
+    assignments = ", ".join(f"{column}={value}" for column, value in statuses.items())
+    with transaction() as con:
+        con.executemany(
+            f"UPDATE experiments SET {assignments} WHERE {MATCH_EXPERIMENT}",
+            [experiment_values(expt) for expt in experiments],
+        )
 
-def get_completed_experiments(version_str : str = None) -> list[Experiment]:
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
 
-    adapt_and_convert()
+def set_running(expt: Experiment) -> None:
+    """Only one experiment runs at a time, whatever was left running by a crash is dropped from the log"""
+    with transaction() as con:
+        con.execute("DELETE FROM experiments WHERE is_running=1")
+        con.execute(f"UPDATE experiments SET is_running=1 WHERE {MATCH_EXPERIMENT}", experiment_values(expt))
 
-    if version_str is None:
-        cmd_suffix = f""
-    else:
-        cmd_suffix = f"AND expt LIKE '{version_str};%;%;%;%;%;%;%;%;%;%'"
-    
-    res = cur.execute(rf"""SELECT expt FROM log WHERE is_finished=1 {cmd_suffix} ;""")
-    res = res.fetchall()
-    list_of_experiments = [expt[0] for expt in res]
 
-    con.commit()
-    cur.close()
-    con.close()
+def nuke_experiments(version_str: str = None):
+    with transaction() as con:
+        if version_str is None:
+            con.execute("DELETE FROM experiments")
+        else:
+            con.execute("DELETE FROM experiments WHERE version=?", (version_str,))
 
-    return list_of_experiments
 
+# * Run history
 
-def get_incomplete_experiments(version_str : str = None) -> list[Experiment]:
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
 
-    adapt_and_convert()
-    
-    if version_str is None:
-        cmd_suffix = f""
-    else:
-        cmd_suffix = f"AND expt LIKE '{version_str};%;%;%;%;%;%;%;%;%;%'"
+def start_run(expt: Experiment) -> int:
+    """Appends a new run of `expt` and returns its run_id"""
+    with transaction() as con:
+        cursor = con.execute(
+            "INSERT INTO runs(version, folder_name, started_at) VALUES(?, ?, ?)",
+            (expt.version, expt.folder_name, time.time()),
+        )
+        return cursor.lastrowid
 
-    res = cur.execute(rf"""SELECT expt FROM log WHERE is_finished=0 {cmd_suffix} ;""")
-    res = res.fetchall()
-    list_of_experiments = [expt[0] for expt in res]
 
-    con.commit()
-    cur.close()
-    con.close()
+def record_phase(run_id: int, phase: str, seconds: float) -> None:
+    if phase not in RUN_PHASES:
+        raise ValueError(f"{phase} is not a valid run phase")
+    with transaction() as con:
+        con.execute(f"UPDATE runs SET {phase}_seconds=? WHERE run_id=?", (seconds, run_id))
 
-    return list_of_experiments
 
+def finish_run(run_id: int, success: bool, failure_reason: str = None) -> None:
+    with transaction() as con:
+        con.execute(
+            "UPDATE runs SET ended_at=?, status=?, failure_reason=? WHERE run_id=?",
+            (time.time(), "finished" if success else "failed", failure_reason, run_id),
+        )
 
-def get_experiments(version_str : str = None) -> list[Experiment]:
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
 
-    adapt_and_convert()
-    
-    if version_str is None:
-        cmd_suffix = f""
-    else:
-        cmd_suffix = f"WHERE expt LIKE '{version_str};%;%;%;%;%;%;%;%;%;%'"
+def add_artifacts(run_id: int, folder) -> None:
+    """Indexes every file under `folder` as an artifact of the run"""
+    rows = [(run_id, str(path), path.stat().st_size) for path in sorted(pathlib.Path(folder).rglob("*")) if path.is_file()]
+    with transaction() as con:
+        con.executemany("INSERT INTO artifacts(run_id, path, size) VALUES(?, ?, ?)", rows)
 
-    res = cur.execute(rf"""SELECT expt FROM log {cmd_suffix} ;""")
-    res = res.fetchall()
-    list_of_experiments = [expt[0] for expt in res]
 
-    con.commit()
-    cur.close()
-    con.close()
+def get_runs(version_str: str = None) -> list[dict]:
+    """Every run in the order they were started, as dicts of the `runs` columns plus the artifacts' total size"""
+    query = (
+        "SELECT runs.*, COUNT(artifacts.path) AS artifact_count, IFNULL(SUM(artifacts.size), 0) AS artifact_bytes "
+        "FROM runs LEFT JOIN artifacts ON artifacts.run_id = runs.run_id"
+    )
+    params = ()
+    if version_str is not None:
+        query += " WHERE runs.version=?"
+        params = (version_str,)
+    query += " GROUP BY runs.run_id ORDER BY runs.run_id"
+    with _lock:
+        cursor = connection().execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-    return list_of_experiments
 
+# * Reads
 
-def get_running_experiments(version_str : str = None) -> list[Experiment]:
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
 
-    adapt_and_convert()
-    
-    if version_str is None:
-        cmd_suffix = f""
-    else:
-        cmd_suffix = f"AND expt LIKE '{version_str};%;%;%;%;%;%;%;%;%;%'"
+def _select(where: str, version_str: str = None) -> list[Experiment]:
+    params = ()
+    if version_str is not None:
+        where = f"{where} AND version=?" if where else "version=?"
+        params = (version_str,)
+    query = f"SELECT {', '.join(EXPERIMENT_COLUMNS)} FROM experiments"
+    if where:
+        query += f" WHERE {where}"
+    with _lock:
+        rows = connection().execute(query + " ORDER BY expt_id", params).fetchall()
+    return [row_to_experiment(row) for row in rows]
 
-    res = cur.execute(rf"""SELECT expt FROM log WHERE is_running=1 {cmd_suffix}""")
-    res = res.fetchall()
-    list_of_experiments = [expt[0] for expt in res]
 
-    con.commit()
-    cur.close()
-    con.close()
+def get_completed_experiments(version_str: str = None) -> list[Experiment]:
+    return _select("is_finished=1", version_str)
 
-    return list_of_experiments
 
+def get_incomplete_experiments(version_str: str = None) -> list[Experiment]:
+    return _select("is_finished=0", version_str)
 
-def get_failed_experiments(version_str : str = None) -> list[Experiment]:
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
 
-    adapt_and_convert()
-    
-    if version_str is None:
-        cmd_suffix = f""
-    else:
-        cmd_suffix = f"AND expt LIKE '{version_str};%;%;%;%;%;%;%;%;%;%'"
+def get_experiments(version_str: str = None) -> list[Experiment]:
+    return _select("", version_str)
 
-    res = cur.execute(rf"""SELECT expt FROM log WHERE has_failed=1 {cmd_suffix}""")
-    res = res.fetchall()
-    list_of_experiments = [expt[0] for expt in res]
 
-    con.commit()
-    cur.close()
-    con.close()
+def get_running_experiments(version_str: str = None) -> list[Experiment]:
+    return _select("is_running=1", version_str)
 
-    return list_of_experiments
 
+def get_failed_experiments(version_str: str = None) -> list[Experiment]:
+    return _select("has_failed=1", version_str)
 
-def nuke_experiments(version_str : str = None):
-    con = sqlite3.connect(
-        r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES
-    )
-    cur = con.cursor()
-    
-    adapt_and_convert()
-    
-    if version_str is None:
-        cmd_suffix = ""
-    else:
-        cmd_suffix = f"WHERE expt LIKE '{version_str};%;%;%;%;%;%;%;%;%;%'"
-
-    cur.execute(rf"""DELETE FROM log {cmd_suffix} ;""")
-
-    con.commit()
-    cur.close()
-    con.close()
-
-create_experiment_log()
\ No newline at end of file
+
+create_experiment_log()
@@ -0,0 +1,107 @@
+# ! Pre-partitioned dataset shards for the parties
+
+# * Loading the whole of MNIST/CIFAR-10 through keras, scaling every image and then slicing out one shard
+# * costs a lot of time and RAM on a Raspberry Pi at the start of every experiment. The shards are instead
+# * cut once per (dataset, num_parties) and saved already scaled as float32 .npy files. A party then only
+# * memory maps its own shard, so just the pages that training touches are ever read in
+
+import math
+import os
+import pathlib
+
+import numpy as np
+
+from .log import energy_fl_logger
+
+#! This assumes that the current working directory is always the ~/Energy-FL/
+DATASETS_DIR = pathlib.Path("Outputs/Datasets")
+
+SHARD_ARRAYS = ("x_train", "y_train", "x_val", "y_val")
+
+# Number of training images of every dataset that load_raw splits between the parties
+TRAIN_SET_SIZES = {"mnist": 60000, "cifar10": 50000}
+
+# Fraction of every party's shard that is used for training, the rest is used for validation
+TRAIN_FRACTION = 0.9
+
+
+def shard_dir(dataset: str, num_parties: int, cid: int, datasets_dir=DATASETS_DIR) -> pathlib.Path:
+    return pathlib.Path(datasets_dir) / f"{dataset}_{num_parties}" / str(cid)
+
+
+def load_raw(dataset: str):
+    """The keras training set of `dataset` as uint8 images and labels"""
+    import tensorflow as tf
+
+    if dataset == "mnist":
+        (x_train, y_train), _ = tf.keras.datasets.mnist.load_data()
+    elif dataset == "cifar10":
+        (x_train, y_train), _ = tf.keras.datasets.cifar10.load_data()
+    else:
+        raise ValueError(f"{dataset} is not a valid dataset")
+    return x_train, y_train
+
+
+def partition_bounds(num_samples: int, num_parties: int, cid: int) -> tuple[int, int, int]:
+    """(start, split, end) of the shard of `cid`. Equal sized and non overlapping, the same split old_client always used"""
+    partition_size = math.floor(num_samples / num_parties)
+    start, end = cid * partition_size, (cid + 1) * partition_size
+    return start, start + math.floor(partition_size * TRAIN_FRACTION), end
+
+
+def save_array(path: pathlib.Path, array: np.ndarray):
+    # Written next to the final file and renamed so that a crash never leaves a truncated shard behind
+    temporary = path.with_name(f".{path.name}.tmp")
+    with open(temporary, "wb") as f:
+        np.save(f, array)
+    os.replace(temporary, path)
+
+
+def build_shards(dataset: str, num_parties: int, cids=None, datasets_dir=DATASETS_DIR):
+    """Cuts the shards of `cids` (all parties by default) out of `dataset`. Only one shard is scaled at a time"""
+    x, y = load_raw(dataset)
+    for cid in range(num_parties) if cids is None else cids:
+        start, split, end = partition_bounds(len(x), num_parties, cid)
+        folder = shard_dir(dataset, num_parties, cid, datasets_dir)
+        folder.mkdir(parents=True, exist_ok=True)
+        x_shard = x[start:end].astype(np.float32)
+        x_shard /= 255.0
+        arrays = {
+            "x_train": x_shard[: split - start],
+            "y_train": y[start:split],
+            "x_val": x_shard[split - start :],
+            "y_val": y[split:end],
+        }
+        for name in SHARD_ARRAYS:
+            save_array(folder / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+        energy_fl_logger.info(f"Saved shard {cid} of {dataset} for {num_parties} parties to {folder}")
+
+
+def has_shard(dataset: str, num_parties: int, cid: int, datasets_dir=DATASETS_DIR) -> bool:
+    folder = shard_dir(dataset, num_parties, cid, datasets_dir)
+    return all((folder / f"{name}.npy").is_file() for name in SHARD_ARRAYS)
+
+
+def load_shard(dataset: str, num_parties: int, cid: int, datasets_dir=DATASETS_DIR):
+    """
+    Returns ((x_train, y_train), (x_val, y_val)) of party `cid` as read only memory maps.
+    The shard is built first if it isn't on disk yet
+    """
+    if not has_shard(dataset, num_parties, cid, datasets_dir):
+        build_shards(dataset, num_parties, cids=[cid], datasets_dir=datasets_dir)
+    folder = shard_dir(dataset, num_parties, cid, datasets_dir)
+    x_train, y_train, x_val, y_val = (np.load(folder / f"{name}.npy", mmap_mode="r") for name in SHARD_ARRAYS)
+    return (x_train, y_train), (x_val, y_val)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .configuration import VALID_DATASETS
+
+    parser = argparse.ArgumentParser(description="Precompute the dataset shards of every party")
+    parser.add_argument("--num_parties", type=int, required=True)
+    parser.add_argument("--dataset", type=str, choices=VALID_DATASETS, default=None, help="Every dataset by default")
+    args = parser.parse_args()
+    for dataset in VALID_DATASETS if args.dataset is None else [args.dataset]:
+        build_shards(dataset, args.num_parties)
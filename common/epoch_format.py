@@ -0,0 +1,75 @@
+# ! Binary format of the epoch timings recorded by the parties
+
+# * {party folder}/epoch_logs.bin -> the same HEADER_SIZE byte header as the power files (with the party's own
+# * clock anchors) followed by one fixed width record per epoch, and optionally per batch. Times are
+# * time.monotonic_ns() and rounds are the server's round numbers, so nothing has to be inferred afterwards.
+# * Only the standard library is needed to write it, common.analysis memory maps it with NumPy
+
+import pathlib
+import struct
+
+from .power_format import HEADER_SIZE, HEADER_STRUCT
+
+EPOCH_LOG_FILENAME = "epoch_logs.bin"
+
+MAGIC = b"EFLEPOCH"
+VERSION = 1
+
+# start (monotonic ns), end (monotonic ns), server round, epoch, kind, batch
+RECORD_STRUCT = struct.Struct("<qqiiii")
+
+RECORD_DTYPE = [
+    ("start_ns", "<i8"),
+    ("end_ns", "<i8"),
+    ("round", "<i4"),
+    ("epoch", "<i4"),  # Starts at 1 in every round
+    ("kind", "<i4"),
+    ("batch", "<i4"),  # -1 for epochs
+]
+
+# Values of the `kind` field
+EPOCH = 0
+BATCH = 1
+
+
+def pack_header(wall_ns: int, monotonic_ns: int) -> bytes:
+    return HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_STRUCT.size, wall_ns, monotonic_ns).ljust(HEADER_SIZE, b"\0")
+
+
+def unpack_header(raw: bytes) -> dict:
+    magic, version, record_size, wall_ns, monotonic_ns = HEADER_STRUCT.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Not an epoch log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported epoch log version {version}")
+    return {"version": version, "record_size": record_size, "wall_ns": wall_ns, "monotonic_ns": monotonic_ns}
+
+
+class EpochLogWriter:
+    """Creates the epoch log at `path`, anchoring the party's monotonic clock to its wall clock once"""
+
+    def __init__(self, path) -> None:
+        import time
+
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(pack_header(time.time_ns(), time.monotonic_ns()))
+
+    def append(self, records: list[tuple]):
+        """Appends (start_ns, end_ns, round, epoch, kind, batch) tuples in one write"""
+        with open(self.path, "ab") as f:
+            f.write(b"".join(RECORD_STRUCT.pack(*record) for record in records))
+
+
+def load_epoch_log(path):
+    """Memory maps the records of the epoch log at `path`. Returns `(header, records)` like power_format.load_power"""
+    import numpy as np
+
+    path = pathlib.Path(path)
+    with open(path, "rb") as f:
+        header = unpack_header(f.read(HEADER_SIZE))
+    count = (path.stat().st_size - HEADER_SIZE) // header["record_size"]
+    if count <= 0:
+        return header, np.zeros(0, dtype=RECORD_DTYPE)
+    return header, np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
@@ -1,19 +1,45 @@
-import datetime
+import time
 
 import tensorflow as tf
 from tensorflow import keras
 from keras.callbacks import Callback
 
+from .epoch_format import BATCH, EPOCH, EpochLogWriter
 
-class TimeHistory(Callback):
-    def on_train_begin(self, logs={}):
-        self.start_times: list[str] = []
-        self.end_times: list[str] = []
 
-    def on_epoch_begin(self, batch, logs={}):
-        self.epoch_time_start = datetime.datetime.now().strftime(r"%H:%M:%S.%f")[:-4]
-        self.start_times.append(self.epoch_time_start)
+class EpochTimer(Callback):
+    """
+    Records the monotonic start and end of every epoch (and batch with `record_batches`) tagged with the
+    server round it belongs to. Timings are kept in memory during training and written once it ends
+    """
 
-    def on_epoch_end(self, batch, logs={}):
-        self.epoch_time_end = datetime.datetime.now().strftime(r"%H:%M:%S.%f")[:-4]
-        self.end_times.append(self.epoch_time_end)
+    def __init__(self, writer: EpochLogWriter, record_batches: bool = False):
+        super().__init__()
+        self.writer = writer
+        self.record_batches = record_batches
+        self.server_round = 0
+        self.records: list[tuple] = []
+
+    def set_round(self, server_round: int):
+        self.server_round = server_round
+
+    def on_train_begin(self, logs=None):
+        self.records = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch + 1
+        self.epoch_start = time.monotonic_ns()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.records.append((self.epoch_start, time.monotonic_ns(), self.server_round, self.epoch, EPOCH, -1))
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.record_batches:
+            self.batch_start = time.monotonic_ns()
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.record_batches:
+            self.records.append((self.batch_start, time.monotonic_ns(), self.server_round, self.epoch, BATCH, batch))
+
+    def on_train_end(self, logs=None):
+        self.writer.append(self.records)
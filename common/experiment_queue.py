@@ -0,0 +1,186 @@
+# ! Persistent queue of the experiments a sweep still has to run
+
+# * Lives in the experiment log database next to `experiments` and `runs`, so a sweep that crashed or was
+# * stopped picks up where it left off. Experiments are served by priority (by default every run of one
+# * configuration before the next configuration), and failed ones are retried after an exponential backoff
+# * until they run out of attempts
+
+import time
+from typing import Callable, Iterable, Optional
+
+from . import configuration
+from . import database
+from .experiments import Experiment
+from .log import energy_fl_logger
+
+# pending   -> waiting to be claimed, possibly not before `not_before`
+# claimed   -> handed to the pipeline and not reported back yet
+# done      -> finished successfully
+# abandoned -> failed `max_attempts` times
+# dropped   -> no longer part of the sweep
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue(
+    folder_name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    model TEXT NOT NULL,
+    fusion TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    batch_size INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    epochs INTEGER NOT NULL,
+    sample_fraction REAL NOT NULL,
+    proximal_mu REAL NOT NULL,
+    num_parties INTEGER,
+    run INTEGER,
+    priority INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queue_next ON queue(version, state, priority, position)
+"""
+
+
+def config_order() -> Callable[[Experiment], int]:
+    """Default priority. Configurations in the order they are first seen, so all runs of one are finished first"""
+    configurations: dict[tuple, int] = {}
+
+    def priority(expt: Experiment) -> int:
+        key = database.experiment_values(expt)[:-1]
+        return configurations.setdefault(key, len(configurations))
+
+    return priority
+
+
+class ExperimentQueue:
+    def __init__(
+        self,
+        version: str,
+        max_attempts: int = configuration.QUEUE_MAX_ATTEMPTS,
+        retry_backoff: float = configuration.QUEUE_RETRY_BACKOFF,
+        poll_interval: float = 5,
+    ) -> None:
+        """Serves the experiments of `version`. A failed experiment waits retry_backoff * 2 ** (attempts - 1) seconds"""
+        self.version = version
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        # The enqueued objects are handed out as is. Rebuilding them from the table would turn an int proximal_mu
+        # into a float, which changes the folder name
+        self.planned: dict[str, Experiment] = {}
+        with database.transaction() as con:
+            for statement in QUEUE_SCHEMA.split(";"):
+                if statement.strip():
+                    con.execute(statement)
+        self.resume()
+
+    def __repr__(self) -> str:
+        return f"Experiment queue for {self.version} {self.counts()}"
+
+    def resume(self):
+        """Experiments that were claimed when the last sweep died never reported back, so they go back to pending"""
+        with database.transaction() as con:
+            resumed = con.execute(
+                "UPDATE queue SET state='pending' WHERE version=? AND state='claimed'", (self.version,)
+            ).rowcount
+        if resumed:
+            energy_fl_logger.warning(f"Resumed {resumed} experiments that were interrupted")
+
+    def enqueue(
+        self,
+        experiments: Iterable[Experiment],
+        priority: Optional[Callable[[Experiment], int]] = None,
+        rerun_finished: bool = False,
+    ):
+        """
+        Makes `experiments` the plan of the sweep, in their order within each priority.
+        Experiments already finished are skipped unless `rerun_finished`, abandoned ones get a fresh set of attempts
+        and pending experiments of this version that aren't in `experiments` are dropped
+        """
+        priority = priority or config_order()
+        completed = set() if rerun_finished else set(database.get_completed_experiments(version_str=self.version))
+        self.planned = {expt.folder_name: expt for expt in experiments if expt not in completed}
+        rows = [
+            (folder_name, *database.experiment_values(expt), priority(expt), position)
+            for position, (folder_name, expt) in enumerate(self.planned.items())
+        ]
+        columns = ("folder_name",) + database.EXPERIMENT_COLUMNS + ("priority", "position")
+        revived = "('abandoned', 'dropped', 'done')" if rerun_finished else "('abandoned', 'dropped')"
+        with database.transaction() as con:
+            pending = {
+                folder_name
+                for folder_name, in con.execute("SELECT folder_name FROM queue WHERE version=? AND state='pending'", (self.version,))
+            }
+            con.executemany(
+                "UPDATE queue SET state='dropped' WHERE folder_name=?",
+                [(folder_name,) for folder_name in pending - set(self.planned)],
+            )
+            con.executemany(
+                f"INSERT INTO queue({', '.join(columns)}) VALUES({', '.join('?' * len(columns))}) "
+                "ON CONFLICT(folder_name) DO UPDATE SET priority=excluded.priority, position=excluded.position, "
+                f"attempts=CASE WHEN queue.state IN {revived} THEN 0 ELSE queue.attempts END, "
+                f"not_before=CASE WHEN queue.state IN {revived} THEN 0 ELSE queue.not_before END, "
+                f"state=CASE WHEN queue.state IN {revived} THEN 'pending' ELSE queue.state END",
+                rows,
+            )
+        energy_fl_logger.info(f"{self}")
+
+    def claim(self) -> Optional[Experiment]:
+        """The highest priority experiment that is ready to run, or None"""
+        with database.transaction() as con:
+            row = con.execute(
+                f"SELECT folder_name, {', '.join(database.EXPERIMENT_COLUMNS)} FROM queue "
+                "WHERE version=? AND state='pending' AND not_before<=? ORDER BY priority, position LIMIT 1",
+                (self.version, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            con.execute("UPDATE queue SET state='claimed' WHERE folder_name=?", (row[0],))
+        return self.planned.get(row[0]) or database.row_to_experiment(row[1:])
+
+    def complete(self, expt: Experiment, success: bool):
+        """Reports back on a claimed experiment. Failures are retried later until they run out of attempts"""
+        with database.transaction() as con:
+            row = con.execute("SELECT attempts FROM queue WHERE folder_name=?", (expt.folder_name,)).fetchone()
+            if row is None:
+                return
+            attempts = row[0] + 1
+            if success:
+                con.execute("UPDATE queue SET state='done', attempts=? WHERE folder_name=?", (attempts, expt.folder_name))
+            elif attempts >= self.max_attempts:
+                con.execute("UPDATE queue SET state='abandoned', attempts=? WHERE folder_name=?", (attempts, expt.folder_name))
+                energy_fl_logger.error(f"Giving up on {expt.folder_name} after {attempts} attempts")
+            else:
+                delay = self.retry_backoff * 2 ** (attempts - 1)
+                con.execute(
+                    "UPDATE queue SET state='pending', attempts=?, not_before=? WHERE folder_name=?",
+                    (attempts, time.time() + delay, expt.folder_name),
+                )
+                energy_fl_logger.warning(f"Retrying {expt.folder_name} in {delay:.0f} seconds (attempt {attempts + 1} of {self.max_attempts})")
+
+    def counts(self) -> dict[str, int]:
+        with database.transaction() as con:
+            return dict(con.execute("SELECT state, COUNT(*) FROM queue WHERE version=? GROUP BY state", (self.version,)))
+
+    def seconds_until_ready(self) -> Optional[float]:
+        """How long until an experiment could be claimed, 0 while one is out for its outcome, None when the sweep is over"""
+        with database.transaction() as con:
+            claimed = con.execute("SELECT 1 FROM queue WHERE version=? AND state='claimed' LIMIT 1", (self.version,)).fetchone()
+            earliest = con.execute("SELECT MIN(not_before) FROM queue WHERE version=? AND state='pending'", (self.version,)).fetchone()[0]
+        if earliest is not None:
+            return max(0.0, earliest - time.time())
+        return 0.0 if claimed else None
+
+    def __iter__(self):
+        """Yields experiments until every one is done or abandoned, waiting out backoffs and outstanding outcomes"""
+        while True:
+            expt = self.claim()
+            if expt is not None:
+                yield expt
+                continue
+            wait = self.seconds_until_ready()
+            if wait is None:
+                energy_fl_logger.info(f"Sweep over. {self}")
+                return
+            time.sleep(min(max(wait, 0.1), self.poll_interval))
@@ -139,69 +139,29 @@ class Experiment:
                 run(f"rm -rf Outputs/Experiments/{self.folder_name}/* ", shell=True)
     
     def add_to_log(self):
-        import sqlite3
-        con = sqlite3.connect(r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        
-        #Ensure that any similar experiments are removed
-        self.clear_similar()
-        
-        cur.execute("""INSERT INTO log(expt, is_finished, is_running, has_failed) VALUES(?,?,?,?)""",(self, False, False, False))
-        
-        cur.close()
-        con.commit()
+        # Any similar experiments are replaced
+        from . import database
+        database.add_experiment(self)
     
     def clear_similar(self):
-        import sqlite3
-        con = sqlite3.connect(r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        
-        cur.execute("DELETE FROM log WHERE expt=?",(self,))
-        
-        cur.close()
-        con.commit()
+        from . import database
+        database.remove_experiment(self)
     
     def set_failed(self):
-        import sqlite3
-        con = sqlite3.connect(r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        
-        cur.execute("UPDATE log SET has_failed=? WHERE expt=?",(True, self))
-        
-        cur.close()
-        con.commit()
+        from . import database
+        database.set_status([self], has_failed=True)
     
     def set_finished(self):
-        import sqlite3
-        con = sqlite3.connect(r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        
-        cur.execute("UPDATE log SET is_finished=? WHERE expt=?",(True, self))
-        cur.execute("UPDATE log SET is_running=? WHERE expt=?",(False, self))
-        
-        cur.close()
-        con.commit()
+        from . import database
+        database.set_status([self], is_finished=True, is_running=False)
 
     def set_running(self):
-        import sqlite3
-        con = sqlite3.connect(r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        
-        cur.execute("DELETE FROM log WHERE is_running=?",(True,))
-        cur.execute("UPDATE log SET is_running=? WHERE expt=?",(True, self))
-        
-        cur.close()
-        con.commit()
+        from . import database
+        database.set_running(self)
     
     def set_not_running(self):
-        import sqlite3
-        con = sqlite3.connect(r"Outputs/Experiments/log.db", detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        
-        cur.execute("UPDATE log SET is_running=? WHERE expt=?",(False, self))
-        
-        cur.close()
-        con.commit()
+        from . import database
+        database.set_status([self], is_running=False)
 
 def generate_all_experiments(
     rounds_and_epochs: list[tuple[int, int]],
@@ -0,0 +1,53 @@
+# ! Classification metrics from a confusion matrix
+
+# * The parties evaluate their validation shard batch by batch and only keep a num_classes x num_classes
+# * matrix of counts, every precision, recall and F1 average is then read off that matrix instead of making
+# * another pass over the predictions for each one. The results match sklearn's with zero_division=0
+
+import numpy as np
+
+AVERAGES = ("micro", "macro", "weighted")
+
+
+def update_confusion(confusion: np.ndarray, y_true, y_pred) -> np.ndarray:
+    """Adds a batch to `confusion` in place. Rows are the true class and columns the predicted one"""
+    num_classes = confusion.shape[0]
+    y_true = np.asarray(y_true, dtype=np.int64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.int64).ravel()
+    confusion += np.bincount(y_true * num_classes + y_pred, minlength=num_classes * num_classes).reshape(
+        num_classes, num_classes
+    )
+    return confusion
+
+
+def divide(numerator, denominator):
+    """Elementwise division that gives 0 wherever the denominator is 0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def classification_metrics(confusion: np.ndarray) -> dict[str, float]:
+    """
+    Accuracy plus {precision, recall, f1} x {micro, macro, weighted} as a dict with keys like 'f1 macro'.
+    Like sklearn, classes that are neither in the labels nor in the predictions are left out of the macro average
+    """
+    true_positives = np.diag(confusion).astype(np.float64)
+    support = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+    present = (support > 0) | (predicted > 0)
+
+    per_class = {
+        "precision": divide(true_positives, predicted),
+        "recall": divide(true_positives, support),
+        "f1": divide(2 * true_positives, support + predicted),
+    }
+    accuracy = float(divide(true_positives.sum(), confusion.sum()))
+
+    metrics = {"accuracy": accuracy}
+    for name, values in per_class.items():
+        # Every false positive of one class is a false negative of another, so all three micro averages are the accuracy
+        metrics[f"{name} micro"] = accuracy
+        metrics[f"{name} macro"] = float(values[present].mean()) if present.any() else 0.0
+        metrics[f"{name} weighted"] = float(divide((values * support).sum(), support.sum()))
+    return metrics
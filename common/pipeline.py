@@ -0,0 +1,125 @@
+# ! Staged pipeline for running experiments back to back
+
+# * Every run is split into three stages :
+# * preflight -> bookkeeping and device checks, overlaps with the collection of the previous run
+# * train     -> the actual measured run. Nothing else touches the devices while this is happening
+# * collect   -> file transfers and DB updates, runs in the background during the cooldown and the next preflight
+
+import time
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+from .experiments import Experiment
+from .log import energy_fl_logger
+
+
+def wait_for(condition: Callable[[], bool], timeout: float, poll_interval: float = 1.0) -> bool:
+    """
+    Calls `condition` until it returns True or `timeout` seconds have passed.
+    Returns True as soon as the condition holds and False if it timed out
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if condition():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(poll_interval, remaining))
+
+
+def wait_for_processes(processes: Iterable[subprocess.Popen], timeout: float) -> bool:
+    """Waits for all the processes to exit within a shared `timeout`. Returns False if any of them is still running"""
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        try:
+            process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            return False
+    return True
+
+
+class Cooldown:
+    """A quiet period that starts when training ends. Waiting only blocks for whatever is left of it"""
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.deadline = time.monotonic()
+
+    def start(self):
+        self.deadline = time.monotonic() + self.seconds
+
+    def wait(self):
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0:
+            energy_fl_logger.info(f"Waiting {remaining:.1f} seconds for next run")
+            time.sleep(remaining)
+
+
+class ExperimentPipeline:
+    """
+    Runs experiments through the preflight, train and collect stages.
+
+    ```
+    preflight(expt) -> context or None if the run can't happen
+    train(expt, context) -> context or None if there is nothing to collect
+    collect(expt, context) -> True if the run succeeded
+    on_finished(expt, success) -> None, called once per experiment with its outcome
+    ```
+
+    The collection of run N is always finished before run N+1 starts training,
+    so file transfers never show up in the measurements of the next run
+    """
+
+    def __init__(
+        self,
+        preflight: Callable[[Experiment], Optional[Any]],
+        train: Callable[[Experiment, Any], Optional[Any]],
+        collect: Callable[[Experiment, Any], bool],
+        cooldown: float,
+        on_finished: Optional[Callable[[Experiment, bool], None]] = None,
+    ) -> None:
+        self.preflight = preflight
+        self.train = train
+        self.collect = collect
+        self.on_finished = on_finished or (lambda expt, success: None)
+        self.cooldown = Cooldown(cooldown)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="collection")
+        self.pending: Optional[Future] = None
+
+    def collect_and_report(self, expt: Experiment, context: Any):
+        success = False
+        try:
+            success = bool(self.collect(expt, context))
+        finally:
+            self.on_finished(expt, success)
+
+    def finish_collection(self):
+        if self.pending is None:
+            return
+        try:
+            self.pending.result()
+        except Exception:
+            energy_fl_logger.exception("File collection of the previous run crashed")
+        self.pending = None
+
+    def run(self, experiments: Iterable[Experiment]):
+        try:
+            for expt in experiments:
+                context = self.preflight(expt)
+                self.finish_collection()
+                if context is None:
+                    self.on_finished(expt, False)
+                    continue
+                self.cooldown.wait()
+
+                context = self.train(expt, context)
+                self.cooldown.start()
+                if context is None:
+                    self.on_finished(expt, False)
+                    continue
+                self.pending = self.executor.submit(self.collect_and_report, expt, context)
+            self.finish_collection()
+        finally:
+            self.executor.shutdown(wait=True)
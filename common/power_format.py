@@ -0,0 +1,161 @@
+# ! Binary format of the power samples recorded by clients/scripts/power_collector.py
+
+# * {name}.bin  -> a HEADER_SIZE byte header followed by fixed width records that are only ever appended to
+# * {name}.json -> sidecar written once collection ends with the success flag and collection statistics
+# * The collector only needs the standard library to write it, the aggregator memory maps the records
+# * as a NumPy structured array without unpickling anything
+
+# * Markers broadcast by the aggregator (round start/end etc) are interleaved with the samples as records
+# * whose `event` is not SAMPLE, and every sample carries the round of the last round marker before it.
+# * Per round energy is then a single pass over the records, no clock joins with other devices needed
+
+import json
+import pathlib
+import struct
+
+POWER_FILE_SUFFIX = ".bin"
+POWER_SIDECAR_SUFFIX = ".json"
+
+MAGIC = b"EFLPOWER"
+VERSION = 2
+
+# magic, version, record size, wall clock anchor (time.time_ns), monotonic anchor (time.monotonic_ns)
+HEADER_STRUCT = struct.Struct("<8sHHqq")
+HEADER_SIZE = 64
+
+# monotonic timestamp (ns), voltage (V), current (A), power (W), mAh, mWh, event, round
+RECORD_STRUCT = struct.Struct("<qfffIIii")
+
+RECORD_DTYPE = [
+    ("t_ns", "<i8"),
+    ("voltage", "<f4"),
+    ("current", "<f4"),
+    ("power", "<f4"),
+    ("mAh", "<u4"),
+    ("mWh", "<u4"),
+    ("event", "<i4"),
+    ("round", "<i4"),
+]
+
+# Older files without markers can still be read
+RECORD_DTYPES = {
+    1: RECORD_DTYPE[:6],
+    2: RECORD_DTYPE,
+}
+
+# Values of the `event` field. Markers whose label isn't one of these are stored as OTHER_MARK
+SAMPLE = 0
+MARK_EVENTS = {
+    "start": 1,
+    "round_start": 2,
+    "round_end": 3,
+    "evaluate_start": 4,
+    "evaluate_end": 5,
+}
+OTHER_MARK = 255
+
+
+def marker_event(label) -> tuple[int, int]:
+    """Turns a marker label, either 'name' or ('name', round), into the (event, round) stored in the power file"""
+    if isinstance(label, (tuple, list)) and len(label) == 2:
+        name, server_round = label
+    else:
+        name, server_round = label, 0
+    if name not in MARK_EVENTS:
+        return OTHER_MARK, 0
+    return MARK_EVENTS[name], int(server_round)
+
+
+def sidecar_path(path) -> pathlib.Path:
+    return pathlib.Path(path).with_suffix(POWER_SIDECAR_SUFFIX)
+
+
+class PowerWriter:
+    """Appends power samples to a new power file. Timestamps must come from time.monotonic_ns()"""
+
+    def __init__(self, path, wall_ns: int, monotonic_ns: int) -> None:
+        self.path = pathlib.Path(path)
+        self.count = 0
+        self.round = 0
+        self.file = open(self.path, "wb")
+        header = HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_STRUCT.size, wall_ns, monotonic_ns)
+        self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def append(self, t_ns: int, voltage: float, current: float, power: float, mAh: int, mWh: int):
+        self.file.write(RECORD_STRUCT.pack(t_ns, voltage, current, power, mAh, mWh, SAMPLE, self.round))
+        self.count += 1
+
+    def append_marker(self, t_ns: int, event: int, server_round: int):
+        nan = float("nan")
+        self.file.write(RECORD_STRUCT.pack(t_ns, nan, nan, nan, 0, 0, event, server_round))
+        if event == MARK_EVENTS["round_start"]:
+            self.round = server_round
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def write_sidecar(self, **metadata):
+        metadata.setdefault("samples", self.count)
+        with open(sidecar_path(self.path), "w") as f:
+            json.dump(metadata, f)
+
+
+def read_header(path) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    magic, version, record_size, wall_ns, monotonic_ns = HEADER_STRUCT.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a power file")
+    if version not in RECORD_DTYPES:
+        raise ValueError(f"{path} has unsupported power file version {version}")
+    return {"version": version, "record_size": record_size, "wall_ns": wall_ns, "monotonic_ns": monotonic_ns}
+
+
+def read_metadata(path) -> dict:
+    """Returns the sidecar of the power file at `path`, or an empty dict if collection never finished"""
+    try:
+        with open(sidecar_path(path), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_power(path):
+    """
+    Memory maps the records of the power file at `path`. Returns `(header, records)`
+    where records is a read only NumPy structured array with the fields in RECORD_DTYPE
+    (only the first six for version 1 files). Use `samples` and `markers` to split them.
+    A record that was only partially written when the collector died is ignored
+    """
+    import numpy as np
+
+    path = pathlib.Path(path)
+    header = read_header(path)
+    count = (path.stat().st_size - HEADER_SIZE) // header["record_size"]
+    dtype = np.dtype(RECORD_DTYPES[header["version"]])
+    if count <= 0:
+        return header, np.zeros(0, dtype=dtype)
+    records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+    return header, records
+
+
+def wall_clock_ns(header: dict, t_ns):
+    """Converts monotonic timestamps from the power file into wall clock (unix epoch) nanoseconds"""
+    return t_ns - header["monotonic_ns"] + header["wall_ns"]
+
+
+def samples(records):
+    """Only the power samples out of the records returned by `load_power`"""
+    if "event" not in records.dtype.names:
+        return records
+    return records[records["event"] == SAMPLE]
+
+
+def markers(records):
+    """Only the markers out of the records returned by `load_power`"""
+    if "event" not in records.dtype.names:
+        return records[:0]
+    return records[records["event"] != SAMPLE]
@@ -0,0 +1,228 @@
+# ! Resource usage sampling straight from /proc, replacing sar
+
+# * ResourceSampler reads the CPU, memory, disk and network counters of the machine it runs on at a fixed
+# * monotonic cadence and turns the deltas into one fixed width record per interval.
+# * clients/scripts/resource_sampler.py streams these records from the parties to the aggregator over ZMQ
+# * and clients/resource_receiver.py stores them, one file per host, in the same layout as the power files:
+# * a HEADER_SIZE byte header with the clock anchors of the host that sampled, followed by the records
+
+import json
+import os
+import pathlib
+import struct
+import time
+
+from .power_format import HEADER_SIZE, HEADER_STRUCT, sidecar_path
+
+RESOURCE_FILE_SUFFIX = ".res"
+
+MAGIC = b"EFLRSRCS"
+VERSION = 1
+
+# monotonic timestamp (ns), then the usage over the interval that ended at that timestamp
+RECORD_STRUCT = struct.Struct("<q10f")
+
+RECORD_DTYPE = [
+    ("t_ns", "<i8"),
+    ("cpu_percent", "<f4"),  # Everything except idle and iowait
+    ("cpu_user", "<f4"),  # user + nice
+    ("cpu_system", "<f4"),  # system + irq + softirq
+    ("cpu_iowait", "<f4"),
+    ("mem_used_kB", "<f4"),  # MemTotal - MemAvailable
+    ("mem_percent", "<f4"),
+    ("disk_read_kBps", "<f4"),
+    ("disk_write_kBps", "<f4"),
+    ("net_rx_kBps", "<f4"),  # All interfaces except loopback
+    ("net_tx_kBps", "<f4"),
+]
+
+SECTOR_SIZE = 512
+
+
+def pack_header(wall_ns: int, monotonic_ns: int) -> bytes:
+    return HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_STRUCT.size, wall_ns, monotonic_ns).ljust(HEADER_SIZE, b"\0")
+
+
+def unpack_header(raw: bytes) -> dict:
+    magic, version, record_size, wall_ns, monotonic_ns = HEADER_STRUCT.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a resource file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported resource file version {version}")
+    return {"version": version, "record_size": record_size, "wall_ns": wall_ns, "monotonic_ns": monotonic_ns}
+
+
+# * /proc readers. Every one returns monotonically increasing counters
+
+
+def read_cpu_times() -> tuple[int, ...]:
+    """(user, nice, system, idle, iowait, irq, softirq, steal) in clock ticks, summed over all CPUs"""
+    with open("/proc/stat", "r") as f:
+        fields = f.readline().split()
+    return tuple(int(field) for field in fields[1:9])
+
+
+def read_memory() -> tuple[int, int]:
+    """(MemTotal, MemAvailable) in kB"""
+    values = {}
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            name, value = line.split(":", 1)
+            if name in ("MemTotal", "MemAvailable"):
+                values[name] = int(value.split()[0])
+                if len(values) == 2:
+                    break
+    return values["MemTotal"], values["MemAvailable"]
+
+
+def read_network_bytes(exclude: tuple[str, ...] = ("lo",)) -> tuple[int, int]:
+    """(received, transmitted) bytes summed over every interface not in `exclude`"""
+    rx = tx = 0
+    with open("/proc/net/dev", "r") as f:
+        for line in f.readlines()[2:]:
+            name, counters = line.split(":", 1)
+            if name.strip() in exclude:
+                continue
+            fields = counters.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+    return rx, tx
+
+
+def physical_disks() -> set[str]:
+    """Whole disks only, so partitions aren't counted twice"""
+    try:
+        return {name for name in os.listdir("/sys/block") if not name.startswith(("loop", "ram", "zram"))}
+    except FileNotFoundError:
+        return set()
+
+
+def read_disk_bytes(disks: set[str]) -> tuple[int, int]:
+    """(read, written) bytes summed over `disks`"""
+    read = written = 0
+    with open("/proc/diskstats", "r") as f:
+        for line in f:
+            fields = line.split()
+            if fields[2] in disks:
+                read += int(fields[5])
+                written += int(fields[9])
+    return read * SECTOR_SIZE, written * SECTOR_SIZE
+
+
+class ResourceSampler:
+    """
+    Samples the machine's resource usage every `interval` seconds on a fixed monotonic cadence,
+    the same way the power collector samples the testers. Missed slots are skipped and counted
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval_ns = int(interval * 1e9)
+        self.disks = physical_disks()
+        self.previous = None
+        self.samples = 0
+        self.dropped_slots = 0
+        self.started_ns = None
+        self.stopped_ns = None
+
+    def read(self) -> tuple:
+        return (
+            time.monotonic_ns(),
+            read_cpu_times(),
+            read_memory(),
+            read_disk_bytes(self.disks),
+            read_network_bytes(),
+        )
+
+    def sample(self):
+        """Returns the packed record for the time since the last call, or None on the first call"""
+        current = self.read()
+        previous, self.previous = self.previous, current
+        if previous is None:
+            return None
+
+        t_ns, cpu, (mem_total, mem_available), (disk_read, disk_write), (net_rx, net_tx) = current
+        seconds = (t_ns - previous[0]) / 1e9
+        cpu_delta = [now - before for now, before in zip(cpu, previous[1])]
+        ticks = sum(cpu_delta) or 1
+        user, nice, system, idle, iowait, irq, softirq, steal = (100 * delta / ticks for delta in cpu_delta)
+        previous_disk_read, previous_disk_write = previous[3]
+        previous_net_rx, previous_net_tx = previous[4]
+        mem_used = mem_total - mem_available
+
+        self.samples += 1
+        return RECORD_STRUCT.pack(
+            t_ns,
+            100 - idle - iowait,
+            user + nice,
+            system + irq + softirq,
+            iowait,
+            mem_used,
+            100 * mem_used / mem_total,
+            (disk_read - previous_disk_read) / 1024 / seconds,
+            (disk_write - previous_disk_write) / 1024 / seconds,
+            (net_rx - previous_net_rx) / 1024 / seconds,
+            (net_tx - previous_net_tx) / 1024 / seconds,
+        )
+
+    def run(self, should_stop, emit) -> None:
+        """Calls `emit` with every packed record until `should_stop()` is true"""
+        self.started_ns = next_slot = time.monotonic_ns()
+        self.sample()
+        while not should_stop():
+            next_slot += self.interval_ns
+            now = time.monotonic_ns()
+            if now < next_slot:
+                time.sleep((next_slot - now) / 1e9)
+            else:
+                missed = (now - next_slot) // self.interval_ns
+                self.dropped_slots += missed
+                next_slot += missed * self.interval_ns
+            record = self.sample()
+            if record is not None:
+                emit(record)
+        self.stopped_ns = time.monotonic_ns()
+
+    def statistics(self) -> dict:
+        elapsed = (self.stopped_ns - self.started_ns) / 1e9 if self.stopped_ns else 0
+        return {
+            "samples": self.samples,
+            "dropped_slots": self.dropped_slots,
+            "interval": self.interval_ns / 1e9,
+            "achieved_rate": self.samples / elapsed if elapsed else 0.0,
+        }
+
+
+class ResourceWriter:
+    """Appends packed records to a new resource file. The header carries the anchors of the host that sampled"""
+
+    def __init__(self, path, header: bytes) -> None:
+        self.path = pathlib.Path(path)
+        self.count = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "wb")
+        self.file.write(header)
+
+    def append(self, record: bytes):
+        self.file.write(record)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def write_sidecar(self, **metadata):
+        metadata.setdefault("samples", self.count)
+        with open(sidecar_path(self.path), "w") as f:
+            json.dump(metadata, f)
+
+
+def load_resource_file(path):
+    """Memory maps the records of the resource file at `path`. Returns `(header, records)` like power_format.load_power"""
+    import numpy as np
+
+    path = pathlib.Path(path)
+    with open(path, "rb") as f:
+        header = unpack_header(f.read(HEADER_SIZE))
+    count = (path.stat().st_size - HEADER_SIZE) // header["record_size"]
+    if count <= 0:
+        return header, np.zeros(0, dtype=RECORD_DTYPE)
+    return header, np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
@@ -0,0 +1,79 @@
+# ! On disk cache of analyzed experiments
+
+# * Every experiment folder is fingerprinted from the relative path, size and mtime of the files in it.
+# * The fingerprints live in a small sqlite index and the analyzed tables of each experiment in a .npz
+# * next to it, so after a sweep only the folders whose inputs changed are parsed again
+
+import hashlib
+import pathlib
+import sqlite3
+import threading
+
+import numpy as np
+
+RESULTS_CACHE_DIR = pathlib.Path("Outputs/Results/cache")
+
+
+def fingerprint(folder) -> str:
+    """Digest of the name, size and modification time of every file under `folder`"""
+    folder = pathlib.Path(folder)
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(folder.rglob("*")):
+        if not path.is_file():
+            continue
+        stat = path.stat()
+        digest.update(f"{path.relative_to(folder).as_posix()}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class ResultsCache:
+    def __init__(self, cache_dir=RESULTS_CACHE_DIR) -> None:
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.cache_dir / "cache.db", check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS experiments (folder TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)"
+            )
+
+    def __repr__(self) -> str:
+        return f"Results cache in {self.cache_dir} with {len(self.folders())} experiments"
+
+    def results_path(self, folder_name: str) -> pathlib.Path:
+        return self.cache_dir / f"{folder_name}.npz"
+
+    def folders(self) -> set[str]:
+        with self.lock:
+            return {row[0] for row in self.connection.execute("SELECT folder FROM experiments")}
+
+    def get(self, folder_name: str, folder_fingerprint: str):
+        """Returns the cached {table: array} for `folder_name`, or None if it's missing or the fingerprint changed"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fingerprint FROM experiments WHERE folder = ?", (folder_name,)
+            ).fetchone()
+        if row is None or row[0] != folder_fingerprint:
+            return None
+        try:
+            with np.load(self.results_path(folder_name), allow_pickle=False) as results:
+                return {name: results[name] for name in results.files}
+        except (OSError, ValueError):
+            return None
+
+    def put(self, folder_name: str, folder_fingerprint: str, results: dict):
+        # The arrays are written before the index so a crash in between only costs a recompute
+        np.savez(self.results_path(folder_name), **results)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO experiments (folder, fingerprint) VALUES (?, ?)",
+                (folder_name, folder_fingerprint),
+            )
+
+    def remove(self, folder_name: str):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM experiments WHERE folder = ?", (folder_name,))
+        self.results_path(folder_name).unlink(missing_ok=True)
+
+    def close(self):
+        self.connection.close()
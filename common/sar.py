@@ -1,176 +1,211 @@
-sar_header = r"""#!/bin/bash
-color='\033[1;31m' # set the color to bold red
-folder=$1
-"""
-#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-
-sar_footer = r"""# Define the remote command to run SAR and collect data
-remote_cmd=$(cat << 'END_CMD'
-trap "exit" INT
-sar -u -r -d -n DEV --iface=eth0 -h 1 > "$USER-sar.txt" &
-echo "SAR data collection started on $HOSTNAME."
-wait
-END_CMD
-)
-
-
-# Start collecting data on all hosts
-for ((i=0;i<${#hosts[@]};++i)); do
-    host=${hosts[i]}
-    username=${usernames[i]}
-    if [ "$username" = "user" ]; then
-      #bash "$remote_cmd2" >/dev/null 2>&1 &
-	sar -u -r -d --dev=sda -n DEV --iface=enp2s0 -h 1 > "$USER-sar.txt" &
-	echo "SAR data collection started on $HOSTNAME."
-    else
-      ssh "$username@$host" "$remote_cmd" >/dev/null 2>&1 &
-fi
-done
-
-# Start time of recording
-start=$(date +%s)
-
-echo "SAR data collection started on all hosts."
-
-read -p "Press enter to stop collecting SAR data."
-
-color1='\033[1;36m'; # set the color to bold cyan
-color2='\033[1;32m'; # set the color to bold green
-
-# Stop collecting data on all hosts
-for ((i=0;i<${#hosts[@]};++i)); do
-    host=${hosts[i]}
-    username=${usernames[i]}
-    if [ "$username" = "user" ]; then
-	echo "user123" | sudo -S kill -INT $(pgrep sar)
-    else
-    	ssh "$username@$host" "kill -INT \$(pgrep sar)" >/dev/null 2>&1
-    fi
-    echo -e "SAR data collection stopped on ${color1}${host}\033[0m."
-done
-
-# Record approximate run time of sar command
-elapsed=$(($(date +%s) - start))
-echo "";
-echo -e "Time Taken : \033[1;32m$(date -d@$elapsed -u +%H\ hours\ %M\ min\ %S\ sec)\033[0m"
-
-# Collect the data files and transfer to trigger machine
-for ((i=0;i<${#hosts[@]};++i)); do
-    host=${hosts[i]}
-    username=${usernames[i]}
-    if [ "$username" = "user" ]; then
-	mv -f $username-sar.txt ~/Energy-FL/Outputs/Experiments/${folder}/$username-sar.txt
-    else
-    	mkdir -p ~/Energy-FL/Outputs/Experiments/${folder}/${username} ; scp $username@$host:$username-sar.txt ~/Energy-FL/Outputs/Experiments/${folder}/${username}/$username-sar.txt ;
-    fi
-    echo "";
-    echo -e "SAR data file transferred from ${color1}${host}\033[0m."
-    echo "";
-
-    color='\033[1;31m' # set the color to bold red
-    echo -e "${color}${username}\033[0m" # print the message in bold red
-
-if [ "$username" = "user" ]; then
- 
-awk '/^Average:/ {
-  if ($2 == "CPU") {
-    printf("%s%s%s\n", "\033[1;32m", "CPU", "\033[0m")
-    print "%user", "%system"
-    getline
-    print $3, $5
-  }
-  if ($2 == "kbmemfree") {
-    printf("%s%s%s\n", "\033[1;32m", "Memory", "\033[0m")
-    print "kbmemused", "%memused"
-    getline
-    print $4, $5
-  }
-  if ($2 == "tps") {
-    printf("%s%s%s\n", "\033[1;32m", "Disk", "\033[0m")
-    print "rkB/s", "wkB/s"
-    getline
-    print $3, $4
-  }
-  if ($2 == "rxpck/s") {
-    printf("%s%s%s\n", "\033[1;32m", "Network", "\033[0m")
-    print "rxpck/s", "txpck/s"
-    getline
-    print $2, $3
-  }
-}' ~/Energy-FL/Outputs/Experiments/${folder}/$username-sar.txt | column -t ;
-
-else
-
-awk '/^Average:/ {
-  if ($2 == "CPU") {
-    printf("%s%s%s\n", "\033[1;32m", "CPU", "\033[0m")
-    print "%user", "%system"
-    getline
-    print $3, $5
-  }
-  if ($2 == "kbmemfree") {
-    printf("%s%s%s\n", "\033[1;32m", "Memory", "\033[0m")
-    print "kbmemused", "%memused"
-    getline
-    print $4, $5
-  }
-  if ($2 == "tps") {
-    printf("%s%s%s\n", "\033[1;32m", "Disk", "\033[0m")
-    print "rkB/s", "wkB/s"
-    getline
-    print $3, $4
-  }
-  if ($2 == "rxpck/s") {
-    printf("%s%s%s\n", "\033[1;32m", "Network", "\033[0m")
-    print "rxpck/s", "txpck/s"
-    getline
-    print $2, $3
-  }
-}' ~/Energy-FL/Outputs/Experiments/${folder}/${username}/$username-sar.txt | column -t ;
-fi
-
-done
-echo "";
-echo "All SAR data files collected."
-
-"""
-
-#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-
-
-def initialize_sar(usernames_ips: dict):
-  
-    from .log import energy_fl_logger
+# ! Parsing of SAR output from experiments recorded before common.resources replaced sar
+
+# * Binary files recorded with `sar -o` are read after converting them with `sadf -d -U` (parse_sadf),
+# * text files written by `sar -h` with parse_sar_text
+
+# Column that names the row's CPU/device/interface, and the section it identifies
+SAR_SECTION_KEYS = {
+    "CPU": "cpu",
+    "kbmemfree": "memory",
+    "DEV": "disk",
+    "IFACE": "network",
+}
+
+# `sar -h` prints sizes with a unit suffix. Every size column in sar is in kB so convert back to kB
+SAR_UNITS_IN_KB = {
+    "B": 1 / 1024,
+    "k": 1,
+    "K": 1,
+    "M": 1024,
+    "G": 1024**2,
+    "T": 1024**3,
+}
+
+
+def _sar_value(token: str) -> float:
+    token = token.rstrip("%")
+    if token and token[-1] in SAR_UNITS_IN_KB:
+        return float(token[:-1]) * SAR_UNITS_IN_KB[token[-1]]
+    return float(token)
+
+
+def _sar_seconds(tokens: list[str]) -> tuple[float, list[str]]:
+    """Splits the timestamp off a sar line. Returns (seconds since midnight, remaining tokens)"""
+    h, m, s = tokens[0].split(":")
+    seconds = int(h) * 3600 + int(m) * 60 + float(s)
+    rest = tokens[1:]
+    if rest and rest[0] in ("AM", "PM"):
+        if rest[0] == "PM" and int(h) != 12:
+            seconds += 12 * 3600
+        elif rest[0] == "AM" and int(h) == 12:
+            seconds -= 12 * 3600
+        rest = rest[1:]
+    return seconds, rest
+
+
+def parse_sar_text(path) -> dict:
     """
-        Input a dictionary with the username of the machine and its ip that you want to collect SAR from
+    Streams through a text file written by sar and returns its per second time series as
 
-        Example :
+    ```
+    {section: {name: {"time": array, column: array, ...}}}
+    ```
 
-        ```
-        ips = {
-        "user": "10.8.1.45",
-        "rpi1": "10.8.1.38",
-        "rpi2": "10.8.1.43",
-        "rpi3": "10.8.1.192",
-        "rpi4": "10.8.1.41",
-    }
-        ```
+    where section is one of 'cpu', 'memory', 'disk' and 'network', name is the CPU ('all', '0', ...),
+    device or interface ('all' for memory) and time is in seconds since midnight, increasing
+    past 86400 if the recording crossed midnight (recordings must be shorter than 12 hours).
+    Sizes are in kB and percentages in percent
     """
-    ips = str(tuple(usernames_ips.values())).replace(",", " ").replace("'", '"')
-    users = str(tuple(usernames_ips.keys())).replace(",", " ").replace("'", '"')
+    import numpy as np
+
+    rows: dict = {}
+    columns = None
+    section = None
+    key_index = None
+    first_time = None
+
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            tokens = line.split()
+            if not tokens or ":" not in tokens[0] or tokens[0].startswith("Average"):
+                # Blank lines, the 'Linux ...' banner and the averages at the end
+                columns = None if not tokens else columns
+                continue
+            try:
+                seconds, tokens = _sar_seconds(tokens)
+            except ValueError:
+                continue
+            if any(key in tokens for key in SAR_SECTION_KEYS):
+                key = next(key for key in SAR_SECTION_KEYS if key in tokens)
+                section = SAR_SECTION_KEYS[key]
+                key_index = tokens.index(key) if section != "memory" else None
+                columns = [column for column in tokens if column != key or section == "memory"]
+                continue
+            if columns is None or "RESTART" in tokens:
+                continue
+
+            # Every section starts over from the first timestamp, so a recording that crossed midnight
+            # is detected by comparing with the very first timestamp in the file
+            if first_time is None:
+                first_time = seconds
+            elif seconds < first_time - 12 * 3600:
+                seconds += 86400
+
+            name = "all" if key_index is None else tokens.pop(key_index)
+            try:
+                values = [_sar_value(token) for token in tokens]
+            except ValueError:
+                continue
+            series = rows.setdefault(section, {}).setdefault(name, {"time": []})
+            series["time"].append(seconds)
+            for column, value in zip(columns, values):
+                series.setdefault(column, []).append(value)
+
+    return {
+        section: {
+            name: {column: np.asarray(values, dtype=np.float64) for column, values in series.items()}
+            for name, series in names.items()
+        }
+        for section, names in rows.items()
+    }
+
 
-    sar_values = f"""
-    
-hosts={ips}
+def _local_midnight(timestamp: float) -> float:
+    import time
 
-usernames={users}
-    
-"""
+    t = time.localtime(timestamp)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1))
 
-    with open("clients/scripts/sar_collector.sh", "w") as f:
-        f.write(sar_header)
-        f.write(sar_values)
-        f.write(sar_footer)
-    energy_fl_logger.info(f"SAR was Initalized with {usernames_ips}")
 
-#!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+def parse_sadf(path, midnight: float = None) -> dict:
+    """
+    Reads the semicolon separated output of `sadf -d -U` and returns the same structure as `parse_sar_text`.
+    sadf timestamps are unix times, they are turned into seconds since `midnight` (a unix time),
+    which defaults to the local midnight before the first sample
+    """
+    import numpy as np
+
+    rows: dict = {}
+    columns = None
+    section = None
+    key_index = None
+
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                # '# hostname;interval;timestamp;CPU;%user;...' starts a new activity
+                header = line.lstrip("# ").split(";")[3:]
+                key = next((key for key in SAR_SECTION_KEYS if key in header), None)
+                section = SAR_SECTION_KEYS.get(key)
+                key_index = header.index(key) if section not in (None, "memory") else None
+                columns = [column for column in header if column != key or section == "memory"]
+                continue
+            if section is None:
+                continue
+            tokens = line.split(";")
+            if len(tokens) < 4:
+                continue
+            tokens, fields = tokens[2], tokens[3:]
+            name = "all" if key_index is None else fields.pop(key_index)
+            # sadf writes the 'all' CPU as -1
+            name = "all" if name == "-1" else name
+            try:
+                timestamp = float(tokens)
+                values = [float(field) for field in fields]
+            except ValueError:
+                continue
+            series = rows.setdefault(section, {}).setdefault(name, {"time": []})
+            series["time"].append(timestamp)
+            for column, value in zip(columns, values):
+                series.setdefault(column, []).append(value)
+
+    if midnight is None:
+        first = min((min(series["time"]) for names in rows.values() for series in names.values()), default=0.0)
+        midnight = _local_midnight(first)
+
+    parsed = {
+        section: {
+            name: {column: np.asarray(values, dtype=np.float64) for column, values in series.items()}
+            for name, series in names.items()
+        }
+        for section, names in rows.items()
+    }
+    for names in parsed.values():
+        for series in names.values():
+            series["time"] -= midnight
+    return parsed
+
+
+def load_sar(path, midnight: float = None) -> dict:
+    """Parses a SAR file by its extension, `.csv` from sadf or anything else as text from `sar -h`"""
+    import pathlib
+
+    if pathlib.Path(path).suffix == ".csv":
+        return parse_sadf(path, midnight=midnight)
+    return parse_sar_text(path)
+
+
+def summarize(parsed: dict) -> list[tuple[str, str, float]]:
+    """Averages of the columns that the collector script prints after each run, as (section, column, mean)"""
+    summary = []
+    for section, name, column_names in (
+        ("cpu", "all", ("%user", "%system")),
+        ("memory", "all", ("kbmemused", "%memused")),
+    ):
+        series = parsed.get(section, {}).get(name)
+        if series is not None:
+            summary.extend((section, column, float(series[column].mean())) for column in column_names if column in series)
+    for section, column_names in (("disk", ("rkB/s", "wkB/s")), ("network", ("rxpck/s", "txpck/s"))):
+        for name, series in parsed.get(section, {}).items():
+            summary.extend((f"{section}:{name}", column, float(series[column].mean())) for column in column_names if column in series)
+    return summary
+
+
+if __name__ == "__main__":
+    import sys
+
+    for section, column, mean in summarize(load_sar(sys.argv[1])):
+        print(section, column, f"{mean:.2f}")
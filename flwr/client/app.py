@@ -17,7 +17,7 @@
 
 import sys
 import time
-from logging import INFO
+from logging import INFO, WARNING
 from typing import Callable, Dict, Optional, Union
 
 from flwr.common import (
@@ -28,6 +28,10 @@ from flwr.common import (
     parameters_to_ndarrays,
 )
 from flwr.common.address import parse_address
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+from flwr.common.codec import TENSOR_TYPE_CONFIG_KEY, sendable_tensor_type
+from flwr.common.parameter import NDARRAY_TENSOR_TYPE
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 from flwr.common.constant import (
     MISSING_EXTRA_REST,
     TRANSPORT_TYPE_GRPC_BIDI,
@@ -38,6 +42,7 @@ from flwr.common.constant import (
 from flwr.common.logger import log
 from flwr.common.typing import (
     Code,
+    Config,
     EvaluateIns,
     EvaluateRes,
     FitIns,
@@ -315,10 +320,27 @@ def _get_properties(self: Client, ins: GetPropertiesIns) -> GetPropertiesRes:
     )
 
 
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+def _tensor_type(config: Config) -> str:
+    """Tensor type the strategy asked for in `config`, as far as it is installed."""
+    tensor_type = str(config.get(TENSOR_TYPE_CONFIG_KEY, NDARRAY_TENSOR_TYPE))
+    if tensor_type == NDARRAY_TENSOR_TYPE:
+        return tensor_type
+    sendable = sendable_tensor_type(tensor_type)
+    if sendable != tensor_type:
+        log(WARNING, "Replying in %s, %s is not installed", sendable, tensor_type)
+    return sendable
+
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+
+
 def _get_parameters(self: Client, ins: GetParametersIns) -> GetParametersRes:
     """Return the current local model parameters."""
     parameters = self.numpy_client.get_parameters(config=ins.config)  # type: ignore
-    parameters_proto = ndarrays_to_parameters(parameters)
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    parameters_proto = ndarrays_to_parameters(parameters, _tensor_type(ins.config))
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     return GetParametersRes(
         status=Status(code=Code.OK, message="Success"), parameters=parameters_proto
     )
@@ -341,7 +363,11 @@ def _fit(self: Client, ins: FitIns) -> FitRes:
 
     # Return FitRes
     parameters_prime, num_examples, metrics = results
-    parameters_prime_proto = ndarrays_to_parameters(parameters_prime)
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    parameters_prime_proto = ndarrays_to_parameters(
+        parameters_prime, _tensor_type(ins.config)
+    )
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     return FitRes(
         status=Status(code=Code.OK, message="Success"),
         parameters=parameters_prime_proto,
@@ -17,6 +17,8 @@
 
 from typing import Dict, Tuple
 
+import numpy as np
+
 from flwr.common import (
     Config,
     EvaluateIns,
@@ -29,7 +31,11 @@ from flwr.common import (
     GetPropertiesRes,
     NDArrays,
     Scalar,
+    ndarrays_to_parameters,
+    parameters_to_ndarrays,
 )
+from flwr.common.codec import TENSOR_TYPE_CONFIG_KEY, ZLIB_TENSOR_TYPE
+from flwr.common.parameter import NDARRAY_TENSOR_TYPE
 
 from .app import ClientLike, start_client, start_numpy_client, to_client
 from .client import Client
@@ -134,3 +140,31 @@ def test_start_numpy_client_transport_invalid() -> None:
         raise AssertionError()  # Fail the test if no exception was raised
     except ValueError:
         pass
+
+
+def test_numpyclient_fit_replies_in_requested_tensor_type() -> None:
+    """Test that fit results are encoded as the strategy asked."""
+
+    # Prepare
+    class DoublingClient(NeedsWrappingClient):
+        """Doubles the weights it receives."""
+
+        def fit(
+            self, parameters: NDArrays, config: Config
+        ) -> Tuple[NDArrays, int, Dict[str, Scalar]]:
+            return [layer * 2 for layer in parameters], 1, {}
+
+    client = to_client(DoublingClient())
+    weights = [np.arange(4, dtype=np.float32)]
+    ins = FitIns(
+        ndarrays_to_parameters(weights), {TENSOR_TYPE_CONFIG_KEY: ZLIB_TENSOR_TYPE}
+    )
+
+    # Execute
+    res = client.fit(ins)
+    default_res = client.fit(FitIns(ndarrays_to_parameters(weights), {}))
+
+    # Assert
+    assert res.parameters.tensor_type == ZLIB_TENSOR_TYPE
+    assert default_res.parameters.tensor_type == NDARRAY_TENSOR_TYPE
+    np.testing.assert_equal(parameters_to_ndarrays(res.parameters), [weights[0] * 2])
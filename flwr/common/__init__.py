@@ -16,6 +16,9 @@
 
 
 from .date import now as now
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+from .flat_parameters import FlatParameters as FlatParameters
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 from .grpc import GRPC_MAX_MESSAGE_LENGTH
 from .logger import configure as configure
 from .logger import log as log
@@ -23,6 +26,10 @@ from .parameter import bytes_to_ndarray as bytes_to_ndarray
 from .parameter import ndarray_to_bytes as ndarray_to_bytes
 from .parameter import ndarrays_to_parameters as ndarrays_to_parameters
 from .parameter import parameters_to_ndarrays as parameters_to_ndarrays
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+from .parameter import ndarray_to_raw_bytes as ndarray_to_raw_bytes
+from .parameter import raw_bytes_to_ndarray as raw_bytes_to_ndarray
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 from .telemetry import EventType as EventType
 from .telemetry import event as event
 from .typing import ClientMessage as ClientMessage
@@ -61,6 +68,7 @@ __all__ = [
     "EventType",
     "FitIns",
     "FitRes",
+    "FlatParameters",
     "GetParametersIns",
     "GetParametersRes",
     "GetPropertiesIns",
@@ -70,6 +78,7 @@ __all__ = [
     "Metrics",
     "MetricsAggregationFn",
     "ndarray_to_bytes",
+    "ndarray_to_raw_bytes",
     "now",
     "NDArray",
     "NDArrays",
@@ -77,6 +86,7 @@ __all__ = [
     "Parameters",
     "parameters_to_ndarrays",
     "Properties",
+    "raw_bytes_to_ndarray",
     "ReconnectIns",
     "Scalar",
     "ServerMessage",
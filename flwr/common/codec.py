@@ -0,0 +1,327 @@
+# Copyright 2023 Flower Labs GmbH. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Compression codecs for the tensors of `Parameters`, keyed on `tensor_type`."""
+
+
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, cast
+
+import numpy as np
+
+from .typing import NDArray, NDArrays, Parameters
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+# Tensor type of `Parameters` serialized with `ndarray_to_raw_bytes`
+RAW_TENSOR_TYPE = "numpy.raw"
+
+# Length of the dtype string and number of dimensions, followed by the dtype
+# string, one little-endian int64 per dimension and padding up to the payload
+RAW_HEADER = struct.Struct("<BB")
+RAW_ALIGNMENT = 16
+
+# Config key a strategy sets to the tensor type clients should reply with
+TENSOR_TYPE_CONFIG_KEY = "tensor_type"
+
+# Lossless
+ZLIB_TENSOR_TYPE = "numpy.raw+zlib"
+ZSTD_TENSOR_TYPE = "numpy.raw+zstd"
+LZ4_TENSOR_TYPE = "numpy.raw+lz4"
+
+# Lossy, applied to floating point layers only
+FLOAT16_TENSOR_TYPE = "numpy.raw+float16"
+UINT8_TENSOR_TYPE = "numpy.raw+uint8"
+
+# Length of each array packed into a tensor, arrays start 16-byte aligned
+_PACKED_LENGTH = struct.Struct("<Q")
+_PACKED_ALIGNMENT = 16
+
+
+def _raw_header(dtype: np.dtype, shape: Tuple[int, ...]) -> bytes:
+    dtype_str = dtype.str.encode()
+    header = b"".join(
+        (
+            RAW_HEADER.pack(len(dtype_str), len(shape)),
+            dtype_str,
+            struct.pack(f"<{len(shape)}q", *shape),
+        )
+    )
+    # Keeps the payload aligned for the dtype when decoded in place
+    return header.ljust(-(-len(header) // RAW_ALIGNMENT) * RAW_ALIGNMENT, b"\0")
+
+
+def ndarray_to_raw_bytes(ndarray: NDArray) -> bytes:
+    """Serialize NumPy ndarray to a short header and its raw little-endian data.
+
+    The data is copied once, straight into the returned bytes.
+    """
+    dtype = ndarray.dtype
+    if dtype.hasobject or dtype.fields is not None:
+        raise ValueError(f"Arrays of dtype {dtype} cannot be serialized raw")
+    if dtype.byteorder == ">":
+        dtype = dtype.newbyteorder("<")
+    ndarray = np.asarray(ndarray, dtype=dtype, order="C")
+    payload = memoryview(ndarray.reshape(-1).view(np.uint8))
+    return b"".join((_raw_header(dtype, ndarray.shape), payload))
+
+
+def raw_bytes_to_ndarray(tensor: bytes) -> NDArray:
+    """Deserialize NumPy ndarray from `ndarray_to_raw_bytes` output.
+
+    The array is a read-only view of `tensor`, no data is copied.
+    """
+    dtype_length, ndim = RAW_HEADER.unpack_from(tensor)
+    offset = RAW_HEADER.size
+    dtype = np.dtype(bytes(tensor[offset : offset + dtype_length]).decode())
+    offset += dtype_length
+    shape = struct.unpack_from(f"<{ndim}q", tensor, offset)
+    offset = -(-(offset + 8 * ndim) // RAW_ALIGNMENT) * RAW_ALIGNMENT
+    count = int(np.prod(shape, dtype=np.int64))
+    ndarray = np.frombuffer(tensor, dtype=dtype, count=count, offset=offset)
+    return cast(NDArray, ndarray.reshape(shape))
+
+
+class Codec(ABC):
+    """Encoding of the layers of a model into `Parameters` of one tensor type."""
+
+    tensor_type: str
+
+    @abstractmethod
+    def encode(self, ndarrays: NDArrays) -> Parameters:
+        """Encode layers into `Parameters` of this codec's tensor type."""
+
+    @abstractmethod
+    def decode(self, parameters: Parameters) -> NDArrays:
+        """Decode `Parameters` of this codec's tensor type into writable layers."""
+
+    def check_tensor_type(self, parameters: Parameters) -> None:
+        if parameters.tensor_type != self.tensor_type:
+            raise ValueError(
+                f"Cannot decode {parameters.tensor_type} tensors as {self.tensor_type}"
+            )
+
+
+class LayerCodec(Codec):
+    """Codec encoding every layer into a tensor of its own."""
+
+    @abstractmethod
+    def encode_ndarray(self, ndarray: NDArray) -> bytes:
+        """Encode one layer into one tensor."""
+
+    @abstractmethod
+    def decode_ndarray(self, tensor: bytes) -> NDArray:
+        """Decode one tensor written by `encode_ndarray`."""
+
+    def encode(self, ndarrays: NDArrays) -> Parameters:
+        return Parameters(
+            tensors=[self.encode_ndarray(ndarray) for ndarray in ndarrays],
+            tensor_type=self.tensor_type,
+        )
+
+    def decode(self, parameters: Parameters) -> NDArrays:
+        self.check_tensor_type(parameters)
+        ndarrays = [self.decode_ndarray(tensor) for tensor in parameters.tensors]
+        # Views of the received bytes are copied, as np.load would have
+        return [
+            ndarray if ndarray.flags.writeable else ndarray.copy()
+            for ndarray in ndarrays
+        ]
+
+
+class RawCodec(LayerCodec):
+    """Raw tensors, `decode_ndarray` is zero-copy."""
+
+    tensor_type = RAW_TENSOR_TYPE
+
+    def encode_ndarray(self, ndarray: NDArray) -> bytes:
+        return ndarray_to_raw_bytes(ndarray)
+
+    def decode_ndarray(self, tensor: bytes) -> NDArray:
+        return raw_bytes_to_ndarray(tensor)
+
+
+class CompressionCodec(LayerCodec):
+    """Lossless, raw tensors compressed as a whole."""
+
+    def __init__(
+        self,
+        tensor_type: str,
+        compress: Callable[[bytes], bytes],
+        decompress: Callable[[bytes], bytes],
+    ) -> None:
+        self.tensor_type = tensor_type
+        self.compress = compress
+        self.decompress = decompress
+
+    def encode_ndarray(self, ndarray: NDArray) -> bytes:
+        return self.compress(ndarray_to_raw_bytes(ndarray))
+
+    def decode_ndarray(self, tensor: bytes) -> NDArray:
+        return raw_bytes_to_ndarray(self.decompress(tensor))
+
+
+def _pack(ndarrays: Sequence[NDArray]) -> bytes:
+    chunks: List[bytes] = []
+    for ndarray in ndarrays:
+        raw = ndarray_to_raw_bytes(ndarray)
+        length = _PACKED_LENGTH.pack(len(raw))
+        chunks.append(length.ljust(_PACKED_ALIGNMENT, b"\0"))
+        chunks.append(raw)
+        chunks.append(b"\0" * (-len(raw) % _PACKED_ALIGNMENT))
+    return b"".join(chunks)
+
+
+def _unpack(tensor: bytes) -> NDArrays:
+    view = memoryview(tensor)
+    ndarrays: NDArrays = []
+    offset = 0
+    while offset < len(view):
+        (length,) = _PACKED_LENGTH.unpack_from(view, offset)
+        offset += _PACKED_ALIGNMENT
+        ndarrays.append(raw_bytes_to_ndarray(view[offset : offset + length]))
+        offset += length + (-length % _PACKED_ALIGNMENT)
+    return ndarrays
+
+
+class LossyCodec(LayerCodec):
+    """Lossy encoding of floating point layers, other layers are sent as is.
+
+    Each tensor packs the arrays returned by `compress`, or only the layer
+    itself when it is not compressed.
+    """
+
+    @abstractmethod
+    def compress(self, ndarray: NDArray) -> Optional[NDArrays]:
+        """Arrays a floating point layer is encoded as, None to send it as is."""
+
+    @abstractmethod
+    def restore(self, ndarrays: NDArrays) -> NDArray:
+        """Approximate layer from the arrays returned by `compress`."""
+
+    def encode_ndarray(self, ndarray: NDArray) -> bytes:
+        compressed = None
+        if np.issubdtype(ndarray.dtype, np.floating) and ndarray.size > 0:
+            compressed = self.compress(ndarray)
+        return _pack([ndarray] if compressed is None else compressed)
+
+    def decode_ndarray(self, tensor: bytes) -> NDArray:
+        ndarrays = _unpack(tensor)
+        if len(ndarrays) == 1:
+            return ndarrays[0]
+        return self.restore(ndarrays)
+
+
+class Float16Codec(LossyCodec):
+    """Layers cast to float16 and back to their own dtype."""
+
+    tensor_type = FLOAT16_TENSOR_TYPE
+
+    def compress(self, ndarray: NDArray) -> Optional[NDArrays]:
+        if ndarray.dtype == np.float16:
+            return None
+        # The empty array only carries the dtype to restore
+        return [ndarray.astype(np.float16), np.empty(0, dtype=ndarray.dtype)]
+
+    def restore(self, ndarrays: NDArrays) -> NDArray:
+        values, like = ndarrays
+        return values.astype(like.dtype)
+
+
+class Uint8Codec(LossyCodec):
+    """Linear 8-bit quantization between the minimum and maximum of each layer."""
+
+    tensor_type = UINT8_TENSOR_TYPE
+
+    def compress(self, ndarray: NDArray) -> Optional[NDArrays]:
+        low, high = ndarray.min(), ndarray.max()
+        scale = (high - low) / 255 if high > low else 1
+        quantized = np.rint((ndarray - low) / scale).astype(np.uint8)
+        return [quantized, np.array([low, scale], dtype=ndarray.dtype)]
+
+    def restore(self, ndarrays: NDArrays) -> NDArray:
+        quantized, (low, scale) = ndarrays
+        ndarray = quantized.astype(ndarrays[1].dtype)
+        ndarray *= scale
+        ndarray += low
+        return ndarray
+
+
+CODECS: Dict[str, Codec] = {}
+
+# Tensor types whose codec needs a package that is not installed, and the package
+UNAVAILABLE_CODECS: Dict[str, str] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Make `codec` the one used for its tensor type."""
+    CODECS[codec.tensor_type] = codec
+    UNAVAILABLE_CODECS.pop(codec.tensor_type, None)
+
+
+def get_codec(tensor_type: str) -> Codec:
+    """Codec registered for `tensor_type`."""
+    if tensor_type in UNAVAILABLE_CODECS:
+        raise ValueError(
+            f"Tensor type {tensor_type} needs the "
+            f"{UNAVAILABLE_CODECS[tensor_type]} package"
+        )
+    if tensor_type not in CODECS:
+        raise ValueError(f"Unsupported tensor type {tensor_type}")
+    return CODECS[tensor_type]
+
+
+def sendable_tensor_type(tensor_type: str) -> str:
+    """`tensor_type`, or zlib in place of a compressor that is not installed.
+
+    The fallback is labeled as zlib, so any receiver can decode it.
+    """
+    if tensor_type in UNAVAILABLE_CODECS:
+        return ZLIB_TENSOR_TYPE
+    get_codec(tensor_type)
+    return tensor_type
+
+
+register_codec(RawCodec())
+register_codec(
+    CompressionCodec(ZLIB_TENSOR_TYPE, zlib.compress, zlib.decompress)
+)
+
+# zstd and lz4 need optional packages, senders fall back to zlib without them
+try:
+    import zstandard
+
+    register_codec(
+        CompressionCodec(
+            ZSTD_TENSOR_TYPE,
+            lambda data: zstandard.ZstdCompressor().compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data),
+        )
+    )
+except ImportError:
+    UNAVAILABLE_CODECS[ZSTD_TENSOR_TYPE] = "zstandard"
+
+try:
+    import lz4.frame
+
+    register_codec(
+        CompressionCodec(LZ4_TENSOR_TYPE, lz4.frame.compress, lz4.frame.decompress)
+    )
+except ImportError:
+    UNAVAILABLE_CODECS[LZ4_TENSOR_TYPE] = "lz4"
+
+register_codec(Float16Codec())
+register_codec(Uint8Codec())
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
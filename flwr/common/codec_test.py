@@ -0,0 +1,132 @@
+# Copyright 2023 Flower Labs GmbH. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Codec tests."""
+
+
+import numpy as np
+import pytest
+
+from .codec import (
+    FLOAT16_TENSOR_TYPE,
+    LZ4_TENSOR_TYPE,
+    UINT8_TENSOR_TYPE,
+    UNAVAILABLE_CODECS,
+    ZLIB_TENSOR_TYPE,
+    ZSTD_TENSOR_TYPE,
+    get_codec,
+    sendable_tensor_type,
+)
+from .parameter import (
+    NDARRAY_TENSOR_TYPE,
+    RAW_TENSOR_TYPE,
+    encode_parameters,
+    ndarrays_to_parameters,
+    parameters_to_ndarrays,
+)
+from .typing import NDArrays
+
+
+def _layers() -> NDArrays:
+    rng = np.random.default_rng(0)
+    return [
+        rng.standard_normal((16, 8)).astype(np.float32),
+        np.arange(5),
+        np.zeros((0, 3), dtype=np.float32),
+        np.array(2.5),
+    ]
+
+
+@pytest.mark.parametrize(
+    "tensor_type", [ZLIB_TENSOR_TYPE, ZSTD_TENSOR_TYPE, LZ4_TENSOR_TYPE]
+)
+def test_lossless_round_trip(tensor_type: str) -> None:
+    """Test that lossless codecs restore the layers exactly."""
+    layers = _layers()
+
+    parameters = ndarrays_to_parameters(layers, sendable_tensor_type(tensor_type))
+    result = parameters_to_ndarrays(parameters)
+
+    for actual, expected in zip(result, layers):
+        assert actual.dtype == expected.dtype
+        np.testing.assert_equal(actual, expected)
+
+
+@pytest.mark.parametrize(
+    "tensor_type, tolerance", [(FLOAT16_TENSOR_TYPE, 1e-2), (UINT8_TENSOR_TYPE, 5e-2)]
+)
+def test_lossy_round_trip(tensor_type: str, tolerance: float) -> None:
+    """Test that lossy codecs approximate floats and keep other layers."""
+    layers = _layers()
+
+    parameters = ndarrays_to_parameters(layers, tensor_type)
+    result = parameters_to_ndarrays(parameters)
+
+    assert parameters.tensor_type == tensor_type
+    for actual, expected in zip(result, layers):
+        assert actual.shape == expected.shape
+        assert actual.dtype == expected.dtype
+        np.testing.assert_allclose(actual, expected, atol=tolerance)
+    np.testing.assert_equal(result[1], layers[1])
+
+
+def test_lossy_codecs_shrink_float_layers() -> None:
+    """Test that lossy tensors are smaller than raw ones."""
+    layer = np.ones((64, 64), dtype=np.float32)
+
+    raw = len(ndarrays_to_parameters([layer], RAW_TENSOR_TYPE).tensors[0])
+    float16 = len(ndarrays_to_parameters([layer], FLOAT16_TENSOR_TYPE).tensors[0])
+    uint8 = len(ndarrays_to_parameters([layer], UINT8_TENSOR_TYPE).tensors[0])
+
+    assert float16 < raw / 1.9
+    assert uint8 < raw / 3.9
+
+
+def test_unknown_tensor_type() -> None:
+    """Test that unknown tensor types are rejected on encode."""
+    with pytest.raises(ValueError):
+        ndarrays_to_parameters(_layers(), "numpy.unknown")
+
+
+@pytest.mark.parametrize("tensor_type", [ZSTD_TENSOR_TYPE, LZ4_TENSOR_TYPE])
+def test_missing_compressor(tensor_type: str) -> None:
+    """Test that a missing compressor is never stood in for under its name."""
+    if tensor_type not in UNAVAILABLE_CODECS:
+        assert sendable_tensor_type(tensor_type) == tensor_type
+        return
+
+    with pytest.raises(ValueError):
+        get_codec(tensor_type)
+    assert sendable_tensor_type(tensor_type) == ZLIB_TENSOR_TYPE
+
+
+def test_decode_with_other_codec_fails() -> None:
+    """Test that tensors are not decoded by a codec of another type."""
+    parameters = ndarrays_to_parameters(_layers(), ZLIB_TENSOR_TYPE)
+
+    with pytest.raises(ValueError):
+        get_codec(FLOAT16_TENSOR_TYPE).decode(parameters)
+
+
+def test_encode_parameters() -> None:
+    """Test that parameters are only re-encoded when of another type."""
+    parameters = ndarrays_to_parameters(_layers())
+
+    same = encode_parameters(parameters, NDARRAY_TENSOR_TYPE)
+    other = encode_parameters(parameters, ZLIB_TENSOR_TYPE)
+
+    assert same is parameters
+    assert other.tensor_type == ZLIB_TENSOR_TYPE
+    for actual, expected in zip(parameters_to_ndarrays(other), _layers()):
+        np.testing.assert_equal(actual, expected)
@@ -15,19 +15,26 @@
 """Building block functions for DP algorithms."""
 
 
-from typing import Tuple
+from typing import Tuple, Union
 
 import numpy as np
 
+from flwr.common.flat_parameters import FlatParameters
 from flwr.common.typing import NDArrays
 
 
 # Calculates the L2-norm of a potentially ragged array
-def _get_update_norm(update: NDArrays) -> float:
-    flattened_update = update[0]
-    for i in range(1, len(update)):
-        flattened_update = np.append(flattened_update, update[i])  # type: ignore
-    return float(np.sqrt(np.sum(np.square(flattened_update))))
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+def _get_update_norm(update: Union[NDArrays, FlatParameters]) -> float:
+    # One copy into a flat buffer instead of a growing np.append per layer
+    if not isinstance(update, FlatParameters):
+        update = FlatParameters.from_ndarrays(update)
+    return float(
+        np.sqrt(sum(np.sum(np.square(buffer)) for buffer in update.buffers))
+    )
+
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
 
 def add_gaussian_noise(update: NDArrays, std_dev: float) -> NDArrays:
@@ -40,7 +47,14 @@ def add_gaussian_noise(update: NDArrays, std_dev: float) -> NDArrays:
 
 def clip_by_l2(update: NDArrays, threshold: float) -> Tuple[NDArrays, bool]:
     """Scales the update so thats its L2 norm is upper-bound to threshold."""
-    update_norm = _get_update_norm(update)
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    flat_update = FlatParameters.from_ndarrays(update)
+    update_norm = _get_update_norm(flat_update)
     scaling_factor = min(1, threshold / update_norm)
-    update_clipped: NDArrays = [layer * scaling_factor for layer in update]
+    update_clipped: NDArrays = FlatParameters(
+        [buffer * scaling_factor for buffer in flat_update.buffers],
+        flat_update.shapes,
+        flat_update.segments,
+    ).to_ndarrays()
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     return update_clipped, (scaling_factor < 1)
@@ -0,0 +1,211 @@
+# Copyright 2023 Flower Labs GmbH. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Model parameters stored in one contiguous buffer."""
+
+
+import json
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .codec import Codec, register_codec
+from .parameter import ndarrays_to_parameters, parameters_to_ndarrays
+from .typing import NDArray, NDArrays, Parameters
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+# Tensor type of `Parameters` holding a JSON header and the raw buffer
+FLAT_TENSOR_TYPE = "numpy.flat"
+
+Shape = Tuple[int, ...]
+
+
+class FlatParameters:
+    """All layers of a model in one contiguous 1-D buffer per dtype.
+
+    Layers are zero-copy views into `buffers` and keep their own dtype, so
+    element-wise operations on the whole model are one NumPy call per buffer,
+    a single one for the usual model whose layers all share a dtype.
+    """
+
+    def __init__(
+        self,
+        buffers: Sequence[NDArray],
+        shapes: Sequence[Shape],
+        segments: Optional[Sequence[int]] = None,
+    ) -> None:
+        self.buffers: List[NDArray] = list(buffers)
+        self.shapes: List[Shape] = [
+            tuple(int(dim) for dim in shape) for shape in shapes
+        ]
+        # Index of the buffer holding each layer
+        self.segments: List[int] = (
+            [0] * len(self.shapes) if segments is None else list(segments)
+        )
+        if len(self.segments) != len(self.shapes):
+            raise ValueError("Every layer needs the index of its buffer")
+        # Start and end of each layer in its buffer
+        self.offsets: List[Tuple[int, int]] = []
+        sizes = [0] * len(self.buffers)
+        for segment, shape in zip(self.segments, self.shapes):
+            start = sizes[segment]
+            sizes[segment] += int(np.prod(shape, dtype=np.int64))
+            self.offsets.append((start, sizes[segment]))
+        for buffer, size in zip(self.buffers, sizes):
+            if buffer.ndim != 1 or buffer.size != size:
+                raise ValueError(
+                    f"Buffer of size {buffer.size} does not hold {size} elements"
+                )
+
+    @classmethod
+    def from_ndarrays(
+        cls, ndarrays: NDArrays, dtype: Optional[np.dtype] = None
+    ) -> "FlatParameters":
+        """Copy layers into new buffers, one per layer dtype unless `dtype` is set."""
+        dtypes = [
+            np.asarray(layer).dtype if dtype is None else np.dtype(dtype)
+            for layer in ndarrays
+        ]
+        flat = cls.empty([np.shape(layer) for layer in ndarrays], dtypes)
+        flat.copy_from(ndarrays)
+        return flat
+
+    @classmethod
+    def empty(
+        cls, shapes: Sequence[Shape], dtypes: Sequence[np.dtype]
+    ) -> "FlatParameters":
+        """Allocate uninitialized buffers for layers of the given shapes and dtypes."""
+        unique: List[np.dtype] = []
+        segments: List[int] = []
+        sizes: List[int] = []
+        for shape, dtype in zip(shapes, dtypes):
+            if dtype not in unique:
+                unique.append(dtype)
+                sizes.append(0)
+            segments.append(unique.index(dtype))
+            sizes[segments[-1]] += int(np.prod(shape, dtype=np.int64))
+        buffers = [np.empty(size, dtype=dtype) for size, dtype in zip(sizes, unique)]
+        return cls(buffers, shapes, segments)
+
+    def empty_like(
+        self, dtypes: Optional[Sequence[np.dtype]] = None
+    ) -> "FlatParameters":
+        """Same layout, with optionally one new dtype per buffer."""
+        if dtypes is None:
+            dtypes = [buffer.dtype for buffer in self.buffers]
+        buffers = [
+            np.empty_like(buffer, dtype=dtype)
+            for buffer, dtype in zip(self.buffers, dtypes)
+        ]
+        return FlatParameters(buffers, self.shapes, self.segments)
+
+    def zeros_like(
+        self, dtypes: Optional[Sequence[np.dtype]] = None
+    ) -> "FlatParameters":
+        flat = self.empty_like(dtypes)
+        for buffer in flat.buffers:
+            buffer.fill(0)
+        return flat
+
+    def copy(self) -> "FlatParameters":
+        buffers = [buffer.copy() for buffer in self.buffers]
+        return FlatParameters(buffers, self.shapes, self.segments)
+
+    def copy_from(self, ndarrays: NDArrays) -> None:
+        """Copy layers into the views of this layout, in place."""
+        if len(ndarrays) != len(self.shapes):
+            raise ValueError(f"Expected {len(self.shapes)} layers, got {len(ndarrays)}")
+        for view, layer in zip(self, ndarrays):
+            np.copyto(view, layer, casting="same_kind")
+
+    @property
+    def dtypes(self) -> List[np.dtype]:
+        """Dtype of each layer."""
+        return [self.buffers[segment].dtype for segment in self.segments]
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def __iter__(self) -> Iterator[NDArray]:
+        return (self.layer(index) for index in range(len(self.shapes)))
+
+    def layer(self, index: int) -> NDArray:
+        """Return a view of one layer, writes go to its buffer."""
+        start, end = self.offsets[index]
+        buffer = self.buffers[self.segments[index]]
+        return buffer[start:end].reshape(self.shapes[index])
+
+    def to_ndarrays(self) -> NDArrays:
+        """Return views of all layers, no data is copied."""
+        return list(self)
+
+    def to_parameters(self) -> Parameters:
+        """Serialize as a JSON header plus the raw buffers, one copy in total."""
+        header = {
+            "dtypes": [buffer.dtype.str for buffer in self.buffers],
+            "shapes": self.shapes,
+            "segments": self.segments,
+        }
+        return Parameters(
+            tensors=[json.dumps(header).encode()]
+            + [buffer.tobytes() for buffer in self.buffers],
+            tensor_type=FLAT_TENSOR_TYPE,
+        )
+
+    @classmethod
+    def from_parameters(
+        cls, parameters: Parameters, dtype: Optional[np.dtype] = None
+    ) -> "FlatParameters":
+        """Deserialize flat or per-layer `Parameters`.
+
+        Flat parameters share memory with `parameters` and are read-only,
+        unless a `dtype` different from the serialized ones is asked for.
+        """
+        if parameters.tensor_type == FLAT_TENSOR_TYPE:
+            header_bytes, *raws = parameters.tensors
+            header = json.loads(header_bytes)
+            buffers = [
+                np.frombuffer(raw, dtype=np.dtype(dtype_str))
+                for raw, dtype_str in zip(raws, header["dtypes"])
+            ]
+            if dtype is not None:
+                buffers = [
+                    buffer if buffer.dtype == dtype else buffer.astype(dtype)
+                    for buffer in buffers
+                ]
+            shapes = [tuple(shape) for shape in header["shapes"]]
+            return cls(buffers, shapes, header["segments"])
+        return cls.from_ndarrays(parameters_to_ndarrays(parameters), dtype=dtype)
+
+    def to_layer_parameters(self) -> Parameters:
+        """Serialize with one tensor per layer, as `ndarrays_to_parameters`."""
+        return ndarrays_to_parameters(self.to_ndarrays())
+
+
+class FlatCodec(Codec):
+    """Makes the flat tensor type usable with `ndarrays_to_parameters`."""
+
+    tensor_type = FLAT_TENSOR_TYPE
+
+    def encode(self, ndarrays: NDArrays) -> Parameters:
+        return FlatParameters.from_ndarrays(ndarrays).to_parameters()
+
+    def decode(self, parameters: Parameters) -> NDArrays:
+        self.check_tensor_type(parameters)
+        # Writable layers, as those of the per-layer format
+        return FlatParameters.from_parameters(parameters).copy().to_ndarrays()
+
+
+register_codec(FlatCodec())
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
@@ -0,0 +1,131 @@
+# Copyright 2023 Flower Labs GmbH. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""FlatParameters tests."""
+
+
+import numpy as np
+import pytest
+
+from .flat_parameters import FLAT_TENSOR_TYPE, FlatParameters
+from .parameter import ndarrays_to_parameters, parameters_to_ndarrays
+from .typing import NDArrays
+
+
+def _layers() -> NDArrays:
+    return [
+        np.arange(6, dtype=np.float32).reshape(2, 3),
+        np.array(1.5, dtype=np.float32),
+        np.ones((2, 1, 2), dtype=np.float32),
+    ]
+
+
+def test_layers_are_views_of_the_buffer() -> None:
+    """Test that writes to a layer land in the buffer."""
+    flat = FlatParameters.from_ndarrays(_layers())
+
+    flat.layer(0)[1, 2] = -1.0
+
+    assert len(flat.buffers) == 1
+    assert flat.buffers[0].shape == (11,)
+    assert flat.buffers[0][5] == -1.0
+    for layer in flat.to_ndarrays():
+        assert np.shares_memory(layer, flat.buffers[0])
+
+
+def test_from_ndarrays_round_trip() -> None:
+    """Test that layers keep their shapes and values."""
+    layers = _layers()
+
+    result = FlatParameters.from_ndarrays(layers).to_ndarrays()
+
+    assert len(result) == len(layers)
+    for actual, expected in zip(result, layers):
+        assert actual.shape == expected.shape
+        np.testing.assert_equal(actual, expected)
+
+
+def test_from_ndarrays_dtype() -> None:
+    """Test that layers are cast to the requested dtype."""
+    layers = [np.arange(3, dtype=np.int64), np.ones(2, dtype=np.float32)]
+
+    single = FlatParameters.from_ndarrays(layers, dtype=np.dtype(np.float32))
+
+    assert len(single.buffers) == 1
+    assert single.buffers[0].dtype == np.float32
+    np.testing.assert_equal(single.layer(0), [0.0, 1.0, 2.0])
+
+
+def test_from_ndarrays_mixed_dtypes() -> None:
+    """Test that every layer keeps its own dtype, one buffer per dtype."""
+    layers = [
+        np.ones(3, dtype=np.float32),
+        np.array([True, False]),
+        np.arange(4, dtype=np.int32).reshape(2, 2),
+        np.zeros(2, dtype=np.float32),
+    ]
+
+    flat = FlatParameters.from_ndarrays(layers)
+    result = FlatParameters.from_parameters(flat.to_parameters()).to_ndarrays()
+
+    assert [buffer.size for buffer in flat.buffers] == [5, 2, 4]
+    assert flat.dtypes == [layer.dtype for layer in layers]
+    for actual, expected in zip(result, layers):
+        assert actual.dtype == expected.dtype
+        np.testing.assert_equal(actual, expected)
+
+
+def test_buffer_size_mismatch() -> None:
+    """Test that a buffer not matching the shapes is rejected."""
+    with pytest.raises(ValueError):
+        FlatParameters([np.zeros(5)], [(2, 3)])
+
+
+def test_parameters_round_trip() -> None:
+    """Test (de-)serialization of the flat format."""
+    flat = FlatParameters.from_ndarrays(_layers())
+
+    parameters = flat.to_parameters()
+    result = FlatParameters.from_parameters(parameters)
+
+    assert parameters.tensor_type == FLAT_TENSOR_TYPE
+    assert len(parameters.tensors) == 2
+    assert result.shapes == flat.shapes
+    np.testing.assert_equal(result.buffers, flat.buffers)
+    # Shares memory with the serialized bytes
+    assert not result.buffers[0].flags.writeable
+
+
+def test_from_per_layer_parameters() -> None:
+    """Test that per-layer parameters are read into one buffer."""
+    layers = _layers()
+
+    result = FlatParameters.from_parameters(ndarrays_to_parameters(layers))
+
+    assert result.to_layer_parameters() == ndarrays_to_parameters(layers)
+    for actual, expected in zip(result, layers):
+        np.testing.assert_equal(actual, expected)
+
+
+def test_parameters_to_ndarrays_flat() -> None:
+    """Test that the flat format is understood by parameters_to_ndarrays."""
+    layers = _layers()
+
+    parameters = FlatParameters.from_ndarrays(layers).to_parameters()
+
+    result = parameters_to_ndarrays(parameters)
+
+    for actual, expected in zip(result, layers):
+        assert actual.flags.writeable
+        np.testing.assert_equal(actual, expected)
@@ -20,17 +20,47 @@ from typing import cast
 
 import numpy as np
 
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+from .codec import CODECS, get_codec
+from .codec import RAW_TENSOR_TYPE as RAW_TENSOR_TYPE
+from .codec import ndarray_to_raw_bytes as ndarray_to_raw_bytes
+from .codec import raw_bytes_to_ndarray as raw_bytes_to_ndarray
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 from .typing import NDArray, NDArrays, Parameters
 
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+# Tensor type of `Parameters` serialized with `ndarray_to_bytes`, the default
+NDARRAY_TENSOR_TYPE = "numpy.ndarray"
+
 
-def ndarrays_to_parameters(ndarrays: NDArrays) -> Parameters:
+def ndarrays_to_parameters(
+    ndarrays: NDArrays, tensor_type: str = NDARRAY_TENSOR_TYPE
+) -> Parameters:
     """Convert NumPy ndarrays to parameters object."""
+    if tensor_type != NDARRAY_TENSOR_TYPE:
+        return get_codec(tensor_type).encode(ndarrays)
     tensors = [ndarray_to_bytes(ndarray) for ndarray in ndarrays]
-    return Parameters(tensors=tensors, tensor_type="numpy.ndarray")
+    return Parameters(tensors=tensors, tensor_type=tensor_type)
+
+
+def encode_parameters(parameters: Parameters, tensor_type: str) -> Parameters:
+    """Re-encode `parameters` as `tensor_type`, unless they already are."""
+    if parameters.tensor_type == tensor_type:
+        return parameters
+    return ndarrays_to_parameters(parameters_to_ndarrays(parameters), tensor_type)
+
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
 
 def parameters_to_ndarrays(parameters: Parameters) -> NDArrays:
     """Convert parameters object to NumPy ndarrays."""
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    # Registered tensor types, such as "numpy.raw", decode to writable arrays
+    if parameters.tensor_type in CODECS:
+        return CODECS[parameters.tensor_type].decode(parameters)
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     return [bytes_to_ndarray(tensor) for tensor in parameters.tensors]
 
 
@@ -21,7 +21,16 @@ tests.
 import numpy as np
 import pytest
 
-from .parameter import bytes_to_ndarray, ndarray_to_bytes
+from .parameter import (
+    NDARRAY_TENSOR_TYPE,
+    RAW_TENSOR_TYPE,
+    bytes_to_ndarray,
+    ndarray_to_bytes,
+    ndarray_to_raw_bytes,
+    ndarrays_to_parameters,
+    parameters_to_ndarrays,
+    raw_bytes_to_ndarray,
+)
 
 
 def test_serialisation_deserialisation() -> None:
@@ -37,3 +46,62 @@ def test_serialisation_deserialisation() -> None:
     # Test false positive
     with pytest.raises(AssertionError, match="Arrays are not equal"):
         np.testing.assert_equal(arr_deserialized, np.ones((3, 2)))  # type: ignore
+
+
+def test_raw_serialisation_deserialisation() -> None:
+    """Test if the np.ndarray is identical after raw (de-)serialization."""
+    arrays = [
+        np.array([[1, 2], [3, 4], [5, 6]]),
+        np.array(1.5, dtype=np.float32),
+        np.zeros((0, 3), dtype=np.float16),
+        np.arange(10.0)[::2],
+        np.arange(6, dtype=">i4").reshape(2, 3),
+    ]
+
+    for arr in arrays:
+        arr_deserialized = raw_bytes_to_ndarray(ndarray_to_raw_bytes(arr))
+
+        assert arr_deserialized.shape == arr.shape
+        assert arr_deserialized.dtype.byteorder in ("<", "=", "|")
+        np.testing.assert_equal(arr_deserialized, arr)  # type: ignore
+
+
+def test_raw_deserialisation_is_zero_copy() -> None:
+    """Test that raw deserialization returns an aligned view of the bytes."""
+    tensor = ndarray_to_raw_bytes(np.ones((4, 4), dtype=np.float64))
+
+    arr_deserialized = raw_bytes_to_ndarray(tensor)
+
+    assert np.shares_memory(arr_deserialized, np.frombuffer(tensor, dtype=np.uint8))
+    assert arr_deserialized.flags.aligned
+    assert not arr_deserialized.flags.writeable
+
+
+def test_raw_serialisation_rejects_object_arrays() -> None:
+    """Test that object arrays are not serialized raw."""
+    with pytest.raises(ValueError):
+        ndarray_to_raw_bytes(np.array([None, 1], dtype=object))
+
+
+def test_parameters_tensor_types() -> None:
+    """Test that both tensor types convert back to the same ndarrays."""
+    ndarrays = [np.array([[1.0, 2.0]]), np.arange(3)]
+
+    for tensor_type in (RAW_TENSOR_TYPE, NDARRAY_TENSOR_TYPE):
+        parameters = ndarrays_to_parameters(ndarrays, tensor_type=tensor_type)
+        result = parameters_to_ndarrays(parameters)
+
+        assert parameters.tensor_type == tensor_type
+        for actual, expected in zip(result, ndarrays):
+            assert actual.flags.writeable
+            np.testing.assert_equal(actual, expected)  # type: ignore
+
+
+def test_parameters_default_tensor_type() -> None:
+    """Test that parameters are .npy tensors unless asked otherwise."""
+    arr = np.array([[1, 2], [3, 4]])
+
+    parameters = ndarrays_to_parameters([arr])
+
+    assert parameters.tensor_type == NDARRAY_TENSOR_TYPE
+    np.testing.assert_equal(bytes_to_ndarray(parameters.tensors[0]), arr)
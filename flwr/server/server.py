@@ -17,8 +17,8 @@
 
 import concurrent.futures
 import timeit
-from logging import DEBUG, INFO
-from typing import Dict, List, Optional, Tuple, Union
+from logging import DEBUG, INFO, WARNING
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from flwr.common import (
     Code,
@@ -67,6 +67,31 @@ class Server:
         )
         self.strategy: Strategy = strategy if strategy is not None else FedAvg()
         self.max_workers: Optional[int] = None
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        self.event_listener: Optional[Callable[[str, int], None]] = None
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    def set_event_listener(
+        self, event_listener: Optional[Callable[[str, int], None]]
+    ) -> None:
+        """Set a callback that is called with (event, server_round) when a round
+        starts or ends.
+
+        Events are "round_start", "round_end", "evaluate_start" and
+        "evaluate_end". The final evaluation is reported as round -1.
+        """
+        self.event_listener = event_listener
+
+    def _publish_event(self, event: str, server_round: int) -> None:
+        if self.event_listener is None:
+            return
+        try:
+            self.event_listener(event, server_round)
+        except Exception as ex:  # pylint: disable=broad-except
+            log(WARNING, "Event listener failed on %s %s: %s", event, server_round, ex)
+
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
     def set_max_workers(self, max_workers: Optional[int]) -> None:
         """Set the max_workers used by ThreadPoolExecutor."""
@@ -121,6 +146,11 @@ class Server:
                 history.add_metrics_distributed_fit(
                     server_round=current_round, metrics=fit_metrics
                 )
+                #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+                # The clients' tensors are not needed past this point, free them
+                # before evaluating instead of at the start of the next round
+                del res_fit, results, failures
+                #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
             # Evaluate model using strategy implementation
             res_cen = self.strategy.evaluate(current_round, parameters=self.parameters)
@@ -183,6 +213,21 @@ class Server:
         Tuple[Optional[float], Dict[str, Scalar], EvaluateResultsAndFailures]
     ]:
         """Validate current global model on a number of clients."""
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        self._publish_event("evaluate_start", server_round)
+        try:
+            return self._evaluate_round(server_round=server_round, timeout=timeout)
+        finally:
+            self._publish_event("evaluate_end", server_round)
+
+    def _evaluate_round(
+        self,
+        server_round: int,
+        timeout: Optional[float],
+    ) -> Optional[
+        Tuple[Optional[float], Dict[str, Scalar], EvaluateResultsAndFailures]
+    ]:
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
         # Get clients and their respective instructions from strategy
         client_instructions = self.strategy.configure_evaluate(
             server_round=server_round,
@@ -231,6 +276,21 @@ class Server:
         Tuple[Optional[Parameters], Dict[str, Scalar], FitResultsAndFailures]
     ]:
         """Perform a single round of federated averaging."""
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        self._publish_event("round_start", server_round)
+        try:
+            return self._fit_round(server_round=server_round, timeout=timeout)
+        finally:
+            self._publish_event("round_end", server_round)
+
+    def _fit_round(
+        self,
+        server_round: int,
+        timeout: Optional[float],
+    ) -> Optional[
+        Tuple[Optional[Parameters], Dict[str, Scalar], FitResultsAndFailures]
+    ]:
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
         # Get clients and their respective instructions from strategy
         client_instructions = self.strategy.configure_fit(
             server_round=server_round,
@@ -249,11 +309,22 @@ class Server:
             self._client_manager.num_available(),
         )
 
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        # Strategies that support it aggregate every result as soon as it arrives,
+        # while the slower clients are still training
+        state = self.strategy.begin_aggregate(server_round)
+        on_result: Optional[Callable[[Tuple[ClientProxy, FitRes]], None]] = None
+        if state is not None:
+
+            def on_result(result: Tuple[ClientProxy, FitRes]) -> None:
+                self.strategy.accumulate(server_round, state, result)
+
         # Collect `fit` results from all clients participating in this round
         results, failures = fit_clients(
             client_instructions=client_instructions,
             max_workers=self.max_workers,
             timeout=timeout,
+            on_result=on_result,
         )
         log(
             DEBUG,
@@ -264,10 +335,16 @@ class Server:
         )
 
         # Aggregate training results
-        aggregated_result: Tuple[
-            Optional[Parameters],
-            Dict[str, Scalar],
-        ] = self.strategy.aggregate_fit(server_round, results, failures)
+        aggregated_result: Tuple[Optional[Parameters], Dict[str, Scalar]]
+        if state is not None:
+            aggregated_result = self.strategy.finalize(
+                server_round, state, results, failures
+            )
+        else:
+            aggregated_result = self.strategy.aggregate_fit(
+                server_round, results, failures
+            )
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
         parameters_aggregated, metrics_aggregated = aggregated_result
         return parameters_aggregated, metrics_aggregated, (results, failures)
@@ -349,25 +426,30 @@ def fit_clients(
     client_instructions: List[Tuple[ClientProxy, FitIns]],
     max_workers: Optional[int],
     timeout: Optional[float],
+    on_result: Optional[Callable[[Tuple[ClientProxy, FitRes]], None]] = None,
 ) -> FitResultsAndFailures:
-    """Refine parameters concurrently on all selected clients."""
+    """Refine parameters concurrently on all selected clients.
+
+    `on_result` is called with every successful result in the order they
+    arrive, while the remaining clients are still training.
+    """
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    results: List[Tuple[ClientProxy, FitRes]] = []
+    failures: List[Union[Tuple[ClientProxy, FitRes], BaseException]] = []
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         submitted_fs = {
             executor.submit(fit_client, client_proxy, ins, timeout)
             for client_proxy, ins in client_instructions
         }
-        finished_fs, _ = concurrent.futures.wait(
-            fs=submitted_fs,
-            timeout=None,  # Handled in the respective communication stack
-        )
-
-    # Gather results
-    results: List[Tuple[ClientProxy, FitRes]] = []
-    failures: List[Union[Tuple[ClientProxy, FitRes], BaseException]] = []
-    for future in finished_fs:
-        _handle_finished_future_after_fit(
-            future=future, results=results, failures=failures
-        )
+        # Timeouts are handled in the respective communication stack
+        for future in concurrent.futures.as_completed(submitted_fs):
+            num_results = len(results)
+            _handle_finished_future_after_fit(
+                future=future, results=results, failures=failures
+            )
+            if on_result is not None and len(results) > num_results:
+                on_result(results[-1])
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     return results, failures
 
 
@@ -15,7 +15,7 @@
 """Flower server tests."""
 
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -32,10 +32,13 @@ from flwr.common import (
     GetPropertiesRes,
     Parameters,
     ReconnectIns,
+    Scalar,
     Status,
     ndarray_to_bytes,
+    parameters_to_ndarrays,
 )
 from flwr.server.client_manager import SimpleClientManager
+from flwr.server.strategy import FedAvg, Strategy
 
 from .client_proxy import ClientProxy
 from .server import Server, evaluate_clients, fit_clients
@@ -169,3 +172,123 @@ def test_set_max_workers() -> None:
 
     # Assert
     assert server.max_workers == 42
+
+
+def test_round_events_published() -> None:
+    """Test that fit and evaluate rounds are reported to the event listener."""
+    # Prepare
+    client_manager = SimpleClientManager()
+    client_manager.register(SuccessClient("1"))
+    strategy = FedAvg(
+        min_fit_clients=1, min_evaluate_clients=1, min_available_clients=1
+    )
+    server = Server(client_manager=client_manager, strategy=strategy)
+    events = []
+    server.set_event_listener(lambda event, rnd: events.append((event, rnd)))
+
+    # Execute
+    server.fit_round(server_round=2, timeout=None)
+    server.evaluate_round(server_round=-1, timeout=None)
+
+    # Assert
+    assert events == [
+        ("round_start", 2),
+        ("round_end", 2),
+        ("evaluate_start", -1),
+        ("evaluate_end", -1),
+    ]
+
+
+def test_fit_clients_on_result() -> None:
+    """Test that every successful result is reported as it arrives."""
+    # Prepare
+    clients: List[ClientProxy] = [
+        FailingClient("0"),
+        SuccessClient("1"),
+        SuccessClient("2"),
+    ]
+    arr_serialized = ndarray_to_bytes(np.array([[1, 2], [3, 4], [5, 6]]))
+    ins: FitIns = FitIns(Parameters(tensors=[arr_serialized], tensor_type=""), {})
+    client_instructions = [(c, ins) for c in clients]
+    reported = []
+
+    # Execute
+    results, failures = fit_clients(
+        client_instructions, None, None, on_result=reported.append
+    )
+
+    # Assert
+    assert len(failures) == 1
+    assert sorted(client.cid for client, _ in reported) == ["1", "2"]
+    assert reported == results
+
+
+def test_fit_round_aggregates_incrementally() -> None:
+    """Test that FedAvg results are accumulated and returned intact."""
+    # Prepare
+    client_manager = SimpleClientManager()
+    client_manager.register(SuccessClient("1"))
+    client_manager.register(SuccessClient("2"))
+    strategy = FedAvg(min_fit_clients=2, min_available_clients=2)
+    server = Server(client_manager=client_manager, strategy=strategy)
+    server.parameters = Parameters(tensors=[], tensor_type="numpy.ndarray")
+
+    # Execute
+    res_fit = server.fit_round(server_round=1, timeout=None)
+
+    # Assert
+    assert res_fit is not None
+    parameters_aggregated, _, (results, failures) = res_fit
+    assert parameters_aggregated is not None
+    np.testing.assert_equal(
+        parameters_to_ndarrays(parameters_aggregated),
+        [np.array([[1, 2], [3, 4], [5, 6]])],
+    )
+    assert len(results) == 2
+    assert not failures
+    assert all(fit_res.parameters.tensors for _, fit_res in results)
+
+
+def test_fit_round_default_accumulate_and_finalize() -> None:
+    """Test that the Strategy defaults collect results for aggregate_fit."""
+
+    # Prepare
+    class ListStrategy(FedAvg):
+        """Aggregates through the default accumulate and finalize."""
+
+        def begin_aggregate(self, server_round: int) -> List[Any]:
+            return []
+
+        def accumulate(
+            self, server_round: int, state: Any, result: Tuple[ClientProxy, FitRes]
+        ) -> None:
+            Strategy.accumulate(self, server_round, state, result)
+
+        def finalize(
+            self,
+            server_round: int,
+            state: Any,
+            results: List[Tuple[ClientProxy, FitRes]],
+            failures: List[Union[Tuple[ClientProxy, FitRes], BaseException]],
+        ) -> Tuple[Optional[Parameters], Dict[str, Scalar]]:
+            assert len(state) == len(results)
+            return Strategy.finalize(self, server_round, state, results, failures)
+
+    client_manager = SimpleClientManager()
+    client_manager.register(SuccessClient("1"))
+    client_manager.register(SuccessClient("2"))
+    strategy = ListStrategy(min_fit_clients=2, min_available_clients=2)
+    server = Server(client_manager=client_manager, strategy=strategy)
+    server.parameters = Parameters(tensors=[], tensor_type="numpy.ndarray")
+
+    # Execute
+    res_fit = server.fit_round(server_round=1, timeout=None)
+
+    # Assert
+    assert res_fit is not None
+    parameters_aggregated, _, _ = res_fit
+    assert parameters_aggregated is not None
+    np.testing.assert_equal(
+        parameters_to_ndarrays(parameters_aggregated),
+        [np.array([[1, 2], [3, 4], [5, 6]])],
+    )
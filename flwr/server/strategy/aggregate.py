@@ -15,30 +15,79 @@
 """Aggregation functions for strategy implementations."""
 
 
-from functools import reduce
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
 import numpy as np
 
 from flwr.common import NDArray, NDArrays
 
 
-def aggregate(results: List[Tuple[NDArrays, int]]) -> NDArrays:
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+def _average_dtype(layer: NDArray) -> np.dtype:
+    dtype = np.asarray(layer).dtype
+    return dtype if np.issubdtype(dtype, np.floating) else np.dtype(np.float64)
+
+
+class StreamingAggregate:
+    """Weighted average that is accumulated in place one result at a time.
+
+    Memory stays at one accumulator per layer plus one scratch buffer the size
+    of the largest layer, however many results are added.
+    """
+
+    def __init__(self) -> None:
+        self.accumulators: NDArrays = []
+        self.scratch: Dict[np.dtype, NDArray] = {}
+        self.num_examples_total = 0
+
+    def _scratch(self, like: NDArray) -> NDArray:
+        buffer = self.scratch.get(like.dtype)
+        if buffer is None or buffer.size < like.size:
+            buffer = np.empty(like.size, dtype=like.dtype)
+            self.scratch[like.dtype] = buffer
+        return buffer[: like.size].reshape(like.shape)
+
+    def add(self, weights: NDArrays, num_examples: int) -> None:
+        """Add the weights of one client, weighted by its number of examples."""
+        if not self.accumulators:
+            # Same dtypes as `layer * num_examples / num_examples_total`
+            self.accumulators = [
+                np.multiply(
+                    layer,
+                    num_examples,
+                    out=np.empty(np.shape(layer), dtype=_average_dtype(layer)),
+                )
+                for layer in weights
+            ]
+        else:
+            if len(weights) != len(self.accumulators):
+                raise ValueError("Results have a different number of layers.")
+            for accumulator, layer in zip(self.accumulators, weights):
+                scaled = self._scratch(accumulator)
+                np.multiply(layer, num_examples, out=scaled)
+                np.add(accumulator, scaled, out=accumulator)
+        self.num_examples_total += num_examples
+
+    def result(self) -> NDArrays:
+        """Return the weighted average, computed in the accumulators."""
+        for accumulator in self.accumulators:
+            np.divide(accumulator, self.num_examples_total, out=accumulator)
+        weights_prime = self.accumulators
+        self.accumulators = []
+        self.scratch = {}
+        self.num_examples_total = 0
+        return weights_prime
+
+
+def aggregate(results: Iterable[Tuple[NDArrays, int]]) -> NDArrays:
     """Compute weighted average."""
-    # Calculate the total number of examples used during training
-    num_examples_total = sum([num_examples for _, num_examples in results])
+    streaming = StreamingAggregate()
+    for weights, num_examples in results:
+        streaming.add(weights, num_examples)
+    return streaming.result()
 
-    # Create a list of weights, each multiplied by the related number of examples
-    weighted_weights = [
-        [layer * num_examples for layer in weights] for weights, num_examples in results
-    ]
 
-    # Compute average weights of each layer
-    weights_prime: NDArrays = [
-        reduce(np.add, layer_updates) / num_examples_total
-        for layer_updates in zip(*weighted_weights)
-    ]
-    return weights_prime
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
 
 def aggregate_median(results: List[Tuple[NDArrays, int]]) -> NDArrays:
@@ -122,15 +171,14 @@ def _compute_distances(weights: List[NDArrays]) -> NDArray:
     Input: weights - list of weights vectors
     Output: distances - matrix distance_matrix of squared distances between the vectors
     """
-    flat_w = np.array(
-        [np.concatenate(p, axis=None).ravel() for p in weights]  # type: ignore
-    )
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    flat_w = np.array([np.concatenate(p, axis=None) for p in weights])
     distance_matrix = np.zeros((len(weights), len(weights)))
     for i, _ in enumerate(flat_w):
-        for j, _ in enumerate(flat_w):
-            delta = flat_w[i] - flat_w[j]
-            norm = np.linalg.norm(delta)  # type: ignore
-            distance_matrix[i, j] = norm**2
+        # Distances from client i to every client in one vectorized pass
+        delta = flat_w - flat_w[i]
+        distance_matrix[i] = np.einsum("ij,ij->i", delta, delta)
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     return distance_matrix
 
 
@@ -19,7 +19,7 @@ from typing import List, Tuple
 
 import numpy as np
 
-from .aggregate import aggregate, weighted_loss_avg
+from .aggregate import StreamingAggregate, aggregate, weighted_loss_avg
 
 
 def test_aggregate() -> None:
@@ -64,3 +64,44 @@ def test_weighted_loss_avg_multiple_values() -> None:
 
     # Assert
     assert expected == actual
+
+
+def test_aggregate_float32_stays_float32() -> None:
+    """Test that the streaming aggregate matches the weighted average."""
+    # Prepare
+    rng = np.random.default_rng(0)
+    weights = [
+        [rng.random((3, 4), dtype=np.float32), rng.random(5, dtype=np.float32)]
+        for _ in range(3)
+    ]
+    num_examples = [1, 2, 3]
+    expected = [
+        sum(w[layer] * n for w, n in zip(weights, num_examples)) / 6
+        for layer in range(2)
+    ]
+
+    # Execute
+    actual = aggregate(list(zip(weights, num_examples)))
+
+    # Assert
+    assert [layer.dtype for layer in actual] == [np.float32, np.float32]
+    for expected_layer, actual_layer in zip(expected, actual):
+        np.testing.assert_allclose(expected_layer, actual_layer, rtol=1e-6)
+
+
+def test_streaming_aggregate_does_not_modify_inputs() -> None:
+    """Test that results are accumulated without writing into them."""
+    # Prepare
+    weights0 = [np.array([1.0, 2.0]), np.array([[3.0]])]
+    weights1 = [np.array([3.0, 4.0]), np.array([[5.0]])]
+    streaming = StreamingAggregate()
+
+    # Execute
+    streaming.add(weights0, 1)
+    streaming.add(weights1, 3)
+    actual = streaming.result()
+
+    # Assert
+    np.testing.assert_equal(actual, [np.array([2.5, 3.5]), np.array([[4.5]])])
+    np.testing.assert_equal(weights0, [np.array([1.0, 2.0]), np.array([[3.0]])])
+    np.testing.assert_equal(weights1, [np.array([3.0, 4.0]), np.array([[5.0]])])
@@ -33,11 +33,18 @@ from flwr.common import (
     ndarrays_to_parameters,
     parameters_to_ndarrays,
 )
+from flwr.common.flat_parameters import FlatParameters
 from flwr.server.client_proxy import ClientProxy
 
 from .fedopt import FedOpt
 
 
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+def _floating_dtype(dtype: np.dtype) -> np.dtype:
+    return dtype if np.issubdtype(dtype, np.floating) else np.dtype(np.float64)
+
+
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 class FedAdam(FedOpt):
     """FedAdam - Adaptive Federated Optimization using Adam.
 
@@ -131,6 +138,13 @@ class FedAdam(FedOpt):
             beta_2=beta_2,
             tau=tau,
         )
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        # Weights and moments stay flat between rounds, `current_weights`, `m_t`
+        # and `v_t` are views of them
+        self.flat_weights: Optional[FlatParameters] = None
+        self.flat_m_t: Optional[FlatParameters] = None
+        self.flat_v_t: Optional[FlatParameters] = None
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
     def __repr__(self) -> str:
         """Compute a string representation of the strategy."""
@@ -152,32 +166,47 @@ class FedAdam(FedOpt):
 
         fedavg_weights_aggregate = parameters_to_ndarrays(fedavg_parameters_aggregated)
 
-        # Adam
-        delta_t: NDArrays = [
-            x - y for x, y in zip(fedavg_weights_aggregate, self.current_weights)
-        ]
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        # Adam, as vectorized ops over the flat buffers of the whole model
+        current = self.flat_weights
+        if current is None:
+            current = FlatParameters.from_ndarrays(self.current_weights)
+        # Update and moments in floating point, whatever the dtype of a layer
+        delta_t = current.empty_like(
+            [_floating_dtype(buffer.dtype) for buffer in current.buffers]
+        )
+        delta_t.copy_from(fedavg_weights_aggregate)
+        for delta, weights in zip(delta_t.buffers, current.buffers):
+            np.subtract(delta, weights, out=delta)
 
         # m_t
-        if not self.m_t:
-            self.m_t = [np.zeros_like(x) for x in delta_t]
-        self.m_t = [
-            np.multiply(self.beta_1, x) + (1 - self.beta_1) * y
-            for x, y in zip(self.m_t, delta_t)
-        ]
+        if self.flat_m_t is None:
+            self.flat_m_t = delta_t.zeros_like()
+        m_t = self.flat_m_t
+        for moment, delta in zip(m_t.buffers, delta_t.buffers):
+            moment *= self.beta_1
+            moment += (1 - self.beta_1) * delta
+        self.m_t = m_t.to_ndarrays()
 
         # v_t
-        if not self.v_t:
-            self.v_t = [np.zeros_like(x) for x in delta_t]
-        self.v_t = [
-            self.beta_2 * x + (1 - self.beta_2) * np.multiply(y, y)
-            for x, y in zip(self.v_t, delta_t)
-        ]
-
-        new_weights = [
-            x + self.eta * y / (np.sqrt(z) + self.tau)
-            for x, y, z in zip(self.current_weights, self.m_t, self.v_t)
-        ]
-
-        self.current_weights = new_weights
+        if self.flat_v_t is None:
+            self.flat_v_t = delta_t.zeros_like()
+        v_t = self.flat_v_t
+        for moment, delta in zip(v_t.buffers, delta_t.buffers):
+            moment *= self.beta_2
+            moment += (1 - self.beta_2) * np.square(delta)
+        self.v_t = v_t.to_ndarrays()
+
+        for weights, first, second in zip(current.buffers, m_t.buffers, v_t.buffers):
+            step = self.eta * first / (np.sqrt(second) + self.tau)
+            if np.issubdtype(weights.dtype, np.floating):
+                weights += step
+            else:
+                # Layers keep their dtype, integer ones are rounded
+                np.copyto(weights, np.rint(weights + step), casting="unsafe")
+        self.flat_weights = current
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+
+        self.current_weights = current.to_ndarrays()
 
         return ndarrays_to_parameters(self.current_weights), metrics_aggregated
@@ -33,11 +33,20 @@ from flwr.common import (
     ndarrays_to_parameters,
     parameters_to_ndarrays,
 )
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+from flwr.common.codec import (
+    TENSOR_TYPE_CONFIG_KEY,
+    LossyCodec,
+    get_codec,
+    sendable_tensor_type,
+)
+from flwr.common.parameter import encode_parameters
+#! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 from flwr.common.logger import log
 from flwr.server.client_manager import ClientManager
 from flwr.server.client_proxy import ClientProxy
 
-from .aggregate import aggregate, weighted_loss_avg
+from .aggregate import StreamingAggregate, aggregate, weighted_loss_avg
 from .strategy import Strategy
 
 WARNING_MIN_AVAILABLE_CLIENTS_TOO_LOW = """
@@ -72,6 +81,7 @@ class FedAvg(Strategy):
         initial_parameters: Optional[Parameters] = None,
         fit_metrics_aggregation_fn: Optional[MetricsAggregationFn] = None,
         evaluate_metrics_aggregation_fn: Optional[MetricsAggregationFn] = None,
+        tensor_type: Optional[str] = None,
     ) -> None:
         """Federated Averaging strategy.
 
@@ -107,6 +117,11 @@ class FedAvg(Strategy):
             Metrics aggregation function, optional.
         evaluate_metrics_aggregation_fn : Optional[MetricsAggregationFn]
             Metrics aggregation function, optional.
+        tensor_type : Optional[str]
+            Tensor type the parameters are sent in, and that clients are asked
+            to reply with, one of those in `flwr.common.codec.CODECS`. Lossy
+            tensor types are only used for the replies. Defaults to None,
+            which leaves the parameters as they are.
         """
         super().__init__()
 
@@ -128,6 +143,12 @@ class FedAvg(Strategy):
         self.initial_parameters = initial_parameters
         self.fit_metrics_aggregation_fn = fit_metrics_aggregation_fn
         self.evaluate_metrics_aggregation_fn = evaluate_metrics_aggregation_fn
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        if tensor_type is not None:
+            # Unknown tensor types fail early, zlib replaces missing compressors
+            tensor_type = sendable_tensor_type(tensor_type)
+        self.tensor_type = tensor_type
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
     def __repr__(self) -> str:
         """Compute a string representation of the strategy."""
@@ -166,6 +187,23 @@ class FedAvg(Strategy):
         loss, metrics = eval_res
         return loss, metrics
 
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    def _encode(
+        self, parameters: Parameters, config: Dict[str, Scalar]
+    ) -> Tuple[Parameters, Dict[str, Scalar]]:
+        """Ask clients to reply in `tensor_type` and encode the parameters sent.
+
+        Lossy tensor types only apply to the replies, the global model is sent
+        as it is so that it does not lose precision again every round.
+        """
+        if self.tensor_type is None:
+            return parameters, config
+        config = {**config, TENSOR_TYPE_CONFIG_KEY: self.tensor_type}
+        if isinstance(get_codec(self.tensor_type), LossyCodec):
+            return parameters, config
+        return encode_parameters(parameters, self.tensor_type), config
+
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
     def configure_fit(
         self, server_round: int, parameters: Parameters, client_manager: ClientManager
     ) -> List[Tuple[ClientProxy, FitIns]]:
@@ -174,6 +212,9 @@ class FedAvg(Strategy):
         if self.on_fit_config_fn is not None:
             # Custom fit config function provided
             config = self.on_fit_config_fn(server_round)
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        parameters, config = self._encode(parameters, config)
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
         fit_ins = FitIns(parameters, config)
 
         # Sample clients
@@ -200,6 +241,9 @@ class FedAvg(Strategy):
         if self.on_evaluate_config_fn is not None:
             # Custom evaluation config function provided
             config = self.on_evaluate_config_fn(server_round)
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+        parameters, config = self._encode(parameters, config)
+        #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
         evaluate_ins = EvaluateIns(parameters, config)
 
         # Sample clients
@@ -233,6 +277,12 @@ class FedAvg(Strategy):
         ]
         parameters_aggregated = ndarrays_to_parameters(aggregate(weights_results))
 
+        return parameters_aggregated, self._aggregate_fit_metrics(server_round, results)
+
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    def _aggregate_fit_metrics(
+        self, server_round: int, results: List[Tuple[ClientProxy, FitRes]]
+    ) -> Dict[str, Scalar]:
         # Aggregate custom metrics if aggregation fn was provided
         metrics_aggregated = {}
         if self.fit_metrics_aggregation_fn:
@@ -240,8 +290,43 @@ class FedAvg(Strategy):
             metrics_aggregated = self.fit_metrics_aggregation_fn(fit_metrics)
         elif server_round == 1:  # Only log this warning once
             log(WARNING, "No fit_metrics_aggregation_fn provided")
+        return metrics_aggregated
+
+    def begin_aggregate(self, server_round: int) -> Optional[StreamingAggregate]:
+        """Average the training results in place as they arrive."""
+        # Subclasses with their own aggregate_fit are aggregated the usual way
+        if type(self).aggregate_fit is not FedAvg.aggregate_fit:
+            return None
+        return StreamingAggregate()
+
+    def accumulate(
+        self,
+        server_round: int,
+        state: StreamingAggregate,
+        result: Tuple[ClientProxy, FitRes],
+    ) -> None:
+        """Add the parameters of one client to the running weighted average."""
+        _, fit_res = result
+        state.add(parameters_to_ndarrays(fit_res.parameters), fit_res.num_examples)
+
+    def finalize(
+        self,
+        server_round: int,
+        state: StreamingAggregate,
+        results: List[Tuple[ClientProxy, FitRes]],
+        failures: List[Union[Tuple[ClientProxy, FitRes], BaseException]],
+    ) -> Tuple[Optional[Parameters], Dict[str, Scalar]]:
+        """Finish the weighted average, same outcome as `aggregate_fit`."""
+        if not results:
+            return None, {}
+        # Do not aggregate if there are failures and failures are not accepted
+        if not self.accept_failures and failures:
+            return None, {}
+
+        parameters_aggregated = ndarrays_to_parameters(state.result())
+        return parameters_aggregated, self._aggregate_fit_metrics(server_round, results)
 
-        return parameters_aggregated, metrics_aggregated
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
 
     def aggregate_evaluate(
         self,
@@ -15,7 +15,27 @@
 """FedAvg tests."""
 
 
+from typing import List, Tuple
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from flwr.common import (
+    Code,
+    FitRes,
+    Status,
+    ndarrays_to_parameters,
+    parameters_to_ndarrays,
+)
+from flwr.common.codec import (
+    TENSOR_TYPE_CONFIG_KEY,
+    UINT8_TENSOR_TYPE,
+    ZLIB_TENSOR_TYPE,
+)
+from flwr.server.client_proxy import ClientProxy
+
 from .fedavg import FedAvg
+from .fedavgm import FedAvgM
 
 
 def test_fedavg_num_fit_clients_20_available() -> None:
@@ -120,3 +140,96 @@ def test_fedavg_num_evaluation_clients_minimum() -> None:
 
     # Assert
     assert expected == actual
+
+
+def test_fedavg_finalize_matches_aggregate_fit() -> None:
+    """Test that incremental aggregation gives the same parameters."""
+    # Prepare
+    strategy = FedAvg()
+    results: List[Tuple[ClientProxy, FitRes]] = [
+        (
+            MagicMock(),
+            FitRes(
+                status=Status(code=Code.OK, message="Success"),
+                parameters=ndarrays_to_parameters(
+                    [np.full((2, 3), value, dtype=np.float32)]
+                ),
+                num_examples=num_examples,
+                metrics={},
+            ),
+        )
+        for value, num_examples in ((1.0, 1), (2.0, 3))
+    ]
+    expected, _ = strategy.aggregate_fit(1, results, [])
+
+    # Execute
+    state = strategy.begin_aggregate(1)
+    for result in results:
+        strategy.accumulate(1, state, result)
+    actual, _ = strategy.finalize(1, state, results, [])
+
+    # Assert
+    assert expected is not None and actual is not None
+    np.testing.assert_equal(
+        parameters_to_ndarrays(actual), parameters_to_ndarrays(expected)
+    )
+    np.testing.assert_equal(
+        parameters_to_ndarrays(actual), [np.full((2, 3), 1.75, dtype=np.float32)]
+    )
+
+
+def test_fedavg_subclass_with_own_aggregate_fit_is_not_incremental() -> None:
+    """Test that strategies overriding aggregate_fit keep using it."""
+    # Prepare
+    strategy = FedAvgM()
+
+    # Execute
+    state = strategy.begin_aggregate(1)
+
+    # Assert
+    assert state is None
+
+
+def test_fedavg_configure_fit_tensor_type() -> None:
+    """Test that parameters are encoded and clients asked to reply alike."""
+    # Prepare
+    strategy = FedAvg(
+        on_fit_config_fn=lambda server_round: {"epochs": 1},
+        tensor_type=ZLIB_TENSOR_TYPE,
+    )
+    weights = [np.arange(6, dtype=np.float32).reshape(2, 3)]
+    client_manager = MagicMock()
+    client_manager.num_available.return_value = 2
+    client_manager.sample.return_value = [MagicMock(), MagicMock()]
+
+    # Execute
+    pairs = strategy.configure_fit(1, ndarrays_to_parameters(weights), client_manager)
+
+    # Assert
+    for _, fit_ins in pairs:
+        assert fit_ins.parameters.tensor_type == ZLIB_TENSOR_TYPE
+        assert fit_ins.config == {
+            "epochs": 1,
+            TENSOR_TYPE_CONFIG_KEY: ZLIB_TENSOR_TYPE,
+        }
+        np.testing.assert_equal(
+            parameters_to_ndarrays(fit_ins.parameters), weights
+        )
+
+
+def test_fedavg_lossy_tensor_type_only_for_replies() -> None:
+    """Test that the global model is not sent through a lossy codec."""
+    # Prepare
+    strategy = FedAvg(tensor_type=UINT8_TENSOR_TYPE)
+    parameters = ndarrays_to_parameters([np.linspace(0, 1, 7, dtype=np.float32)])
+    client_manager = MagicMock()
+    client_manager.num_available.return_value = 2
+    client_manager.sample.return_value = [MagicMock(), MagicMock()]
+
+    # Execute
+    pairs = strategy.configure_fit(1, parameters, client_manager)
+
+    # Assert
+    for _, fit_ins in pairs:
+        assert fit_ins.parameters is parameters
+        assert fit_ins.config[TENSOR_TYPE_CONFIG_KEY] == UINT8_TENSOR_TYPE
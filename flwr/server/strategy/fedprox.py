@@ -52,6 +52,7 @@ class FedProx(FedAvg):
         fit_metrics_aggregation_fn: Optional[MetricsAggregationFn] = None,
         evaluate_metrics_aggregation_fn: Optional[MetricsAggregationFn] = None,
         proximal_mu: float,
+        tensor_type: Optional[str] = None,
     ) -> None:
         r"""Federated Optimization strategy.
 
@@ -124,6 +125,8 @@ class FedProx(FedAvg):
             this strategy equivalent to FedAvg, and the higher the coefficient, the more
             regularization will be used (that is, the client parameters will need to be
             closer to the server parameters during training).
+        tensor_type : Optional[str]
+            Tensor type the parameters are sent and received in, see FedAvg.
         """
         super().__init__(
             fraction_fit=fraction_fit,
@@ -138,6 +141,9 @@ class FedProx(FedAvg):
             initial_parameters=initial_parameters,
             fit_metrics_aggregation_fn=fit_metrics_aggregation_fn,
             evaluate_metrics_aggregation_fn=evaluate_metrics_aggregation_fn,
+            #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+            tensor_type=tensor_type,
+            #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
         )
         self.proximal_mu = proximal_mu
 
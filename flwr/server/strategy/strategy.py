@@ -16,7 +16,7 @@
 
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from flwr.common import EvaluateIns, EvaluateRes, FitIns, FitRes, Parameters, Scalar
 from flwr.server.client_manager import ClientManager
@@ -105,6 +105,53 @@ class Strategy(ABC):
             the global model parameters remain the same.
         """
 
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+    def begin_aggregate(self, server_round: int) -> Optional[Any]:
+        """Start aggregating the training results of a round as they arrive.
+
+        Parameters
+        ----------
+        server_round : int
+            The current round of federated learning.
+
+        Returns
+        -------
+        state : Optional[Any]
+            State that is passed to `accumulate` and `finalize`, such as an
+            empty list for their defaults. If `None` is returned (the default),
+            the strategy does not support incremental aggregation and the
+            server calls `aggregate_fit` once all results are in.
+        """
+        return None
+
+    def accumulate(
+        self, server_round: int, state: Any, result: Tuple[ClientProxy, FitRes]
+    ) -> None:
+        """Fold a single successful training result into `state`.
+
+        Called by the server as soon as the result arrives, while other clients
+        are still training. `result` must not be modified, it is also returned
+        from the round. By default `state` is a list the result is appended to.
+        """
+        state.append(result)
+
+    def finalize(
+        self,
+        server_round: int,
+        state: Any,
+        results: List[Tuple[ClientProxy, FitRes]],
+        failures: List[Union[Tuple[ClientProxy, FitRes], BaseException]],
+    ) -> Tuple[Optional[Parameters], Dict[str, Scalar]]:
+        """Aggregate training results once every client has answered.
+
+        Same as `aggregate_fit`, except that the parameters of `results` have
+        already been accumulated into `state`. By default this is
+        `aggregate_fit` itself.
+        """
+        return self.aggregate_fit(server_round, results, failures)
+
+    #! ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION ADDED MODIFICATION
+
     @abstractmethod
     def configure_evaluate(
         self, server_round: int, parameters: Parameters, client_manager: ClientManager
@@ -5,15 +5,20 @@ run_finished_experiments = False  # Change to True to re-run everything
 import gc
 import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from common.experiments import generate_all_experiments
 from common.experiments import Experiment
 from common.experiments import __version__
 from clients.aggregator import Aggregator
 from clients.party import Party
 from clients.power_collectors import PowerCollector
+from clients.fleet import FLEET_HEALTH
+from clients.resource_receiver import ResourceReceiver, resource_file_path
 from common import configuration
-from common.database import get_completed_experiments
+from common import database
+from common.experiment_queue import ExperimentQueue
 from common.log import energy_fl_logger
+from common.pipeline import ExperimentPipeline, wait_for_processes
 
 batch_sizes = [16, 64, 128, 256, 512]
 rounds_and_epochs = [(3, 4)]
@@ -28,22 +33,65 @@ all_experiments = generate_all_experiments(
 )
 
 
-def run_experiment(expt: Experiment):
-    
-    global paired
-    
+class Run:
+    """Everything that is set up for one experiment run and handed from one pipeline stage to the next"""
+
+    def __init__(
+        self,
+        run_id: int,
+        aggregator: Aggregator,
+        parties: list[Party],
+        bluetooth_collectors: list[PowerCollector],
+    ) -> None:
+        self.run_id = run_id  # Row in the runs table of the log database
+        self.aggregator = aggregator
+        self.parties = parties
+        self.bluetooth_collectors = bluetooth_collectors
+        self.use_agents = False  # The parties' clients are started through their warm client agents
+        self.client_processes: list[subprocess.Popen] = []
+        self.collector_processes: list[subprocess.Popen] = []
+        self.sampler_processes: list[subprocess.Popen] = []
+        self.resource_receiver: ResourceReceiver = None
+        self.success = True
+        self.failure_reason: str = None
+
+    def fail(self, reason: str):
+        """Marks the run as failed, keeping the first reason since later failures usually follow from it"""
+        self.success = False
+        self.failure_reason = self.failure_reason or reason
+
+
+def fail_experiment(expt: Experiment, run_id: int, reason: str):
+    with database.transaction():
+        database.set_status([expt], has_failed=True, is_running=False)
+        database.finish_run(run_id, success=False, failure_reason=reason)
+    energy_fl_logger.error("Experiment Run Failed")
+
+
+def stop_clients(run: Run):
+    """Stops the clients of a run whose server never started, they would otherwise keep waiting for it"""
+    if run.use_agents:
+        # A client agent stays busy with the run and refuses the next submit, a restarted one starts idle
+        with ThreadPoolExecutor(max_workers=len(run.parties)) as pool:
+            list(pool.map(lambda party: party.stop_agent(), run.parties))
+        return
+    for process in run.client_processes:
+        process.terminate()
+    if not wait_for_processes(run.client_processes, timeout=configuration.REMOTE_EXIT_TIMEOUT):
+        for process in run.client_processes:
+            process.kill()
+
+
+def preflight(expt: Experiment):
+    """Runs while the previous experiment's files are still being collected"""
+
+    run_id = database.start_run(expt)
+    setup_start = time.monotonic()
     expt.add_to_log()
-    expt.set_running()
-    time.sleep(3)
-    
-    SUCCESS = True
-    ABORT = False
-    
     energy_fl_logger.info("\n" + str(expt))
-    time.sleep(3)
 
     # Setup all the clients, aggregators and power collectors
-    
+
     expt.prepare_for_run(wipe_contents_if_exists=True)
 
     aggregator: Aggregator = Aggregator(
@@ -56,7 +104,6 @@ def run_experiment(expt: Experiment):
         Party(ip=ip, username=username)
         for username, ip in configuration.IP_CLIENTS.items()
     ]
-    
 
     bluetooth_collectors: list[PowerCollector] = []
 
@@ -75,62 +122,100 @@ def run_experiment(expt: Experiment):
             )
         )
 
-    from clients.scripts.old_server import main as run_flwr_server
+    # Offline clients get until the timeout to come back instead of a fixed sleep
+    offline = FLEET_HEALTH.wait_until_online(parties, timeout=configuration.DEVICE_ONLINE_TIMEOUT)
+    if offline:
+        database.record_phase(run_id, "setup", time.monotonic() - setup_start)
+        energy_fl_logger.critical(f"Clients {offline} were detected offline")
+        fail_experiment(expt, run_id, f"Clients {offline} were offline")
+        return None
 
-    # Setup SAR
-    from common import sar
+    run = Run(run_id, aggregator, parties, bluetooth_collectors)
+    if configuration.USE_CLIENT_AGENTS:
+        # Agents that are already up answer right away, new ones take as long as importing TensorFlow does
+        with ThreadPoolExecutor(max_workers=len(parties)) as pool:
+            started = list(pool.map(lambda party: party.start_agent(configuration.DEVICE_ONLINE_TIMEOUT), parties))
+        run.use_agents = all(started)
+        if not run.use_agents:
+            energy_fl_logger.warning("Some client agents did not start. Starting the clients as fresh processes instead")
+    database.record_phase(run_id, "setup", time.monotonic() - setup_start)
+    return run
 
-    all_ips = configuration.IP_CLIENTS.copy()
-    all_ips.update({configuration.DEVICE_USERNAME: configuration.IP_AGGREGATOR})
 
-    sar.initialize_sar(usernames_ips=all_ips)
-    subprocess.run(["chmod u+x clients/scripts/sar_collector.sh"], shell=True)
+def train(expt: Experiment, run: Run):
+    """The measured part of the run. The previous run's collection has always finished by now"""
 
-    for party in parties:
-        if not party.check_client_online():
-            ABORT = True
-            SUCCESS = False
-            energy_fl_logger.critical(f"Client {str(party)} was detected offline")
-            expt.set_failed()
-            expt.set_not_running()
-            energy_fl_logger.error("Experiment Run Failed")
-            SUCCESS = False
-            ABORT = True
-            energy_fl_logger.info("Sleeping for 3 minutes until next run")
-            time.sleep(180)
-            return
+    global paired
+
+    from clients.scripts.old_server import main as run_flwr_server
+
+    expt.set_running()
 
     # Setup Bluetooth
-    for collector in bluetooth_collectors:
+    pairing_start = time.monotonic()
+    if not paired:
+        offline = FLEET_HEALTH.wait_until_online(run.bluetooth_collectors, timeout=configuration.DEVICE_ONLINE_TIMEOUT)
+        if offline:
+            energy_fl_logger.critical(f"{offline} did not come back online")
+            database.record_phase(run.run_id, "pairing", time.monotonic() - pairing_start)
+            fail_experiment(expt, run.run_id, f"Power collectors {offline} did not come back online")
+            return None
+    for collector in run.bluetooth_collectors:
         if not paired:
             collector.pair_to_tester().wait()
         energy_fl_logger.info(f"{str(collector)} was paired to tester")
     paired = True
+    database.record_phase(run.run_id, "pairing", time.monotonic() - pairing_start)
     # Ready to start the experiment
 
-    aggregator.ZMQ_setup()
-    # Start the Power Collections, SAR and then finally start the parties and the server
+    training_start = time.monotonic()
+    run.aggregator.ZMQ_setup()
+    # Start the Power Collections, resource sampling and then finally start the parties and the server
 
-    for collector in bluetooth_collectors:
-        collector.collect_power_data(agg_ip=configuration.IP_AGGREGATOR)
+    for collector in run.bluetooth_collectors:
+        run.collector_processes.append(
+            collector.collect_power_data(agg_ip=configuration.IP_AGGREGATOR)
+        )
 
     energy_fl_logger.info("Power Collection Started")
 
-    sar_process = subprocess.Popen(
-        [f"./clients/scripts/sar_collector.sh {expt.folder_name}"], shell=True, stdin=subprocess.PIPE
+    output_paths = {party.username: resource_file_path(expt.folder_name, party.username) for party in run.parties}
+    output_paths[configuration.DEVICE_USERNAME] = resource_file_path(
+        expt.folder_name, configuration.DEVICE_USERNAME, is_aggregator=True
     )
+    run.resource_receiver = ResourceReceiver(
+        ip=configuration.IP_AGGREGATOR,
+        port=configuration.AGGREGATOR_ZMQ_RESOURCE_PORT,
+        output_paths=output_paths,
+        local_host=configuration.DEVICE_USERNAME,
+        interval=configuration.RESOURCE_SAMPLE_INTERVAL,
+    )
+    run.resource_receiver.start()
+    for party in run.parties:
+        run.sampler_processes.append(
+            party.start_resource_sampler(
+                agg_ip=configuration.IP_AGGREGATOR,
+                broadcast_port=configuration.AGGREGATOR_ZMQ_BROADCAST_PORT,
+                resource_port=configuration.AGGREGATOR_ZMQ_RESOURCE_PORT,
+                interval=configuration.RESOURCE_SAMPLE_INTERVAL,
+            )
+        )
+
+    energy_fl_logger.info(f"Resource Sampling Started. Waiting {configuration.COLLECTION_WARMUP} seconds to start parties")
+    time.sleep(configuration.COLLECTION_WARMUP)
+    run.aggregator.ZMQ_start_power_collection()
 
-    energy_fl_logger.info("SAR Started. Waiting 5 seconds to start parties")
-    time.sleep(5)
-
-    for cid, party in enumerate(parties):
-        party.start_client_server(
-            agg_ip=configuration.IP_AGGREGATOR,
-            agg_port=configuration.AGGREGATOR_FLOWER_SERVER_PORT,
-            cid=cid,
-            dataset=expt.dataset,
-            num_parties=expt.num_participating_parties,
-            expt_name=expt.folder_name
+    for cid, party in enumerate(run.parties):
+        start_client = party.submit if run.use_agents else party.start_client_server
+        run.client_processes.append(
+            start_client(
+                agg_ip=configuration.IP_AGGREGATOR,
+                agg_port=configuration.AGGREGATOR_FLOWER_SERVER_PORT,
+                cid=cid,
+                dataset=expt.dataset,
+                num_parties=expt.num_participating_parties,
+                expt_name=expt.folder_name
+            )
         )
 
     args = {
@@ -144,83 +229,91 @@ def run_experiment(expt: Experiment):
         "sample_fraction": expt.sample_fraction,
         "proximal_mu": expt.proximal_mu,
     }
-    
-    for party in parties:
-        if not party.check_client_online():
-            ABORT = True
-            SUCCESS = False
-            energy_fl_logger.critical(f"Client {str(party)} was detected offline")
-            expt.set_failed()
-            expt.set_not_running()
-            energy_fl_logger.error("Experiment Run Failed")
-            SUCCESS = False
-            ABORT = True
-            energy_fl_logger.info("Sleeping for 3 minutes until next run")
-            time.sleep(180)
-            return
-
-    try:
-        run_flwr_server(args=args)
-    except ValueError:
-        energy_fl_logger.critical("Server received Failure from client. Aborting File Collection")
-        expt.set_failed()
-        expt.set_not_running()
-        energy_fl_logger.error("Experiment Run Failed")
-        SUCCESS = False
-        ABORT = True
-    energy_fl_logger.info("Flower Server Finished Running!")
-    time.sleep(1)
-    sar_process.communicate(b"\n")
-    aggregator.ZMQ_stop_power_collection()
-    aggregator.ZMQ_shutdown()
-    if ABORT:
-        time.sleep(1)
-        return
-    time.sleep(20)
-    
+
+    statuses = FLEET_HEALTH.check_devices(run.parties + run.bluetooth_collectors)
+    FLEET_HEALTH.log_statuses(statuses)
+    if not all(status.online for status in statuses.values()):
+        energy_fl_logger.critical("A device was detected offline")
+        run.fail("A device was offline before the server started")
+        stop_clients(run)
+    else:
+        try:
+            run_flwr_server(args=args, aggregator=run.aggregator)
+        except ValueError:
+            energy_fl_logger.critical("Server received Failure from client. Aborting File Collection")
+            run.fail("Server received a failure from a client")
+        energy_fl_logger.info("Flower Server Finished Running!")
+
+    # Stop the power collectors and resource samplers, the stop broadcast reaches both.
+    # The last resource samples are drained while the collection stage runs
+    run.aggregator.ZMQ_stop_power_collection()
+    run.aggregator.ZMQ_shutdown()
+    gc.collect()
+    database.record_phase(run.run_id, "training", time.monotonic() - training_start)
+
+    if not run.success:
+        run.resource_receiver.stop(timeout=configuration.REMOTE_EXIT_TIMEOUT)
+        fail_experiment(expt, run.run_id, run.failure_reason)
+        return None
+    return run
+
+
+def collect(expt: Experiment, run: Run):
+    """Runs in the background during the cooldown and the next run's preflight"""
+
+    global paired
+
+    collection_start = time.monotonic()
+    # The clients and power collectors exit once their output files are written, so wait on that instead of a timer
+    if not run.resource_receiver.stop(timeout=configuration.REMOTE_EXIT_TIMEOUT):
+        energy_fl_logger.warning("Resource samples are incomplete for some devices")
+    if not wait_for_processes(
+        run.client_processes + run.collector_processes + run.sampler_processes, timeout=configuration.REMOTE_EXIT_TIMEOUT
+    ):
+        energy_fl_logger.warning(f"Remote processes still running after {configuration.REMOTE_EXIT_TIMEOUT} seconds. Collecting anyway")
+
     #! Done!
-    WAIT_FOR_REBOOT = False
-    for party in parties:
+    for party in run.parties:
         party.copy_files(expt)
-    for bt in bluetooth_collectors:
+    for bt in run.bluetooth_collectors:
         if not bt.copy_files_to_aggregator():
             energy_fl_logger.error(f"Power Collection Failed on {str(bt)}")
-            SUCCESS=False
+            run.fail(f"Power collection failed on {bt.username}")
             bt.reboot_collector()
-            WAIT_FOR_REBOOT = True
             energy_fl_logger.info(f"Rebooted {str(bt)}")
             paired = False
+    database.record_phase(run.run_id, "collection", time.monotonic() - collection_start)
     #Successful completion validation
-    
-    if not SUCCESS:
-        expt.set_failed()
+
+    database.add_artifacts(run.run_id, f"Outputs/Experiments/{expt.folder_name}")
+    if not run.success:
+        with database.transaction():
+            expt.set_failed()
+            database.finish_run(run.run_id, success=False, failure_reason=run.failure_reason)
         energy_fl_logger.error("Experiment Run Failed")
     else:
-        expt.set_finished()
+        with database.transaction():
+            expt.set_finished()
+            database.finish_run(run.run_id, success=True)
     energy_fl_logger.info("Experiment Complete!")
-    if WAIT_FOR_REBOOT:
-        energy_fl_logger.info("Waiting 1 minute for devices to finish reboot")
-        time.sleep(60)
-    
-completed_experiments = get_completed_experiments(version_str=__version__)
+    return run.success
+
+
 paired = True
 
-for experiment in all_experiments:
-    if experiment not in completed_experiments:
-        run_experiment(experiment)    
-        energy_fl_logger.info("Waiting 60 seconds for next run")
-        time.sleep(20)
-        energy_fl_logger.info("40 Seconds left")
-        time.sleep(30)
-        energy_fl_logger.info("10 Seconds left")
-        time.sleep(10)
-        gc.collect()
-    elif run_finished_experiments:
-        run_experiment(experiment)
-        energy_fl_logger.info("Waiting 60 seconds for next run")
-        time.sleep(20)
-        energy_fl_logger.info("40 Seconds left")
-        time.sleep(30)
-        energy_fl_logger.info("10 Seconds left")
-        time.sleep(10)
-        gc.collect()
+queue = ExperimentQueue(version=__version__)
+queue.enqueue(all_experiments, rerun_finished=run_finished_experiments)
+
+pipeline = ExperimentPipeline(
+    preflight=preflight,
+    train=train,
+    collect=collect,
+    cooldown=configuration.INTER_RUN_COOLDOWN,
+    on_finished=queue.complete,
+)
+pipeline.run(queue)
+
+if configuration.USE_CLIENT_AGENTS:
+    # Agents would keep running the code they were started with, so they don't outlive the sweep
+    for username, ip in configuration.IP_CLIENTS.items():
+        Party(ip=ip, username=username).stop_agent()
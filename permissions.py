@@ -1,6 +1,6 @@
 import subprocess
-import pathlib
 import getpass
+from clients.ssh_pool import SSH_POOL
 
 list_of_files = [
     "clients/scripts/connect_to_bt_multimeter.sh",
@@ -20,13 +20,11 @@ def main():
     for file in list_of_files:
         subprocess.run(f"chmod u+x {file} ; ",shell=True)
     
-    if pathlib.Path("clients/scripts/sar_collector.sh").exists():
-        subprocess.run(f"chmod u+x clients/scripts/sar_collector.sh", shell=True)
-    
     if THIS_MACHINE_IS_THE_AGGREGATOR:
         for username, ip in USERNAMES_AND_IPS.items():
             print(f"\n\n{username}@{ip}\n\n")
-            subprocess.run(f"ssh {username}@{ip} << EOF \n cd ~/Energy-FL ; source venv/bin/activate ; python permissions.py ; exit ; \nEOF", shell=True)
+            SSH_POOL.ensure(f"{username}@{ip}")
+            subprocess.run(f"{SSH_POOL.ssh_command(f'{username}@{ip}')} << EOF \n cd ~/Energy-FL ; source venv/bin/activate ; python permissions.py ; exit ; \nEOF", shell=True)
 
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import subprocess
 import time
+from clients.ssh_pool import SSH_POOL
 
 USERNAMES_AND_IPS={
     "pi2" : "10.8.1.35",
@@ -18,7 +19,8 @@ def main():
     for username, ip in USERNAMES_AND_IPS.items():
         print(f"\n\n{username}@{ip}\n\n")
         time.sleep(1)
-        subprocess.run(f"ssh {username}@{ip} << EOF \n cd ~/Energy-FL ; git pull ; exit ; \nEOF", shell=True)    
+        SSH_POOL.ensure(f"{username}@{ip}")
+        subprocess.run(f"{SSH_POOL.ssh_command(f'{username}@{ip}')} << EOF \n cd ~/Energy-FL ; git pull ; exit ; \nEOF", shell=True)    
 
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,6 @@
 #! This file exists so you can SSH into the aggregator and see what exactly is going on
 
 from common import database
-from common.database import adapt_and_convert
-
-adapt_and_convert()
 
 
 OPT_STRING = """
@@ -16,7 +13,8 @@ OPT_STRING = """
 6. Get Failed experiments of a particular version
 7. Get Completed experiments of a particular version
 8. Delete all experiment logs 
-9. Exit
+9. See run history of a particular version
+10. Exit
 
 Enter only the number
 """
@@ -31,7 +29,7 @@ while True:
         print("Invalid option entered")
         continue
 
-    if a > 9:
+    if a > 10:
         print("Invalid Option")
         continue
 
@@ -53,11 +51,7 @@ while True:
             print(i)
     if a == 5:
         version = input("Enter version string with prefix. Example 'v1.5'")
-        expt = database.get_incomplete_experiments()
-        final = []
-        for i in expt:
-            if i.version == version:
-                final.append(i)
+        final = database.get_incomplete_experiments(version_str=version)
         if final:
             for i in final:
                 print(i)
@@ -65,11 +59,7 @@ while True:
             print("No Results")
     if a == 6:
         version = input("Enter version string with prefix. Example 'v1.5'")
-        expt = database.get_failed_experiments()
-        final = []
-        for i in expt:
-            if i.version == version:
-                final.append(i)
+        final = database.get_failed_experiments(version_str=version)
         if final:
             for i in final:
                 print(i)
@@ -77,11 +67,7 @@ while True:
             print("No Results")
     if a == 7:
         version = input("Enter version string with prefix. Example 'v1.5'")
-        expt = database.get_completed_experiments()
-        final = []
-        for i in expt:
-            if i.version == version:
-                final.append(i)
+        final = database.get_completed_experiments(version_str=version)
         if final:
             for i in final:
                 print(i)
@@ -99,4 +85,18 @@ while True:
             database.nuke_experiments()
             print("Nuked")
     if a == 9:
+        version = input("Enter version string with prefix. Example 'v1.5'")
+        runs = database.get_runs(version_str=version)
+        if not runs:
+            print("No Results")
+        for run in runs:
+            phases = " ".join(
+                f"{phase}={run[f'{phase}_seconds']:.0f}s"
+                for phase in database.RUN_PHASES
+                if run[f"{phase}_seconds"] is not None
+            )
+            print(f"{run['run_id']} {run['folder_name']} {run['status']} {phases} {run['artifact_count']} files {run['artifact_bytes']} bytes")
+            if run["failure_reason"]:
+                print(f"    {run['failure_reason']}")
+    if a == 10:
         break